@@ -0,0 +1,786 @@
+# API HTTP (JSON) del punto de venta, sin interfaz gráfica: varias cajas, un kiosco
+# o integraciones de delivery comparten el mismo backend y la misma BD.
+#
+#   python api.py --puerto 8000 --hilos 16 --procesos 4
+#
+# Cada proceso atiende con N hilos de trabajo: cada petición usa su propia sesión (de
+# lectura para GET) sobre motores con pool para N peticiones simultáneas.
+# Las rutas llaman a las mismas funciones del CRUD que la App, con los mismos
+# contratos; los errores de negocio se responden como {"error": mensaje}.
+#
+# GET /cambios es un long-poll con los cambios publicados por eventos.py; con él
+# la App de escritorio usa esta API como backend remoto (ver backend_remoto.py).
+# Las esperas del long-poll no ocupan hilos de trabajo: cada conexión tiene su hilo
+# y solo las rutas con BD compiten por los N cupos.
+#
+# Varios procesos: cada commit de la API deja sus cambios en la tabla cambio_registrado
+# (misma transacción) y cada proceso la lee (LectorCambiosBD). Así el feed de /cambios
+# se numera con los ids de esa tabla (igual en todos los procesos) y CacheRecetas y la
+# caché de gráficos se invalidan también con los commits de los otros procesos.
+# --procesos N usa fork (Linux/macOS); con gunicorn: -w N --threads M api:aplicacion.
+# Los procesos que escriben la BD sin pasar por la API (la App en modo local,
+# reconstruir_resumenes.py) no registran cambios: sus escrituras no invalidan las
+# cachés de la API hasta que esta se reinicie.
+#
+# Con RESTAURANTE_API_TOKEN (o --token) todas las rutas salvo /salud y /metrics exigen
+# "Authorization: Bearer <token>"; sin token solo se acepta escuchar en localhost.
+import os
+import re
+import hmac
+import json
+import time
+import signal
+import argparse
+import datetime
+import tempfile
+import threading
+from base64 import b64decode
+from collections import deque
+from decimal import Decimal
+from urllib.parse import parse_qs, unquote
+from socketserver import ThreadingMixIn
+from wsgiref.simple_server import WSGIServer, WSGIRequestHandler, make_server
+from sqlalchemy import delete, func, select
+from sqlalchemy.orm import sessionmaker
+import metricas
+from database import crear_motor, leer_configuracion, SesionRastreada
+from migraciones import preparar_esquema
+from models import CambioRegistrado
+from eventos import suscribir, publicar, ENTIDADES, activar_registro_bd, origen_local, leer_cambios_bd
+from crud.cache_recetas import CacheRecetas
+from crud.cliente_crud import ClienteCRUD
+from crud.ingrediente_crud import IngredienteCRUD
+from crud.menu_crud import MenuCRUD
+from crud.pedido_crud import PedidoCRUD
+from graficos import Graficos
+
+LATENCIA_API = metricas.histograma(
+    "restaurante_api_segundos", "Duración de las peticiones a la API por ruta", ("ruta",))
+
+MAX_CUERPO = 64 * 1024 * 1024  # CSV de ingredientes incluidos
+ESPERA_MAXIMA_CAMBIOS = 30.0
+MAX_ESPERAS_CAMBIOS = 512  # long-polls simultáneos (uno por caja remota conectada)
+CAMBIOS_CONSERVADOS = 10000  # buffer del feed y filas que quedan en cambio_registrado al podar
+INTERVALO_CAMBIOS_BD = 0.2  # cada cuánto se lee cambio_registrado si no hubo commits en este proceso
+ESPERA_HUECOS = 10.0  # PostgreSQL puede confirmar ids fuera de orden: un hueco se espera este tiempo
+INTERVALO_PODA = 60.0
+HOSTS_LOCALES = ("127.0.0.1", "localhost", "::1")
+
+
+class ErrorPeticion(Exception):
+    """Petición mal formada: se responde con 'estado' y el mensaje."""
+
+    def __init__(self, mensaje, estado=400):
+        super().__init__(mensaje)
+        self.estado = estado
+
+
+# --- Conversión de datos ---
+
+def _a_json(valor):
+    if isinstance(valor, (datetime.datetime, datetime.date)):
+        return valor.isoformat()
+    if isinstance(valor, Decimal):
+        return float(valor)
+    if isinstance(valor, (set, frozenset)):
+        return list(valor)
+    raise TypeError(f"No serializable: {type(valor).__name__}")
+
+
+def _fecha(texto):
+    """'AAAA-MM-DD' -> date, 'AAAA-MM-DDTHH:MM[:SS]' -> datetime, vacío -> None."""
+    if not texto:
+        return None
+    try:
+        if len(texto) == 10:
+            return datetime.date.fromisoformat(texto)
+        return datetime.datetime.fromisoformat(texto)
+    except ValueError:
+        raise ErrorPeticion(f"Fecha inválida: {texto}")
+
+
+def _entero(p, nombre, defecto=None):
+    try:
+        return int(p[nombre]) if p.get(nombre) not in (None, "") else defecto
+    except ValueError:
+        raise ErrorPeticion(f"'{nombre}' debe ser un entero")
+
+
+def _real(p, nombre, defecto=None):
+    try:
+        return float(p[nombre]) if p.get(nombre) not in (None, "") else defecto
+    except ValueError:
+        raise ErrorPeticion(f"'{nombre}' debe ser un número")
+
+
+def _cursor(p):
+    """despues_de viaja como JSON ([valor_orden, pk]) tal como lo entregó la página anterior."""
+    texto = p.get("despues_de")
+    if not texto:
+        return None
+    try:
+        return tuple(json.loads(texto))
+    except ValueError:
+        raise ErrorPeticion("'despues_de' inválido")
+
+
+def _lista_ids(p):
+    try:
+        return [int(i) for i in (p.get("ids") or "").split(",") if i]
+    except ValueError:
+        raise ErrorPeticion("'ids' debe ser una lista de enteros separados por coma")
+
+
+def _pagina(p, orden_defecto):
+    return (_entero(p, "offset", 0), min(_entero(p, "limite", 100), 1000), p.get("orden") or orden_defecto,
+            p.get("descendente") in ("1", "true"), _cursor(p))
+
+
+def _campos(cuerpo, *nombres):
+    if not isinstance(cuerpo, dict):
+        raise ErrorPeticion("Se esperaba un objeto JSON")
+    faltan = [n for n in nombres if n not in cuerpo]
+    if faltan:
+        raise ErrorPeticion(f"Faltan campos: {', '.join(faltan)}", 422)
+    return [cuerpo[n] for n in nombres]
+
+
+def _cliente(c):
+    return {"email": c.email, "nombre": c.nombre, "edad": c.edad}
+
+
+def _ingrediente(i):
+    return {"id": i.id, "nombre": i.nombre, "unidad": i.unidad, "cantidad": i.cantidad}
+
+
+def _menu(m):
+    return {"id": m.id, "nombre": m.nombre, "descripcion": m.descripcion, "precio": m.precio,
+            "receta": [[it.ingrediente_id, it.ingrediente.nombre if it.ingrediente else None,
+                        it.cantidad_requerida, it.ingrediente.unidad if it.ingrediente else None]
+                       for it in m.ingredientes_receta]}
+
+
+def _estado_venta(mensaje):
+    # Mismos mensajes que PedidoCRUD.registrar_compra
+    if mensaje.startswith("Error: Stock insuficiente"):
+        return 409
+    if mensaje.startswith("Error BD"):
+        return 503
+    return 422
+
+
+# --- Feed de cambios (long-poll) ---
+
+class FeedCambios:
+    """
+    Últimos 'maximo' cambios leídos de cambio_registrado, numerados con su id.
+    desde(n) entrega los posteriores a n (esperando hasta 'espera' segundos si no hay);
+    si el cliente se atrasó más que el buffer, se le indica recargar todo.
+    """
+
+    def __init__(self, maximo=CAMBIOS_CONSERVADOS):
+        self.maximo = maximo
+        self._cambios = deque(maxlen=maximo)  # (numero, Cambio)
+        self._ultimo = 0
+        self._condicion = threading.Condition()
+
+    def agregar(self, numerados):
+        """numerados: (numero, Cambio) con números crecientes."""
+        with self._condicion:
+            for numero, cambio in numerados:
+                self._cambios.append((numero, cambio))
+                self._ultimo = numero
+            self._condicion.notify_all()
+
+    def desde(self, numero, espera=0.0):
+        """Retorna (ultimo, cambios, recargar)."""
+        with self._condicion:
+            if numero < 0:
+                return self._ultimo, [], False  # primera consulta: solo el punto de partida
+            if espera and numero >= self._ultimo:
+                self._condicion.wait_for(lambda: self._ultimo > numero, timeout=espera)
+            if numero > self._ultimo:
+                # Otro proceso ya entregó hasta 'numero' y este aún no lo lee;
+                # muy adelante solo puede ser otra BD (o una vaciada)
+                if numero - self._ultimo > self.maximo:
+                    return self._ultimo, [], True
+                return numero, [], False
+            primero = self._cambios[0][0] if self._cambios else self._ultimo + 1
+            if numero + 1 < primero:
+                return self._ultimo, [], True  # se perdieron cambios (buffer lleno)
+            return self._ultimo, [c for n, c in self._cambios if n > numero], False
+
+
+class LectorCambiosBD(threading.Thread):
+    """
+    Hilo que lee cambio_registrado: pasa todo al feed y publica en este proceso
+    (eventos.publicar, CacheRecetas) los cambios que confirmaron otros procesos.
+    Un commit de este proceso lo despierta de inmediato; si no, lee cada
+    INTERVALO_CAMBIOS_BD. Cada tanto poda las filas que ya no caben en el feed.
+    """
+
+    def __init__(self, fabrica, feed):
+        super().__init__(name="lector-cambios-bd", daemon=True)
+        self._fabrica = fabrica
+        self._feed = feed
+        self._aviso = threading.Event()
+        self._entregado = None  # último id pasado al feed
+        self._hueco_desde = None
+        self._ultima_poda = time.monotonic()
+        suscribir(self._al_publicar)
+
+    def _al_publicar(self, cambios):
+        self._aviso.set()
+
+    def run(self):
+        while True:
+            self._aviso.wait(INTERVALO_CAMBIOS_BD)
+            self._aviso.clear()
+            try:
+                self.leer()
+                if time.monotonic() - self._ultima_poda > INTERVALO_PODA:
+                    self._ultima_poda = time.monotonic()
+                    self.podar()
+            except Exception as e:
+                print(f"Error leyendo cambio_registrado: {e}")
+                time.sleep(1)
+
+    def leer(self, limite=1000):
+        with self._fabrica() as db:
+            if self._entregado is None:
+                # Arranque: el mismo buffer que tienen los procesos que ya estaban corriendo
+                ultimo = db.scalar(select(func.max(CambioRegistrado.id))) or 0
+                primero = db.scalar(select(func.min(CambioRegistrado.id))
+                                    .where(CambioRegistrado.id > ultimo - self._feed.maximo))
+                self._entregado = (primero or ultimo + 1) - 1
+            filas = leer_cambios_bd(db, self._entregado, limite)
+
+        nuevos = []
+        for numero, origen, cambio in filas:
+            if numero > self._entregado + 1:
+                # Id faltante: una transacción que aún no confirma, o una que hizo rollback
+                if self._hueco_desde is None:
+                    self._hueco_desde = time.monotonic()
+                if time.monotonic() - self._hueco_desde < ESPERA_HUECOS:
+                    break
+            self._hueco_desde = None
+            nuevos.append((numero, origen, cambio))
+            self._entregado = numero
+
+        if not nuevos:
+            return
+        if len(filas) == limite:
+            self._aviso.set()  # quedan más
+        self._feed.agregar([(numero, cambio) for numero, origen, cambio in nuevos])
+        ajenos = [cambio for numero, origen, cambio in nuevos if origen != origen_local()]
+        if ajenos:
+            CacheRecetas.invalidar_por_cambios(ajenos)
+            publicar(ajenos)
+
+    def podar(self):
+        if self._entregado is None or self._entregado <= self._feed.maximo:
+            return
+        with self._fabrica() as db:
+            db.execute(delete(CambioRegistrado).where(CambioRegistrado.id <= self._entregado - self._feed.maximo))
+            db.commit()
+
+
+feed = FeedCambios()
+_lector = None  # uno por proceso, aunque se creen varias API (lo inicia la primera)
+_lock_lector = threading.Lock()
+
+
+# --- Rutas ---
+# Cada handler recibe (db, parametros, cuerpo, *grupos_de_la_ruta) y retorna
+# (estado, datos) o (estado, bytes, content_type).
+
+def clientes(db, p, cuerpo):
+    filas, cursor = ClienteCRUD.leer_clientes_pagina(db, *_pagina(p, "nombre"))
+    return 200, {"filas": filas, "cursor": cursor}
+
+
+def clientes_por_email(db, p, cuerpo):
+    # JSON: un email puede traer comas
+    try:
+        emails = json.loads(p.get("emails") or "[]")
+    except ValueError:
+        raise ErrorPeticion("'emails' debe ser una lista JSON")
+    return 200, ClienteCRUD.leer_clientes_por_email(db, emails) if emails else []
+
+
+def clientes_cantidad(db, p, cuerpo):
+    return 200, {"cantidad": ClienteCRUD.contar_clientes(db)}
+
+
+def clientes_catalogo(db, p, cuerpo):
+    return 200, [_cliente(c) for c in ClienteCRUD.leer_clientes(db)]
+
+
+def crear_cliente(db, p, cuerpo):
+    nombre, email, edad = _campos(cuerpo, "nombre", "email", "edad")
+    cliente = ClienteCRUD.crear_cliente(db, nombre, email, edad)
+    if cliente is None:
+        return 422, {"error": "No se pudo guardar (datos inválidos, menor de edad o email repetido)."}
+    return 201, _cliente(cliente)
+
+
+def borrar_cliente(db, p, cuerpo, email):
+    resultado = ClienteCRUD.borrar_cliente(db, unquote(email))
+    estado = {"OK": 200, "No encontrado": 404, "Tiene Pedidos": 409}.get(resultado, 500)
+    return estado, {"resultado": resultado}
+
+
+def ingredientes(db, p, cuerpo):
+    filas, cursor = IngredienteCRUD.leer_ingredientes_pagina(db, *_pagina(p, "id"), umbral=_real(p, "umbral"))
+    return 200, {"filas": filas, "cursor": cursor}
+
+
+def ingredientes_por_id(db, p, cuerpo):
+    ids = _lista_ids(p)
+    return 200, IngredienteCRUD.leer_ingredientes_por_id(db, ids) if ids else []
+
+
+def ingredientes_cantidad(db, p, cuerpo):
+    return 200, {"cantidad": IngredienteCRUD.contar_ingredientes(db, umbral=_real(p, "umbral"))}
+
+
+def crear_ingrediente(db, p, cuerpo):
+    nombre, unidad, cantidad = _campos(cuerpo, "nombre", "unidad", "cantidad")
+    try:
+        ingrediente = IngredienteCRUD.crear_ingrediente(db, nombre, unidad, float(cantidad))
+    except (TypeError, ValueError):
+        raise ErrorPeticion("'cantidad' debe ser un número", 422)
+    if ingrediente is None:
+        return 422, {"error": "Datos inválidos o duplicado"}
+    return 201, _ingrediente(ingrediente)
+
+
+def importar_ingredientes(db, p, cuerpo):
+    # El CRUD lee desde una ruta: el CSV recibido se guarda en un temporal
+    if not isinstance(cuerpo, bytes):
+        raise ErrorPeticion("Se esperaba el CSV como cuerpo (text/csv)")
+    descriptor, ruta = tempfile.mkstemp(suffix=".csv")
+    try:
+        with os.fdopen(descriptor, "wb") as archivo:
+            archivo.write(cuerpo)
+        mensaje = IngredienteCRUD.cargar_masivamente_desde_csv(db, ruta)
+    finally:
+        os.remove(ruta)
+    return (200 if mensaje.startswith("Éxito") else 422), {"mensaje": mensaje}
+
+
+def borrar_ingrediente(db, p, cuerpo, ingrediente_id):
+    if IngredienteCRUD.borrar_ingrediente(db, int(ingrediente_id)):
+        return 200, {"resultado": "OK"}
+    return 409, {"error": "No se pudo eliminar el ingrediente (no existe o está en la receta de algún menú)."}
+
+
+def menus(db, p, cuerpo):
+    filas, cursor = MenuCRUD.leer_menus_pagina(db, *_pagina(p, "id"))
+    return 200, {"filas": filas, "cursor": cursor}
+
+
+def menus_por_id(db, p, cuerpo):
+    ids = _lista_ids(p)
+    return 200, MenuCRUD.leer_menus_por_id(db, ids) if ids else []
+
+
+def menus_cantidad(db, p, cuerpo):
+    return 200, {"cantidad": MenuCRUD.contar_menus(db)}
+
+
+def menus_catalogo(db, p, cuerpo):
+    return 200, [_menu(m) for m in MenuCRUD.leer_menus(db)]
+
+
+def menus_basico(db, p, cuerpo):
+    return 200, [tuple(f) for f in MenuCRUD.leer_menus_basico(db)]
+
+
+def menus_recetas(db, p, cuerpo):
+    ids = _lista_ids(p)
+    recetas = MenuCRUD.obtener_recetas(db, ids)
+    return 200, [{"id": r.id, "nombre": r.nombre, "precio": r.precio, "receta": r.receta}
+                 for r in recetas.values()]
+
+
+def menus_porciones(db, p, cuerpo):
+    return 200, MenuCRUD.calcular_porciones_disponibles(db)
+
+
+def crear_menu(db, p, cuerpo):
+    nombre, descripcion, ingredientes_receta, precio = _campos(
+        cuerpo, "nombre", "descripcion", "ingredientes", "precio")
+    menu = MenuCRUD.crear_menu(db, nombre, descripcion, [tuple(i) for i in ingredientes_receta], precio)
+    if menu is None:
+        return 422, {"error": "No se pudo crear (ingredientes inexistentes, sin stock o cantidades inválidas)."}
+    return 201, {"id": menu.id, "nombre": menu.nombre, "descripcion": menu.descripcion, "precio": menu.precio}
+
+
+def borrar_menu(db, p, cuerpo, menu_id):
+    if MenuCRUD.borrar_menu(db, int(menu_id)):
+        return 200, {"resultado": "OK"}
+    return 404, {"error": "Menú no encontrado"}
+
+
+def vender(db, p, cuerpo):
+    email, ids_menus = _campos(cuerpo, "cliente_email", "menus")
+    if not isinstance(ids_menus, list) or not all(isinstance(i, int) for i in ids_menus):
+        raise ErrorPeticion("'menus' debe ser una lista de ids (uno por unidad)", 422)
+    exito, resultado = PedidoCRUD.registrar_compra(db, email, ids_menus, _fecha(cuerpo.get("fecha")))
+    if not exito:
+        return _estado_venta(resultado), {"error": resultado}
+    return 201, {"boleta": resultado._asdict(), "texto": PedidoCRUD.texto_boleta(resultado)}
+
+
+def total_ventas(db, p, cuerpo):
+    return 200, {"total": PedidoCRUD.calcular_total_ventas(db)}
+
+
+def pedidos(db, p, cuerpo):
+    cursor = _cursor(p)
+    if cursor:
+        cursor = (_fecha(cursor[0]), cursor[1])
+    filas, siguiente = PedidoCRUD.buscar_pedidos(
+        db, p.get("texto", ""), _fecha(p.get("desde")), _fecha(p.get("hasta")), cursor,
+        min(_entero(p, "limite", 100), 1000), p.get("contiene") in ("1", "true"))
+    return 200, {"filas": [tuple(f) for f in filas], "cursor": siguiente}
+
+
+def pedidos_por_id(db, p, cuerpo):
+    ids = _lista_ids(p)
+    return 200, [tuple(f) for f in PedidoCRUD.leer_pedidos_por_id(db, ids)] if ids else []
+
+
+def anular_pedido(db, p, cuerpo, pedido_id):
+    # El CRUD retorna False en ambos casos: "no existe" se distingue antes, para que
+    # una caja no tome un fallo de la BD como un pedido ya anulado
+    if not PedidoCRUD.leer_pedidos_por_id(db, [int(pedido_id)]):
+        return 404, {"error": "El pedido no existe."}
+    if PedidoCRUD.borrar_pedido_y_restaurar_stock(db, int(pedido_id)):
+        return 200, {"resultado": "OK"}
+    return 503, {"error": "Error BD: no se pudo anular el pedido."}
+
+
+def _parametros_grafico(p):
+    if not p.get("tipo"):
+        raise ErrorPeticion("Falta 'tipo'")
+    return (p["tipo"], p.get("periodo") or None, _fecha(p.get("desde")), _fecha(p.get("hasta")),
+            _entero(p, "max_puntos"), p.get("modo") or "barras")
+
+
+def grafico(db, p, cuerpo):
+    serie, error = Graficos.obtener_serie(db, *_parametros_grafico(p))
+    if error:
+        return 404, {"error": error}
+    etiquetas, valores, escala = serie
+    return 200, {"etiquetas": etiquetas, "valores": valores, "escala": escala}
+
+
+def grafico_png(db, p, cuerpo):
+    png, error = Graficos.obtener_imagen(db, *_parametros_grafico(p),
+                                         ancho=_entero(p, "ancho", 600), alto=_entero(p, "alto", 450))
+    if error:
+        return 404, {"error": error}
+    return 200, b64decode(png), "image/png"
+
+
+def cambios(db, p, cuerpo):
+    espera = min(_real(p, "espera", 0.0), ESPERA_MAXIMA_CAMBIOS)
+    ultimo, nuevos, recargar = feed.desde(_entero(p, "desde", -1), espera)
+    return 200, {"ultimo": ultimo, "recargar": recargar, "entidades": sorted(ENTIDADES.values()),
+                 "cambios": [[c.entidad, c.accion, c.clave] for c in nuevos]}
+
+
+def exportar_metricas(db, p, cuerpo):
+    return 200, metricas.texto_prometheus().encode("utf-8"), "text/plain; version=0.0.4; charset=utf-8"
+
+
+def salud(db, p, cuerpo):
+    return 200, {"ok": True}
+
+
+# (método, patrón, handler, sesión: "lectura" / "escritura" / None)
+RUTAS = [
+    ("GET", r"/clientes", clientes, "lectura"),
+    ("GET", r"/clientes/cantidad", clientes_cantidad, "lectura"),
+    ("GET", r"/clientes/por-email", clientes_por_email, "lectura"),
+    ("GET", r"/clientes/catalogo", clientes_catalogo, "lectura"),
+    ("POST", r"/clientes", crear_cliente, "escritura"),
+    ("DELETE", r"/clientes/([^/]+)", borrar_cliente, "escritura"),
+    ("GET", r"/ingredientes", ingredientes, "lectura"),
+    ("GET", r"/ingredientes/cantidad", ingredientes_cantidad, "lectura"),
+    ("GET", r"/ingredientes/por-id", ingredientes_por_id, "lectura"),
+    ("POST", r"/ingredientes", crear_ingrediente, "escritura"),
+    ("POST", r"/ingredientes/csv", importar_ingredientes, "escritura"),
+    ("DELETE", r"/ingredientes/(\d+)", borrar_ingrediente, "escritura"),
+    ("GET", r"/menus", menus, "lectura"),
+    ("GET", r"/menus/cantidad", menus_cantidad, "lectura"),
+    ("GET", r"/menus/por-id", menus_por_id, "lectura"),
+    ("GET", r"/menus/catalogo", menus_catalogo, "lectura"),
+    ("GET", r"/menus/basico", menus_basico, "lectura"),
+    ("GET", r"/menus/recetas", menus_recetas, "lectura"),
+    ("GET", r"/menus/porciones", menus_porciones, "lectura"),
+    ("POST", r"/menus", crear_menu, "escritura"),
+    ("DELETE", r"/menus/(\d+)", borrar_menu, "escritura"),
+    ("POST", r"/ventas", vender, "escritura"),
+    ("GET", r"/ventas/total", total_ventas, "lectura"),
+    ("GET", r"/pedidos", pedidos, "lectura"),
+    ("GET", r"/pedidos/por-id", pedidos_por_id, "lectura"),
+    ("DELETE", r"/pedidos/(\d+)", anular_pedido, "escritura"),
+    ("GET", r"/graficos", grafico, "lectura"),
+    ("GET", r"/graficos/png", grafico_png, "lectura"),
+    ("GET", r"/cambios", cambios, None),
+    ("GET", r"/metrics", exportar_metricas, None),
+    ("GET", r"/salud", salud, None),
+]
+# Sin token: el balanceador y Prometheus las consultan sin credenciales
+RUTAS_PUBLICAS = {exportar_metricas, salud}
+_RUTAS = [(metodo, re.compile(patron + r"/?$"), funcion, sesion) for metodo, patron, funcion, sesion in RUTAS]
+
+
+# --- Aplicación WSGI ---
+
+class API:
+    """
+    Aplicación WSGI. Crea sus propios motores (escritura y lectura) con pool para
+    'hilos' peticiones simultáneas; url None usa la configuración de database.py.
+    token None toma RESTAURANTE_API_TOKEN; vacío = sin autenticación.
+    """
+
+    def __init__(self, url=None, hilos=8, token=None):
+        # Cupos para peticiones con BD (el tamaño del pool); /cambios, /metrics y
+        # /salud no los usan, así un long-poll no puede dejar sin atender a una venta
+        self._cupos = threading.BoundedSemaphore(hilos)
+        self._esperas = threading.BoundedSemaphore(MAX_ESPERAS_CAMBIOS)
+        config = leer_configuracion()
+        config.update(pool_escritura=str(hilos), overflow_escritura="4",
+                      pool_lectura=str(hilos), overflow_lectura="4")
+        url = url or config["url"]
+        self.motor = crear_motor(url, config=config)
+        self.motor_lectura = crear_motor(config["url_lectura"] or url, solo_lectura=True, config=config)
+        preparar_esquema(self.motor)
+        self.Sesion = sessionmaker(bind=self.motor, autoflush=False, class_=SesionRastreada)
+        self.SesionLectura = sessionmaker(bind=self.motor_lectura, autoflush=False, class_=SesionRastreada)
+        # SQLite admite un solo escritor: si varios hilos compiten, el perdedor duerme en
+        # busy_timeout y la latencia se dispara. Se hacen esperar en un lock (en orden).
+        # PostgreSQL bloquea por fila: ahí las escrituras corren en paralelo.
+        self._lock_escritura = threading.Lock() if self.motor.dialect.name == "sqlite" else None
+        self._token = (os.environ.get("RESTAURANTE_API_TOKEN", "") if token is None else token).strip()
+        activar_registro_bd()
+        global _lector
+        with _lock_lector:
+            if _lector is None:
+                _lector = LectorCambiosBD(self.Sesion, feed)
+                _lector.leer()  # el feed arranca con el mismo número que los otros procesos
+                _lector.start()
+
+    def _resolver(self, metodo, ruta):
+        permitido = False
+        for metodo_ruta, patron, funcion, sesion in _RUTAS:
+            coincidencia = patron.match(ruta)
+            if coincidencia:
+                if metodo_ruta == metodo:
+                    return funcion, sesion, coincidencia.groups()
+                permitido = True
+        raise ErrorPeticion("Método no permitido" if permitido else "Ruta no encontrada",
+                            405 if permitido else 404)
+
+    def _verificar_token(self, funcion, entorno):
+        if not self._token or funcion in RUTAS_PUBLICAS:
+            return
+        enviado = entorno.get("HTTP_AUTHORIZATION", "").encode("utf-8")
+        if not hmac.compare_digest(enviado, f"Bearer {self._token}".encode("utf-8")):
+            raise ErrorPeticion("Token de la API ausente o inválido", 401)
+
+    @staticmethod
+    def _leer_cuerpo(entorno):
+        largo = int(entorno.get("CONTENT_LENGTH") or 0)
+        if largo > MAX_CUERPO:
+            raise ErrorPeticion("Cuerpo demasiado grande", 413)
+        datos = entorno["wsgi.input"].read(largo) if largo else b""
+        if not datos:
+            return None
+        if (entorno.get("CONTENT_TYPE") or "").startswith("application/json"):
+            try:
+                return json.loads(datos)
+            except ValueError:
+                raise ErrorPeticion("JSON inválido")
+        return datos
+
+    def _ejecutar(self, funcion, sesion, parametros, cuerpo, grupos):
+        if funcion is cambios:
+            if not self._esperas.acquire(blocking=False):
+                raise ErrorPeticion("Demasiadas esperas de cambios abiertas", 503)
+            try:
+                return funcion(None, parametros, cuerpo, *grupos)
+            finally:
+                self._esperas.release()
+        if sesion is None:
+            return funcion(None, parametros, cuerpo, *grupos)
+        with self._cupos:
+            return self._ejecutar_con_bd(funcion, sesion, parametros, cuerpo, grupos)
+
+    def _ejecutar_con_bd(self, funcion, sesion, parametros, cuerpo, grupos):
+        if sesion == "escritura" and self._lock_escritura is not None:
+            with self._lock_escritura:
+                return self._en_sesion(self.Sesion, funcion, parametros, cuerpo, grupos)
+        return self._en_sesion(self.SesionLectura if sesion == "lectura" else self.Sesion,
+                               funcion, parametros, cuerpo, grupos)
+
+    @staticmethod
+    def _en_sesion(fabrica, funcion, parametros, cuerpo, grupos):
+        db = fabrica()
+        try:
+            respuesta = funcion(db, parametros, cuerpo, *grupos)
+            db.commit()
+            return respuesta
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def __call__(self, entorno, iniciar_respuesta):
+        inicio = time.perf_counter()
+        patron = "?"
+        try:
+            funcion, sesion, grupos = self._resolver(entorno["REQUEST_METHOD"], entorno.get("PATH_INFO") or "/")
+            patron = funcion.__name__
+            self._verificar_token(funcion, entorno)
+            parametros = {k: v[0] for k, v in parse_qs(entorno.get("QUERY_STRING", "")).items()}
+            respuesta = self._ejecutar(funcion, sesion, parametros, self._leer_cuerpo(entorno), grupos)
+        except ErrorPeticion as e:
+            respuesta = (e.estado, {"error": str(e)})
+        except Exception as e:
+            print(f"Error en API ({patron}): {e}")
+            respuesta = (500, {"error": f"Error interno: {e}"})
+
+        if len(respuesta) == 3:
+            estado, cuerpo, tipo = respuesta
+        else:
+            estado, datos = respuesta
+            cuerpo = json.dumps(datos, default=_a_json, ensure_ascii=False).encode("utf-8")
+            tipo = "application/json; charset=utf-8"
+
+        iniciar_respuesta(f"{estado} {_TEXTO_ESTADOS.get(estado, '')}".strip(),
+                          [("Content-Type", tipo), ("Content-Length", str(len(cuerpo)))])
+        LATENCIA_API.observar(time.perf_counter() - inicio, ruta=patron)
+        return [cuerpo]
+
+
+_TEXTO_ESTADOS = {200: "OK", 201: "Created", 400: "Bad Request", 401: "Unauthorized", 404: "Not Found", 405: "Method Not Allowed",
+                  409: "Conflict", 413: "Payload Too Large", 422: "Unprocessable Entity",
+                  500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+# --- Servidor WSGI con un hilo por conexión ---
+
+class ServidorHilos(ThreadingMixIn, WSGIServer):
+    """
+    WSGIServer de la biblioteca estándar con un hilo por conexión. Cuántas
+    peticiones usan la BD a la vez lo limita la aplicación (API._cupos), que
+    sabe qué ruta es cada una; los long-poll de /cambios solo esperan.
+    """
+    daemon_threads = True
+    request_queue_size = 256
+
+
+class ManejadorSilencioso(WSGIRequestHandler):
+    def log_message(self, formato, *args):
+        pass  # una línea por petición en stderr pesa con cientos de ventas por segundo
+
+
+# Para servidores WSGI externos (gunicorn api:aplicacion): se crea al primer uso
+_aplicacion = None
+_lock_aplicacion = threading.Lock()
+
+
+def aplicacion(entorno, iniciar_respuesta):
+    global _aplicacion
+    if _aplicacion is None:
+        with _lock_aplicacion:
+            if _aplicacion is None:
+                _aplicacion = API(hilos=int(os.environ.get("RESTAURANTE_API_HILOS", "8")))
+    return _aplicacion(entorno, iniciar_respuesta)
+
+
+def _servir(servidor, api):
+    servidor.set_app(api)
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+
+
+def _servir_procesos(servidor, args, token):
+    """
+    Pre-fork: el socket ya está abierto y cada hijo crea su propia API (motores,
+    hilos) y acepta conexiones de ese mismo socket. El padre solo espera a los hijos.
+    """
+    servidor.socket.setblocking(False)  # el hijo que pierde la carrera por accept() no queda bloqueado
+    hijos = []
+    for _ in range(args.procesos):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            try:
+                _servir(servidor, API(args.bd, hilos=args.hilos, token=token))
+            finally:
+                os._exit(0)
+        hijos.append(pid)
+
+    def terminar(*_):
+        raise KeyboardInterrupt
+    signal.signal(signal.SIGTERM, terminar)
+    try:
+        for pid in hijos:
+            os.waitpid(pid, 0)
+    except KeyboardInterrupt:
+        for pid in hijos:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        for pid in hijos:
+            os.waitpid(pid, 0)
+    finally:
+        servidor.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="API HTTP del punto de venta.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--puerto", type=int, default=8000)
+    parser.add_argument("--hilos", type=int, default=16, help="Peticiones con BD atendidas en paralelo (por proceso)")
+    parser.add_argument("--procesos", type=int, default=1, help="Procesos que atienden el mismo puerto")
+    parser.add_argument("--bd", default=None, help="URL de la BD (default: la de bd.ini / DATABASE_URL)")
+    parser.add_argument("--token", default=os.environ.get("RESTAURANTE_API_TOKEN", ""),
+                        help="Token compartido con los clientes (default: RESTAURANTE_API_TOKEN)")
+    parser.add_argument("--log", action="store_true", help="Una línea por petición en la consola")
+    args = parser.parse_args()
+    if not args.token and args.host not in HOSTS_LOCALES:
+        parser.error(f"para escuchar en {args.host} se requiere --token o RESTAURANTE_API_TOKEN")
+    if args.procesos > 1 and not hasattr(os, "fork"):
+        parser.error("--procesos mayor que 1 requiere fork (Linux/macOS); en Windows use un proceso")
+
+    metricas.activar()  # /metrics siempre disponible en la API (cada proceso expone las suyas)
+    motor = crear_motor(args.bd)
+    preparar_esquema(motor)  # una vez, antes de que los procesos compitan por migrar
+    print(f"API en http://{args.host}:{args.puerto} ({args.procesos} procesos x {args.hilos} hilos, "
+          f"BD {motor.url.render_as_string()})")
+    motor.dispose()
+
+    servidor = make_server(args.host, args.puerto, None,
+                           server_class=ServidorHilos,
+                           handler_class=WSGIRequestHandler if args.log else ManejadorSilencioso)
+    if args.procesos > 1:
+        _servir_procesos(servidor, args, args.token)
+    else:
+        _servir(servidor, API(args.bd, hilos=args.hilos, token=args.token))
+
+
+if __name__ == "__main__":
+    main()
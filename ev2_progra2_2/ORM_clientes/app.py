@@ -1,23 +1,45 @@
+# Debe ir primero: mide el tiempo de arranque desde aquí (ver arranque.py)
+from arranque import marcar, imprimir_reporte
 import customtkinter as ctk
 from tkinter import messagebox, ttk, filedialog  # AGREGADO filedialog
-from database import get_session, engine, Base, verificar_conexion
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-from sqlalchemy.orm import joinedload
-from crud.cliente_crud import ClienteCRUD
-from crud.pedido_crud import PedidoCRUD
-from crud.ingrediente_crud import IngredienteCRUD
-from crud.menu_crud import MenuCRUD
-from graficos import Graficos
-from models import Pedido, MenuIngrediente, Menu
-from fpdf import FPDF
+from database import engine, reportar_sesiones_abiertas
+from graficos import GraficoPersistente, PERIODOS, MAX_PUNTOS_BARRAS, MAX_PUNTOS_LINEA
+from trabajador import TrabajadorBD
+from instrumentacion import instrumentar
+import metricas
+from lista_virtual import ListaVirtual
+from eventos import suscribir, desuscribir, resumir
+from migraciones import preparar_esquema
 from datetime import datetime
-from tkcalendar import DateEntry
+from collections import Counter
+import queue
+import backend_remoto
+# Backend elegido una sola vez: mismas clases y firmas en ambos casos
+if backend_remoto.URL_API:
+    # api.py en RESTAURANTE_API_URL: el CRUD va por HTTP y db llega como None
+    from backend_remoto import (ClienteCRUD, PedidoCRUD, IngredienteCRUD, MenuCRUD, ResumenCRUD, Graficos,
+                                sesion_scope, verificar_conexion, CatalogoRemoto as Catalogo)
+else:
+    from database import sesion_scope, verificar_conexion
+    from crud.cliente_crud import ClienteCRUD
+    from crud.pedido_crud import PedidoCRUD
+    from crud.ingrediente_crud import IngredienteCRUD
+    from crud.menu_crud import MenuCRUD
+    from crud.resumen_crud import ResumenCRUD
+    from graficos import Graficos
+    from catalogo import Catalogo
+# matplotlib (backend TkAgg), fpdf y tkcalendar se importan al construir la
+# pestaña o generar el PDF que los usa: juntos suman más de un segundo de arranque.
+marcar("imports")
 
 
 # Configuración inicial
 ctk.set_appearance_mode("System")
 ctk.set_default_color_theme("blue")
-Base.metadata.create_all(bind=engine)
+# create_all + migraciones solo si cambió el esquema (una consulta en el caso normal)
+if not backend_remoto.URL_API:
+    preparar_esquema(engine)
+marcar("verificación de esquema")
 
 
 class App(ctk.CTk):
@@ -27,14 +49,33 @@ class App(ctk.CTk):
 
         if not verificar_conexion():
             messagebox.showerror(
-                "Error Crítico", "No se pudo conectar a la Base de Datos.\nVerifique que el archivo .db no esté bloqueado.")
+                "Error Crítico", f"No se pudo conectar a la API ({backend_remoto.URL_API})." if backend_remoto.URL_API
+                else "No se pudo conectar a la Base de Datos.\nVerifique que el archivo .db no esté bloqueado.")
             self.destroy()  # Cierra la app
             return
 
+        marcar("conexión a la BD")
+
         self.title("Gestión de Restaurante - Evaluación 3")
         self.geometry("950x700")
 
-        self.tabview = ctk.CTkTabview(self)
+        # Consultas pesadas (búsquedas, gráficos, CSV, compras) corren fuera del hilo de la UI
+        self.trabajador = TrabajadorBD(self, sesiones=sesion_scope)
+        # Backfill de los resúmenes diarios si la BD es anterior a ellos (en segundo plano)
+        self.trabajador.enviar(ResumenCRUD.reconstruir_si_vacio)
+        self._servicio_boletas = None
+        # Clientes y menús se leen una vez y se recargan solo cuando cambian
+        self.catalogo = Catalogo()
+        # Cambios confirmados en la BD (desde cualquier hilo); se aplican a la UI con after()
+        self.cola_cambios = queue.Queue()
+        suscribir(self.cola_cambios.put)
+        # Con backend remoto, los cambios (de esta y de otras cajas) llegan desde la API
+        self.seguidor_cambios = backend_remoto.SeguidorCambios()
+        self.seguidor_cambios.iniciar()
+        self.protocol("WM_DELETE_WINDOW", self.cerrar_aplicacion)
+
+        # Las pestañas se construyen (y consultan la BD) recién la primera vez que se eligen
+        self.tabview = ctk.CTkTabview(self, command=self.al_cambiar_pestana)
         self.tabview.pack(pady=10, padx=10, fill="both", expand=True)
 
         self.tab_clientes = self.tabview.add("Clientes")
@@ -44,12 +85,99 @@ class App(ctk.CTk):
         self.tab_pedidos = self.tabview.add("Pedidos")
         self.tab_graficos = self.tabview.add("Gráficos")
 
-        self.crear_interfaz_clientes()
-        self.crear_interfaz_ingredientes()
-        self.crear_interfaz_menu()
-        self.crear_panel_compra()
-        self.crear_interfaz_pedidos()
-        self.crear_interfaz_graficos()
+        self.constructores_pestanas = {
+            "Clientes": self.crear_interfaz_clientes,
+            "Stock / Ingredientes": self.crear_interfaz_ingredientes,
+            "Menu": self.crear_interfaz_menu,
+            "Panel de Compra": self.crear_panel_compra,
+            "Pedidos": self.crear_interfaz_pedidos,
+            "Gráficos": self.crear_interfaz_graficos,
+        }
+        self.pestanas_construidas = set()
+        self.construir_pestana(self.tabview.get())
+        marcar(f"pestaña inicial ({self.tabview.get()})")
+
+        self.after(100, self.aplicar_cambios_pendientes)
+        self.after_idle(self.reportar_arranque)
+
+    def al_cambiar_pestana(self):
+        self.construir_pestana(self.tabview.get())
+
+    def construir_pestana(self, nombre):
+        if nombre not in self.pestanas_construidas:
+            self.pestanas_construidas.add(nombre)
+            self.constructores_pestanas[nombre]()
+
+    def reportar_arranque(self):
+        self.update_idletasks()
+        marcar("ventana visible")
+        imprimir_reporte()
+        # Endpoint /metrics y resumen periódico, si se pidieron por variables de entorno
+        metricas.iniciar_desde_entorno()
+
+    def aplicar_cambios_pendientes(self):
+        """
+        Actualiza solo las filas de tablas y combos afectadas por los cambios publicados
+        (ver eventos.py): una venta toca unas pocas filas de ingredientes y una de pedidos.
+        """
+        cambios = []
+        while True:
+            try:
+                cambios.extend(self.cola_cambios.get_nowait())
+            except queue.Empty:
+                break
+
+        try:
+            if cambios:
+                resumen = resumir(cambios)
+                # Las pestañas aún no construidas no se tocan: leerán datos frescos al abrirse
+                construidas = self.pestanas_construidas
+                if "Cliente" in resumen:
+                    if "Clientes" in construidas:
+                        self.lista_clientes.aplicar_cambios(resumen["Cliente"])
+                    if self.catalogo.aplicar_cambios("clientes", resumen["Cliente"]) \
+                            and "Panel de Compra" in construidas:
+                        self.cargar_combo_clientes()
+                if "Ingrediente" in resumen and "Stock / Ingredientes" in construidas:
+                    if self.umbral_ingredientes is None:
+                        self.lista_ingredientes.aplicar_cambios(resumen["Ingrediente"])
+                    else:
+                        # Con el filtro de bajo stock un cambio de cantidad puede sumar o quitar filas
+                        self.lista_ingredientes.recargar()
+                if "Menu" in resumen:
+                    if "Menu" in construidas:
+                        self.lista_menus.aplicar_cambios(resumen["Menu"])
+                    if self.catalogo.aplicar_cambios("menus", resumen["Menu"]) \
+                            and "Panel de Compra" in construidas:
+                        self.cargar_combo_menus()
+                if "Pedido" in resumen and "Pedidos" in construidas:
+                    self.aplicar_cambios_pedidos(resumen["Pedido"])
+                if "Pedido" in resumen and "Gráficos" in construidas:
+                    self.actualizar_grafico_vivo(resumen["Pedido"])
+        except Exception as e:
+            print(f"Error aplicando cambios a la UI: {e}")
+        finally:
+            self.after(100, self.aplicar_cambios_pendientes)
+
+    def servicio_boletas(self):
+        """Servicio de boletas PDF; se crea (e importa fpdf) con la primera boleta."""
+        if self._servicio_boletas is None:
+            from boletas import ServicioBoletas
+            self._servicio_boletas = ServicioBoletas()
+        return self._servicio_boletas
+
+    def cerrar_aplicacion(self):
+        desuscribir(self.cola_cambios.put)
+        self.seguidor_cambios.detener()
+        self.trabajador.cerrar()
+        self.catalogo.cerrar()
+        # Las boletas ya enviadas terminan de escribirse antes de salir
+        if self._servicio_boletas is not None:
+            self._servicio_boletas.cerrar()
+        metricas.detener()
+        # Sesiones que quedaron abiertas (fugas) se informan por consola
+        reportar_sesiones_abiertas()
+        self.destroy()
 
     # --------------------------------------------------------------------------------------
     # PESTAÑA CLIENTES
@@ -82,17 +210,20 @@ class App(ctk.CTk):
         ctk.CTkButton(frame_botones, text="Eliminar", command=self.eliminar_cliente,
                       fg_color="red").pack(side="left", padx=5)
 
-        columns = ("nombre", "email", "edad")
-        self.tree_clientes = ttk.Treeview(
-            frame, columns=columns, show="headings")
-        self.tree_clientes.heading("nombre", text="Nombre")
-        self.tree_clientes.heading("email", text="Email")
-        self.tree_clientes.heading("edad", text="Edad")
-        self.tree_clientes.pack(expand=True, fill="both", padx=10, pady=10)
+        # Lista virtual: solo se leen de la BD las filas visibles
+        columns = [("nombre", "Nombre", None), ("email", "Email", None), ("edad", "Edad", None)]
+        self.lista_clientes = ListaVirtual(
+            frame, columns, self.trabajador,
+            obtener_pagina=ClienteCRUD.leer_clientes_pagina,
+            contar=ClienteCRUD.contar_clientes,
+            obtener_filas=ClienteCRUD.leer_clientes_por_email,
+            orden="nombre", indice_clave=1)
+        self.lista_clientes.pack(expand=True, fill="both", padx=10, pady=10)
 
         # Carga de Clientes en el Treeview del listado
         self.cargar_clientes()
 
+    @instrumentar
     def guardar_cliente(self):
 
         # Recolección de datos
@@ -107,65 +238,50 @@ class App(ctk.CTk):
             messagebox.showerror("Error", "Edad inválida")
             return
         
-        # CRUD: Creación de Cliente y actualización automática de listado
-        db = next(get_session())
-        if ClienteCRUD.crear_cliente(db, nombre, email, edad):
+        # CRUD: Creación de Cliente en segundo plano (la tabla y el combo se actualizan
+        # solos con el evento del cambio)
+        self.trabajador.enviar(lambda db: ClienteCRUD.crear_cliente(db, nombre, email, edad) is not None,
+                               al_terminar=self.al_guardar_cliente,
+                               al_fallar=lambda e: self.al_guardar_cliente(False))
+
+    def al_guardar_cliente(self, creado):
+        if creado:
             messagebox.showinfo("Éxito", "Cliente guardado")
-            self.cargar_clientes()
         else:
             messagebox.showerror("Error", "No se pudo guardar")
-        db.close()
 
     def cargar_clientes(self):
-        
-        tree = getattr(self, 'tree_clientes', None) or getattr(self, 'treeview_clientes', None)
-        
-        if not tree:
-            print("Error: No se encontró la tabla de clientes.")
-            return
-
-        # Limpieza de Treeview previo
-        for item in tree.get_children():
-            tree.delete(item)
-        
-        # CRUD: Lectura de Clientes
-        db = next(get_session())
-        clientes = ClienteCRUD.leer_clientes(db)
-        db.close()
-
-        # Llenado del Treeview con registros de Cliente
-        for c in clientes:
-            # Ajusta los valores según las columnas que tengas
-            tree.insert("", "end", values=(c.nombre, c.email, c.edad))
-
+        # CRUD: Lectura de Clientes (la lista pide a la BD solo la ventana visible)
+        self.lista_clientes.recargar()
 
+    @instrumentar
     def eliminar_cliente(self):
 
         # Validación de la selección de un cliente en Treeview
-        selected = self.tree_clientes.selection()
-        if not selected:
+        valores = self.lista_clientes.valores_seleccionados()
+        if not valores:
             messagebox.showwarning("Atención", "Seleccione un cliente de la lista.")
             return
         
         # Obtención de la PK del cliente
-        email = self.tree_clientes.item(selected[0])['values'][1]
+        email = valores[1]
         
         # CRUD: Eliminación de cliente con mensaje preventivo, se captura un valor del resultado de la operación
         if messagebox.askyesno("Confirmar", f"¿Eliminar cliente {email}?"):
-            db = next(get_session())
-            resultado = ClienteCRUD.borrar_cliente(db, email)
-            db.close()
-            
-            # Manejo e información del resultado de la eliminación
-            if resultado == "OK":
-                messagebox.showinfo("Éxito", "Cliente eliminado correctamente.")
-                self.cargar_clientes()
-            elif resultado == "Tiene Pedidos":
-                messagebox.showerror("Acción Denegada", 
-                                     "No se puede eliminar este cliente porque tiene PEDIDOS asociados.\n"
-                                     "Borre los pedidos primero si realmente desea eliminarlo.")
-            else:
-                messagebox.showerror("Error", "No se pudo eliminar el cliente.")
+            self.trabajador.enviar(ClienteCRUD.borrar_cliente, email,
+                                   al_terminar=self.al_eliminar_cliente,
+                                   al_fallar=lambda e: self.al_eliminar_cliente("Error"))
+
+    def al_eliminar_cliente(self, resultado):
+        # Manejo e información del resultado de la eliminación
+        if resultado == "OK":
+            messagebox.showinfo("Éxito", "Cliente eliminado correctamente.")
+        elif resultado == "Tiene Pedidos":
+            messagebox.showerror("Acción Denegada", 
+                                 "No se puede eliminar este cliente porque tiene PEDIDOS asociados.\n"
+                                 "Borre los pedidos primero si realmente desea eliminarlo.")
+        else:
+            messagebox.showerror("Error", "No se pudo eliminar el cliente.")
 
 
 
@@ -197,8 +313,9 @@ class App(ctk.CTk):
 
         ctk.CTkButton(frame_botones, text="Guardar",
                       command=self.guardar_ingrediente).pack(side="left", padx=5)
-        ctk.CTkButton(frame_botones, text="Cargar CSV", command=self.importar_csv,
-                      fg_color="green").pack(side="left", padx=5)
+        self.btn_cargar_csv = ctk.CTkButton(frame_botones, text="Cargar CSV", command=self.importar_csv,
+                                            fg_color="green")
+        self.btn_cargar_csv.pack(side="left", padx=5)
         ctk.CTkButton(frame_botones, text="Bajo Stock (<5)",
                       command=self.filtrar_bajo_stock, fg_color="orange").pack(side="left", padx=5)
         ctk.CTkButton(frame_botones, text="Ver Todos (Refrescar)",
@@ -206,14 +323,19 @@ class App(ctk.CTk):
         ctk.CTkButton(frame_botones, text="Eliminar", command=self.eliminar_ingrediente,
                       fg_color="red").pack(side="left", padx=5)
 
-        columns = ("id", "nombre", "unidad", "cantidad")
-        self.tree_ingredientes = ttk.Treeview(
-            frame, columns=columns, show="headings")
-        self.tree_ingredientes.heading("id", text="ID")
-        self.tree_ingredientes.heading("nombre", text="Nombre")
-        self.tree_ingredientes.heading("unidad", text="Unidad")
-        self.tree_ingredientes.heading("cantidad", text="Cantidad")
-        self.tree_ingredientes.pack(expand=True, fill="both", padx=10, pady=10)
+        # None = todos; un número = solo los de stock <= umbral ("Bajo Stock")
+        self.umbral_ingredientes = None
+
+        columns = [("id", "ID", None), ("nombre", "Nombre", None),
+                   ("unidad", "Unidad", None), ("cantidad", "Cantidad", None)]
+        self.lista_ingredientes = ListaVirtual(
+            frame, columns, self.trabajador,
+            obtener_pagina=lambda db, *a: IngredienteCRUD.leer_ingredientes_pagina(
+                db, *a, umbral=self.umbral_ingredientes),
+            contar=lambda db: IngredienteCRUD.contar_ingredientes(db, umbral=self.umbral_ingredientes),
+            obtener_filas=IngredienteCRUD.leer_ingredientes_por_id,
+            orden="id")
+        self.lista_ingredientes.pack(expand=True, fill="both", padx=10, pady=10)
 
         # Carga de Ingredientes en el Treeview del listado
         self.cargar_ingredientes()
@@ -224,53 +346,57 @@ class App(ctk.CTk):
             filetypes=[("CSV Files", "*.csv")])
         # CRUD: Creación masiva de Ingrediente con procesado de filas de CSV
         if archivo:
-            db = next(get_session())
-            mensaje = IngredienteCRUD.cargar_masivamente_desde_csv(db, archivo)
-            db.close()
-            messagebox.showinfo("Carga CSV", mensaje)
-            self.cargar_ingredientes()
+            # La carga corre en segundo plano; el botón queda deshabilitado hasta que termine
+            self.btn_cargar_csv.configure(state="disabled", text="Cargando...")
+            self.trabajador.enviar(IngredienteCRUD.cargar_masivamente_desde_csv, archivo,
+                                   al_terminar=self.al_terminar_importacion,
+                                   al_fallar=self.al_terminar_importacion)
 
+    def al_terminar_importacion(self, mensaje):
+        self.btn_cargar_csv.configure(state="normal", text="Cargar CSV")
+        messagebox.showinfo("Carga CSV", str(mensaje))
+
+    @instrumentar
     def guardar_ingrediente(self):
         try:
             cant = float(self.entry_cantidad_ing.get())
             nom = self.entry_nombre_ing.get()
             uni = self.combo_unidad.get()
-            db = next(get_session())
-            if IngredienteCRUD.crear_ingrediente(db, nom, uni, cant):
-                messagebox.showinfo("Éxito", "Guardado")
-                self.cargar_ingredientes()
-            else:
-                messagebox.showerror("Error", "Datos inválidos o duplicado")
-            db.close()
         except ValueError:
             messagebox.showerror("Error", "Cantidad numérica requerida")
+            return
+        self.trabajador.enviar(lambda db: IngredienteCRUD.crear_ingrediente(db, nom, uni, cant) is not None,
+                               al_terminar=self.al_guardar_ingrediente,
+                               al_fallar=lambda e: self.al_guardar_ingrediente(False))
+
+    def al_guardar_ingrediente(self, creado):
+        if creado:
+            messagebox.showinfo("Éxito", "Guardado")
+        else:
+            messagebox.showerror("Error", "Datos inválidos o duplicado")
 
     def cargar_ingredientes(self):
-        for item in self.tree_ingredientes.get_children():
-            self.tree_ingredientes.delete(item)
-        db = next(get_session())
-        for ing in IngredienteCRUD.leer_ingredientes(db):
-            self.tree_ingredientes.insert("", "end", values=(
-                ing.id, ing.nombre, ing.unidad, ing.cantidad))
-        db.close()
+        self.umbral_ingredientes = None
+        self.lista_ingredientes.recargar()
 
     def filtrar_bajo_stock(self):
-        for item in self.tree_ingredientes.get_children():
-            self.tree_ingredientes.delete(item)
-        db = next(get_session())
-        for ing in IngredienteCRUD.obtener_ingredientes_bajo_stock(db):
-            self.tree_ingredientes.insert("", "end", values=(
-                ing.id, ing.nombre, ing.unidad, ing.cantidad))
-        db.close()
+        # El filtro se resuelve en SQL (mismo umbral que obtener_ingredientes_bajo_stock)
+        self.umbral_ingredientes = 5.0
+        self.lista_ingredientes.recargar()
 
+    @instrumentar
     def eliminar_ingrediente(self):
-        sel = self.tree_ingredientes.selection()
-        if sel:
-            id_ing = self.tree_ingredientes.item(sel[0])['values'][0]
-            db = next(get_session())
-            IngredienteCRUD.borrar_ingrediente(db, id_ing)
-            db.close()
-            self.cargar_ingredientes()
+        valores = self.lista_ingredientes.valores_seleccionados()
+        if valores:
+            id_ing = valores[0]
+            self.trabajador.enviar(IngredienteCRUD.borrar_ingrediente, id_ing,
+                                   al_terminar=self.al_eliminar_ingrediente,
+                                   al_fallar=lambda e: self.al_eliminar_ingrediente(False))
+
+    def al_eliminar_ingrediente(self, borrado):
+        if not borrado:
+            messagebox.showerror(
+                "Error", "No se pudo eliminar el ingrediente.\nVerifique que no esté en la receta de algún menú.")
 
     # PESTAÑA MENUS
 
@@ -307,58 +433,59 @@ class App(ctk.CTk):
                       command=self.cargar_menus).pack(side="left", padx=5)
         ctk.CTkButton(frame_botones, text="Eliminar", command=self.eliminar_menu,
                       fg_color="red").pack(side="left", padx=5)
+        ctk.CTkButton(frame_botones, text="¿Qué puedo vender?", command=self.ver_porciones_disponibles,
+                      fg_color="green").pack(side="left", padx=5)
 
-        # Agregamos la columna "receta"
-        columns = ("id", "nombre", "descripcion", "receta", "precio")
-
-        self.tree_menus = ttk.Treeview(frame, columns=columns, show="headings")
-
-        self.tree_menus.heading("id", text="ID")
-        self.tree_menus.column("id", width=30)  # Hacemos el ID más pequeño
-
-        self.tree_menus.heading("nombre", text="Nombre")
-        self.tree_menus.column("nombre", width=150)
-
-        self.tree_menus.heading("descripcion", text="Descripción")
-        self.tree_menus.column("descripcion", width=200)
-
-        # Receta (Ingredientes y cantidad)
-        self.tree_menus.heading("receta", text="Ingredientes (Receta)")
-        self.tree_menus.column("receta", width=330)  # Le damos harto espacio
-
-        # Precio
-        self.tree_menus.heading("precio", text="Precio")
-        self.tree_menus.column("precio", width=120)
-
-        self.tree_menus.pack(expand=True, fill="both", padx=10, pady=10)
+        # Agregamos la columna "receta" (se arma solo para los menús visibles; no se ordena por ella)
+        columns = [
+            ("id", "ID", 30),  # Hacemos el ID más pequeño
+            ("nombre", "Nombre", 150),
+            ("descripcion", "Descripción", 200),
+            ("receta", "Ingredientes (Receta)", 330),  # Le damos harto espacio
+            ("precio", "Precio", 120),
+        ]
+        self.lista_menus = ListaVirtual(
+            frame, columns, self.trabajador,
+            obtener_pagina=MenuCRUD.leer_menus_pagina,
+            contar=MenuCRUD.contar_menus,
+            obtener_filas=MenuCRUD.leer_menus_por_id,
+            orden="id", ordenables=("id", "nombre", "descripcion", "precio"),
+            formatear=lambda m: (m[0], m[1], m[2], m[3], f"${m[4]: .2f}"))
+        self.lista_menus.pack(expand=True, fill="both", padx=10, pady=10)
 
         self.cargar_menus()
 
     def cargar_menus(self):
-        for item in self.tree_menus.get_children():
-            self.tree_menus.delete(item)
+        self.lista_menus.recargar()
 
-        db = next(get_session())
-        menus = MenuCRUD.leer_menus(db)
+    @instrumentar
+    def ver_porciones_disponibles(self):
+        """Ventana con las porciones que se pueden preparar de cada menú con el stock actual."""
+        self.trabajador.enviar(MenuCRUD.calcular_porciones_disponibles, clave="porciones",
+                               al_terminar=self.mostrar_porciones_disponibles)
 
-        for m in menus:
-            # Usamos una comprensión de lista (similar a map) para formatear el texto.
-            # Accedemos a 'm.ingredientes_receta' que definimos en models.py
+    def mostrar_porciones_disponibles(self, porciones):
+        if not porciones:
+            messagebox.showinfo("Porciones", "No hay menús registrados.")
+            return
 
-            detalle_receta = ", ".join([
-                f"{item.ingrediente.nombre} ({item.cantidad_requerida} {item.ingrediente.unidad})"
-                for item in m.ingredientes_receta
-            ])
+        ventana = ctk.CTkToplevel(self)
+        ventana.title("¿Qué puedo vender?")
+        ventana.geometry("450x400")
 
-            # Si no tiene ingredientes (por seguridad), mostramos vacío
-            if not detalle_receta:
-                detalle_receta = "Sin ingredientes definidos"
+        columns = ("nombre", "porciones")
+        tree = ttk.Treeview(ventana, columns=columns, show="headings")
+        tree.heading("nombre", text="Menú")
+        tree.heading("porciones", text="Porciones disponibles")
+        tree.column("porciones", width=140, anchor="center")
+        tree.pack(expand=True, fill="both", padx=10, pady=10)
 
-            # Insertamos en la tabla incluyendo la nueva columna
-            self.tree_menus.insert("", "end", values=(
-                m.id, m.nombre, m.descripcion, detalle_receta, f"${m.precio: .2f}"))
-        db.close()
+        # Primero los que más se pueden vender; los sin receta al final
+        orden = sorted(porciones, key=lambda p: (p[2] is None, -(p[2] or 0), p[1]))
+        for _, nombre, cant in orden:
+            tree.insert("", "end", values=(nombre, "Sin receta" if cant is None else cant))
 
+    @instrumentar
     def guardar_menu(self):
         nombre = self.entry_nombre_menu.get()
         desc = self.entry_desc_menu.get()
@@ -393,14 +520,14 @@ class App(ctk.CTk):
                 "Error Formato", "Formato de receta incorrecto.\nUse: ID:CANTIDAD, ID:CANTIDAD\nEjemplo: 1:100, 2:5")
             return
 
-        db = next(get_session())
-        # Llamamos a tu función avanzada con LAMBDA/MAP/REDUCE
-        nuevo = MenuCRUD.crear_menu(db, nombre, desc, lista_ingredientes, precio)
-        db.close()
+        # Llamamos a tu función avanzada con LAMBDA/MAP/REDUCE (en segundo plano)
+        self.trabajador.enviar(
+            lambda db: MenuCRUD.crear_menu(db, nombre, desc, lista_ingredientes, precio) is not None,
+            al_terminar=self.al_guardar_menu, al_fallar=lambda e: self.al_guardar_menu(False))
 
+    def al_guardar_menu(self, nuevo):
         if nuevo:
             messagebox.showinfo("Éxito", "Menú creado correctamente.")
-            self.cargar_menus()
             # Limpiar campos
             self.entry_nombre_menu.delete(0, 'end')
             self.entry_desc_menu.delete(0, 'end')
@@ -409,267 +536,18 @@ class App(ctk.CTk):
             messagebox.showerror(
                 "Error", "No se pudo crear.\nVerifique:\n1. IDs de ingredientes existan.\n2. Stock suficiente.\n3. Cantidades positivas.")
 
+    @instrumentar
     def eliminar_menu(self):
-        sel = self.tree_menus.selection()
-        if sel:
-            id_menu = self.tree_menus.item(sel[0])['values'][0]
-            db = next(get_session())
-            MenuCRUD.borrar_menu(db, id_menu)
-            db.close()
-            self.cargar_menus()
-
-
-    # PESTAÑA COMPRA 
-
-    def generar_totales_pedido(self, pedido):
-        """Calcula subtotal, IVA y total de un pedido."""
-        subtotal = sum(menu.precio for menu in pedido.menus)
-        iva = subtotal * 0.19
-        total = subtotal + iva
-        return subtotal, iva, total
-
-    def crear_boleta_pdf(self, pedido, archivo_salida=None):
-        """Crea la boleta PDF a partir de un objeto Pedido."""
-        subtotal, iva, total = self.generar_totales_pedido(pedido)
-
-        pdf = FPDF()
-        pdf.add_page()
-        pdf.set_font("Arial", size=12)
-
-        # --- Encabezado ---
-        pdf.set_font("Arial", 'B', 16)
-        pdf.cell(0, 10, "Boleta Restaurante", ln=True, align='L')
-        pdf.set_font("Arial", size=12)
-        pdf.cell(0, 10, "Razón Social del Negocio", ln=True, align='L')
-        pdf.cell(0, 10, "RUT: 12345678-9", ln=True, align='L')
-        pdf.cell(0, 10, "Dirección: Calle Falsa 123", ln=True, align='L')
-        pdf.cell(0, 10, "Teléfono: +56 9 1234 5678", ln=True, align='L')
-        pdf.cell(
-            0, 10, f"Cliente: {pedido.cliente.nombre} ({pedido.cliente.email})", ln=True, align='L')
-        pdf.cell(
-            0, 10, f"Fecha: {pedido.fecha.strftime('%d/%m/%Y %H:%M:%S')}", ln=True, align='R')
-        pdf.ln(10)
-
-        # --- Tabla de Menús ---
-        pdf.set_font("Arial", 'B', 12)
-        pdf.cell(70, 10, "Nombre Menú", border=1)
-        pdf.cell(35, 10, "Precio Unitario", border=1)
-        pdf.ln()
-
-        pdf.set_font("Arial", size=12)
-        for menu in pedido.menus:
-            pdf.cell(70, 10, menu.nombre, border=1)
-            pdf.cell(35, 10, f"${menu.precio:.2f}", border=1)
-            pdf.ln()
-
-        # --- Totales ---
-        pdf.set_font("Arial", 'B', 12)
-        pdf.cell(105, 10, "Subtotal:", 0, 0, 'R')
-        pdf.cell(35, 10, f"${subtotal:.2f}", ln=True, align='R')
-
-        pdf.cell(105, 10, "IVA (19%):", 0, 0, 'R')
-        pdf.cell(35, 10, f"${iva:.2f}", ln=True, align='R')
-
-        pdf.cell(105, 10, "Total:", 0, 0, 'R')
-        pdf.cell(35, 10, f"${total:.2f}", ln=True, align='R')
-
-        # --- Pie ---
-        pdf.set_font("Arial", 'I', 10)
-        pdf.ln(10)
-        pdf.multi_cell(
-            0, 10, "Gracias por su compra. Para cualquier consulta, llámenos al +56 9 777 5678.", 0, 'C')
-        pdf.multi_cell(
-            0, 10, "Los productos adquiridos no tienen garantía.", 0, 'C')
-
-        # Nombre del archivo PDF
-        if archivo_salida is None:
-            archivo_salida = f"boleta_{pedido.id}.pdf"
-
-        pdf.output(archivo_salida)
-        return archivo_salida
-
-    def crear_interfaz_compra(self):
-        frame = self.tab_compra
-        frame_form = ctk.CTkFrame(frame)
-        frame_form.pack(pady=10, padx=10, fill="x")
-
-        # INGRESO DE DATOS DEL PEDIDO
-
-        # Selección del cliente
-        db = next(get_session())
-        self.clientes_db = ClienteCRUD.leer_clientes(db)
-        cliente_nombres = [c.email for c in self.clientes_db]
-        self.combo_clientes = ctk.CTkOptionMenu(
-            frame_form,
-            values=cliente_nombres
-        )
-        self.combo_clientes.pack(side="left", padx=5, expand=True, fill="x")
-
-        # Descripción del pedido
-        self.entry_desc_ped = ctk.CTkEntry(
-            frame_form, placeholder_text="Descripción")
-        self.entry_desc_ped.pack(side="left", padx=5, expand=True, fill="x")
-
-        # Fecha del pedido
-        self.dateentry_fecha = DateEntry(frame_form, date_pattern='yyyy-mm-dd')
-        self.dateentry_fecha.pack(side="left", padx=5, expand=True, fill="x")
-
-        # ctk.CTkButton(frame_form, text="Total Ventas (Reduce)",
-        #         command=self.ver_total_ventas, fg_color="green").pack(side="left", padx=5)
-
-        # --- FRAME PARA MENÚS ---
-        frame_menus = ctk.CTkFrame(frame)
-        frame_menus.pack(pady=10, padx=10, fill="x")
-
-        ctk.CTkLabel(frame_menus, text="Seleccionar menú:").pack(anchor="w")
-        self.combo_menus = ctk.CTkOptionMenu(frame_menus, values=["---"])
-        db = next(get_session())
-        self.menus_db = MenuCRUD.leer_menus(db)
-        menu_nombres = [menu.nombre for menu in self.menus_db]
-        if menu_nombres:
-            self.combo_menus.configure(values=menu_nombres)
-        else:
-            self.combo_menus.configure(values=["No hay menús"])
-
-        self.combo_menus.pack(fill="x", padx=5, pady=5)
-
-        # Botón: Agregar menú al pedido
-        ctk.CTkButton(
-            frame_menus, text="Agregar menú",
-            command=self.agregar_menu_seleccionado
-        ).pack(pady=5)
-
-        # Botón: Registrar Pedido en BD
-        ctk.CTkButton(
-            frame_form,
-            text="Crear Pedido",
-            fg_color="blue",
-            command=self.crear_pedido  # llamará al método que crearemos
-        ).pack(side="left", padx=5)
-
-        ctk.CTkButton(
-            frame_form,
-            text="Refrescar",
-            command=self.actualizar_listados,
-            fg_color="green"
-        ).pack(side="left", padx=5)
-
-        columns_sel = ("menu", "precio")
-        self.tree_menus_seleccionados = ttk.Treeview(
-            frame, columns=columns_sel, show="headings"
-        )
-        self.tree_menus_seleccionados.heading("menu", text="Menú")
-        self.tree_menus_seleccionados.heading("precio", text="Precio")
-        self.tree_menus_seleccionados.pack(
-            expand=True, fill="both", padx=10, pady=10)
-
-        self.label_total = ctk.CTkLabel(
-            frame, text="TOTAL: $0.00", font=ctk.CTkFont(size=14, weight="bold"))
-        self.label_total.pack(pady=5)
-
-    def agregar_menu_seleccionado(self):
-        seleccionado = self.combo_menus.get()
-        if not seleccionado or seleccionado in ["---", "No hay menús"]:
-            return  # no hacer nada si no se ha seleccionado un menú válido
-
-        # Buscar el objeto Menu real en la lista cargada desde la BD
-        menu_obj = next(
-            (m for m in self.menus_db if m.nombre == seleccionado), None)
-        if not menu_obj:
-            return
-
-        # Crear la lista temporal si no existe
-        if not hasattr(self, "menus_seleccionados"):
-            self.menus_seleccionados = []
-
-        print(menu_obj.id)
-        print("Hola")
-
-        # Evitar duplicados
-        if any(m.id == menu_obj.id for m in self.menus_seleccionados):
-            return
-        else:
-            self.menus_seleccionados.append(menu_obj)
-            # Insertar nombre y precio en TreeView
-            self.tree_menus_seleccionados.insert(
-                "", "end", values=(menu_obj.nombre, f"${menu_obj.precio:.2f}")
-            )
-
-        # Calcular y mostrar total
-        total = sum(m.precio for m in self.menus_seleccionados)
-        self.label_total.configure(text=f"TOTAL: ${total:.2f}")
-
-    def crear_pedido(self):
-
-        cliente_email = self.combo_clientes.get().strip()
-        descripcion = self.entry_desc_ped.get().strip()
-        fecha = self.dateentry_fecha.get_date()
-
-        if not cliente_email or not descripcion:
-            print("Debe seleccionar un cliente y escribir una descripción")
-            return
-
-        if not hasattr(self, "menus_seleccionados") or not self.menus_seleccionados:
-            print("Debe agregar al menos un menú al pedido")
-            return
-
-        # Crear el pedido
-
-        db = next(get_session())
-
-        pedido = PedidoCRUD.crear_pedido(db, cliente_email, descripcion, fecha)
-        if not pedido:
-            print("No se pudo crear el pedido")
-            return
-
-        # Asociar menús
-        for menu in self.menus_seleccionados:
-            # Recuperamos el objeto Menu en la sesión actual
-            menu_db = db.get(type(menu), menu.id)
-            pedido.menus.append(menu_db)
-
-        # Guardar cambios
-        if PedidoCRUD._try_commit(db):
-            print(f"Pedido creado con éxito: ID {pedido.id}")
-        else:
-            print("Error al guardar los menús en el pedido")
-
-            # 2. Generar PDF
-        archivo_pdf = self.crear_boleta_pdf(pedido)
-        print(f"PDF generado: {archivo_pdf}")
-
-        # Limpiar interfaz
-        self.menus_seleccionados.clear()
-        for item in self.tree_menus_seleccionados.get_children():
-            self.tree_menus_seleccionados.delete(item)
-
-    def actualizar_listados(self):
-        """Actualiza los combos de clientes y menús desde la BD."""
-        db = next(get_session())
-
-        # --- Actualizar clientes ---
-        self.clientes_db = ClienteCRUD.leer_clientes(db)
-        cliente_nombres = [c.email for c in self.clientes_db]
-        if cliente_nombres:
-            self.combo_clientes.configure(values=cliente_nombres)
-        else:
-            self.combo_clientes.configure(values=["No hay clientes"])
-        self.combo_clientes.set("")  # opcional: limpiar selección actual
-
-        # --- Actualizar menús ---
-        self.menus_db = MenuCRUD.leer_menus(db)
-        menu_nombres = [m.nombre for m in self.menus_db]
-        if menu_nombres:
-            self.combo_menus.configure(values=menu_nombres)
-        else:
-            self.combo_menus.configure(values=["No hay menús"])
-        self.combo_menus.set("---")  # opcional: limpiar selección actual
+        valores = self.lista_menus.valores_seleccionados()
+        if valores:
+            id_menu = valores[0]
+            # La lista se actualiza sola con el evento del borrado
+            self.trabajador.enviar(MenuCRUD.borrar_menu, id_menu)
 
+    @instrumentar
     def ver_total_ventas(self):
-        db = next(get_session())
-        tot = PedidoCRUD.calcular_total_ventas(db)
-        db.close()
-        messagebox.showinfo("Total", f"Ventas: ${tot:,.0f}")
+        self.trabajador.enviar(PedidoCRUD.calcular_total_ventas, clave="total_ventas",
+                               al_terminar=lambda tot: messagebox.showinfo("Total", f"Ventas: ${tot:,.0f}"))
 
     # PESTAÑA PEDIDOS (MANIPULACIÓN DE PEDIDOS [RUD])
 
@@ -683,7 +561,14 @@ class App(ctk.CTk):
         ctk.CTkLabel(frame_filtros, text="Filtrar por Email Cliente:").pack(side="left", padx=5)
         self.entry_cliente_email_ped = ctk.CTkEntry(frame_filtros, placeholder_text="email@cliente.com")
         self.entry_cliente_email_ped.pack(side="left", padx=5, expand=True, fill="x")
-        
+        # Búsqueda mientras se escribe (con una pequeña espera para no consultar por cada tecla)
+        self.entry_cliente_email_ped.bind("<KeyRelease>", self.programar_busqueda_pedidos)
+
+        # Por defecto busca por prefijo del email (usa índice); "Contiene" busca en cualquier parte
+        self.check_contiene_ped = ctk.CTkCheckBox(frame_filtros, text="Contiene", width=90,
+                                                  command=self.cargar_pedidos)
+        self.check_contiene_ped.pack(side="left", padx=5)
+
         ctk.CTkButton(frame_filtros, text="Buscar", command=self.cargar_pedidos).pack(side="left", padx=5)
 
         # --- BOTONES DE ACCIÓN ---
@@ -692,10 +577,27 @@ class App(ctk.CTk):
         
         ctk.CTkButton(frame_botones, text="Actualizar Lista", command=self.cargar_pedidos).pack(side="left", padx=5)
         ctk.CTkButton(frame_botones, text="Anular Pedido (Devolver Stock)", command=self.eliminar_pedido, fg_color="red").pack(side="left", padx=5)
+
+        # Todas las boletas de un período en un solo PDF (se arma en segundo plano)
+        self.entry_boletas_desde = ctk.CTkEntry(frame_botones, placeholder_text="Desde AAAA-MM-DD", width=140)
+        self.entry_boletas_desde.pack(side="left", padx=5)
+        self.entry_boletas_hasta = ctk.CTkEntry(frame_botones, placeholder_text="Hasta AAAA-MM-DD", width=140)
+        self.entry_boletas_hasta.pack(side="left", padx=5)
+        self.btn_boletas_rango = ctk.CTkButton(frame_botones, text="Boletas PDF del período",
+                                               command=self.generar_boletas_rango)
+        self.btn_boletas_rango.pack(side="left", padx=5)
         
         # --- TABLA DE HISTORIAL ---
+        frame_tabla = ctk.CTkFrame(frame, fg_color="transparent")
+        frame_tabla.pack(expand=True, fill="both", padx=10, pady=10)
+
         columns = ("id", "cliente", "descripcion", "fecha")
-        self.tree_pedidos = ttk.Treeview(frame, columns=columns, show="headings", height=15)
+        self.tree_pedidos = ttk.Treeview(frame_tabla, columns=columns, show="headings", height=15)
+
+        # Scroll infinito: al acercarse al final se carga la siguiente página
+        self.scroll_pedidos = ttk.Scrollbar(frame_tabla, orient="vertical", command=self.tree_pedidos.yview)
+        self.tree_pedidos.configure(yscrollcommand=self.al_desplazar_pedidos)
+        self.scroll_pedidos.pack(side="right", fill="y")
         
         self.tree_pedidos.heading("id", text="ID")
         self.tree_pedidos.column("id", width=50)
@@ -709,136 +611,184 @@ class App(ctk.CTk):
         self.tree_pedidos.heading("fecha", text="Fecha")
         self.tree_pedidos.column("fecha", width=120)
         
-        self.tree_pedidos.pack(expand=True, fill="both", padx=10, pady=10)
+        self.tree_pedidos.pack(side="left", expand=True, fill="both")
 
-        self.cargar_pedidos()
+        # Estado de la paginación
+        self.cursor_pedidos = None
+        self.busqueda_pendiente = None
 
-    def actualizar_combo_menus(self):
-        db = next(get_session())
-        menus = MenuCRUD.leer_menus(db)
-        db.close()
-        # Guardamos los nombres para el combo
-        nombres = [f"{m.id}: {m.nombre} (${m.precio})" for m in menus]
-        self.combo_menus.configure(values=nombres)
-        if nombres: self.combo_menus.set(nombres[0])
+        self.cargar_pedidos()
 
-    def agregar_al_carrito(self):
-        seleccion = self.combo_menus.get()
-        if not seleccion: return
+    def generar_boletas_rango(self):
+        if backend_remoto.URL_API:
+            # El proceso de boletas lee la BD directamente (ver boletas.py)
+            messagebox.showinfo("Boletas", "Las boletas por período solo están disponibles con la BD local.")
+            return
+        try:
+            desde = self.fecha_de_entry(self.entry_boletas_desde)
+            hasta = self.fecha_de_entry(self.entry_boletas_hasta)
+            if desde is None or hasta is None:
+                raise ValueError
+        except ValueError:
+            messagebox.showerror("Error", "Ingrese las fechas como AAAA-MM-DD.")
+            return
+        if desde > hasta:
+            messagebox.showerror("Error", "La fecha 'desde' es posterior a 'hasta'.")
+            return
 
-        # Extraer ID del string "1: Completo ($1500)"
-        id_menu = int(seleccion.split(":")[0])
-        
-        # Buscar el objeto menu en BD para tenerlo listo
-        db = next(get_session())
-        menu = db.query(Menu).get(id_menu) # Traemos el objeto simple
-        db.close() # Cerramos, pero guardamos el dato básico (ID, Nombre, Precio)
+        archivo = filedialog.asksaveasfilename(
+            defaultextension=".pdf", filetypes=[("PDF", "*.pdf")],
+            initialfile=f"boletas_{desde}_{hasta}.pdf")
+        if not archivo:
+            return
 
-        if menu:
-            self.lista_carrito.append(menu) # Guardamos en memoria
-            
-            # Actualizar visualización
-            self.text_carrito.configure(state="normal")
-            self.text_carrito.insert("end", f"• {menu.nombre} - ${menu.precio}\n")
-            self.text_carrito.configure(state="disabled")
-
-    def confirmar_compra(self):
-        email = self.entry_cliente_ped.get()
-        if not email or not self.lista_carrito:
-            messagebox.showwarning("Faltan Datos", "Ingrese email del cliente y agregue productos al carrito.")
+        self.btn_boletas_rango.configure(state="disabled")
+        self.servicio_boletas().generar_rango(
+            desde, hasta, archivo,
+            al_terminar=lambda r: self.trabajador.notificar(self.al_terminar_boletas_rango, r),
+            al_fallar=lambda e: self.trabajador.notificar(self.al_fallar_boletas_rango, e))
+
+    def al_terminar_boletas_rango(self, resultado):
+        self.btn_boletas_rango.configure(state="normal")
+        archivo, cantidad, segundos = resultado
+        if not cantidad:
+            messagebox.showinfo("Boletas", "No hay pedidos en ese período.")
             return
+        from boletas import cantidad_partes, archivo_parte
 
-        # Necesitamos re-consultar los menús dentro de la sesión de transacción
-        # para que SQLAlchemy los reconozca y pueda descontar ingredientes
-        db = next(get_session())
-        
-        # Obtenemos los IDs del carrito
-        ids_menus = [m.id for m in self.lista_carrito]
-        
-        # Cargamos los objetos REALES con sus ingredientes listos
-        # Usamos 'in_' para traerlos todos de una vez
-        menus_para_venta = db.query(Menu).options(
-            joinedload(Menu.ingredientes_receta).joinedload("ingrediente")
-        ).filter(Menu.id.in_(ids_menus)).all()
-        
-        # Llamamos al CRUD Transaccional
-        descripcion_automatica = f"Venta de {len(self.lista_carrito)} items"
-        resultado = PedidoCRUD.crear_pedido_con_stock(db, email, descripcion_automatica, menus_para_venta)
-        
-        db.close()
+        partes = cantidad_partes(cantidad)
+        if partes > 1:
+            archivo = f"{partes} archivos: {archivo} ... {archivo_parte(archivo, partes)}"
+        messagebox.showinfo("Boletas", f"{cantidad} boletas guardadas en {archivo}\n"
+                                       f"({segundos:.1f} s, {cantidad / segundos:.0f} boletas/s)")
 
-        if resultado == "OK":
-            messagebox.showinfo("Venta Exitosa", "Pedido creado y stock descontado correctamente.")
-            self.lista_carrito = [] # Vaciar carrito
-            self.text_carrito.configure(state="normal")
-            self.text_carrito.delete("1.0", "end")
-            self.text_carrito.configure(state="disabled")
-            self.cargar_pedidos()
-        else:
-            messagebox.showerror("Error en Venta", f"No se pudo procesar:\n{resultado}")
+    def al_fallar_boletas_rango(self, error):
+        self.btn_boletas_rango.configure(state="normal")
+        messagebox.showerror("Error", f"No se pudieron generar las boletas: {error}")
 
+    @instrumentar
     def eliminar_pedido(self):
         sel = self.tree_pedidos.selection()
         if not sel: return
         id_ped = self.tree_pedidos.item(sel[0])['values'][0]
 
         if messagebox.askyesno("Devolución", "Al eliminar el pedido se devolverá el stock.\n¿Confirmar?"):
-            db = next(get_session())
-            exito = PedidoCRUD.borrar_pedido_y_restaurar_stock(db, id_ped)
-            db.close()
+            self.trabajador.enviar(PedidoCRUD.borrar_pedido_y_restaurar_stock, id_ped,
+                                   al_terminar=self.al_eliminar_pedido,
+                                   al_fallar=lambda e: self.al_eliminar_pedido(False))
 
-            if exito:
-                messagebox.showinfo("Éxito", "Pedido anulado y stock restaurado.")
-                self.cargar_pedidos()
-            else:
-                messagebox.showerror("Error", "No se pudo anular el pedido.")
+    def al_eliminar_pedido(self, exito):
+        if exito:
+            messagebox.showinfo("Éxito", "Pedido anulado y stock restaurado.")
+        else:
+            messagebox.showerror("Error", "No se pudo anular el pedido.")
+
+    def programar_busqueda_pedidos(self, *args):
+        # Reinicia la espera en cada tecla: solo se consulta cuando el usuario hace una pausa
+        if self.busqueda_pendiente:
+            self.after_cancel(self.busqueda_pendiente)
+        self.busqueda_pendiente = self.after(150, self.cargar_pedidos)
+
+    def al_desplazar_pedidos(self, primero, ultimo):
+        self.scroll_pedidos.set(primero, ultimo)
+        # Cerca del final y con más páginas disponibles: traer la siguiente
+        if float(ultimo) > 0.9 and self.cursor_pedidos:
+            self.cargar_mas_pedidos()
 
     def cargar_pedidos(self, *args):
+        """Reinicia el listado con los filtros actuales y carga la primera página."""
+        self.busqueda_pendiente = None
+
         # 1. Limpiar la tabla actual
-        for item in self.tree_pedidos.get_children():
-            self.tree_pedidos.delete(item)
+        self.tree_pedidos.delete(*self.tree_pedidos.get_children())
+        self.cursor_pedidos = None
+        self.claves_pedidos = {}  # iid -> (fecha, id), para ubicar pedidos nuevos sin recargar
+        self.filtro_pedidos = (self.entry_cliente_email_ped.get().strip().lower(),
+                               bool(self.check_contiene_ped.get()))
+
+        # 2. Cargar la primera página (el filtro se resuelve en SQL).
+        #    Si había una búsqueda en curso, esta la cancela.
+        self.cargar_mas_pedidos(primera_pagina=True)
+
+    def cargar_mas_pedidos(self, primera_pagina=False):
+        if not primera_pagina and (not self.cursor_pedidos or self.trabajador.ocupado("pedidos")):
+            return
 
-        # 2. Obtener texto de búsqueda (Filtro)
-        # Usamos try/except por seguridad si el campo aún no se ha creado
-        try:
-            texto_busqueda = self.entry_cliente_email_ped.get().strip().lower()
-        except AttributeError:
-            texto_busqueda = ""
-
-        # 3. Traer TODOS los pedidos de la BD
-        db = next(get_session())
-        todos_pedidos = PedidoCRUD.leer_pedidos(db)
-        db.close()
-
-        # 4. APLICAR FILTRO (Programación Funcional)
-        if texto_busqueda:
-            # Usamos FILTER + LAMBDA para dejar solo los que coincidan con el email
-            # "in" permite búsquedas parciales (ej: "juan" encuentra "juan@gmail.com")
-            pedidos_a_mostrar = list(filter(
-                lambda p: texto_busqueda in p.cliente_email.lower(), 
-                todos_pedidos
-            ))
+        texto_busqueda, contiene = self.filtro_pedidos
+        cursor = None if primera_pagina else self.cursor_pedidos
+
+        self.trabajador.enviar(
+            lambda db: PedidoCRUD.buscar_pedidos(
+                db, texto_busqueda, despues_de=cursor, limite=100, contiene=contiene),
+            al_terminar=self.mostrar_pagina_pedidos,
+            clave="pedidos")
+
+    def mostrar_pagina_pedidos(self, resultado):
+        filas, self.cursor_pedidos = resultado
+
+        # Llenar la tabla con la página obtenida
+        for p in filas:
+            if not self.tree_pedidos.exists(str(p.id)):
+                self.insertar_fila_pedido("end", p)
+
+    def insertar_fila_pedido(self, posicion, p):
+        # Formatear fecha de manera segura
+        fecha_str = ""
+        if p.fecha:
+            # Validamos si es string o datetime
+            if isinstance(p.fecha, str):
+                fecha_str = p.fecha
+            else:
+                fecha_str = p.fecha.strftime("%Y-%m-%d %H:%M")
+
+        # Insertamos en la tabla (ID, Cliente, Descripción, Fecha); el iid es el id del pedido
+        valores = (p.id, p.cliente_email, p.descripcion, fecha_str)
+        if self.tree_pedidos.exists(str(p.id)):
+            self.tree_pedidos.item(str(p.id), values=valores)
         else:
-            # Si no escribió nada, mostramos todo
-            pedidos_a_mostrar = todos_pedidos
-
-        # 5. Llenar la tabla con los resultados (Filtrados o Todos)
-        for p in pedidos_a_mostrar:
-            # Formatear fecha de manera segura
-            fecha_str = ""
-            if p.fecha:
-                # Validamos si es string o datetime
-                if isinstance(p.fecha, str):
-                    fecha_str = p.fecha
-                else:
-                    fecha_str = p.fecha.strftime("%Y-%m-%d %H:%M")
-            
-            # Insertamos en la tabla (ID, Cliente, Descripción, Fecha)
-            self.tree_pedidos.insert("", "end", values=(p.id, p.cliente_email, p.descripcion, fecha_str))
-            
-        # Opcional: Mostrar mensaje si buscó algo y no encontró nada
-        if texto_busqueda and not pedidos_a_mostrar:
-            pass
+            self.tree_pedidos.insert("", posicion, iid=str(p.id), values=valores)
+        self.claves_pedidos[str(p.id)] = (p.fecha or datetime.min, p.id)
+
+    def aplicar_cambios_pedidos(self, cambios):
+        """Inserta, actualiza o quita solo los pedidos afectados (ver eventos.py)."""
+        # Cargas masivas: es más barato volver a pedir la primera página
+        if cambios["recargar"] or len(cambios["insertado"]) > 100:
+            self.cargar_pedidos()
+            return
+
+        for p_id in cambios["borrado"]:
+            if self.tree_pedidos.exists(str(p_id)):
+                self.tree_pedidos.delete(str(p_id))
+            self.claves_pedidos.pop(str(p_id), None)
+
+        leer = cambios["insertado"] | cambios["actualizado"]
+        if leer:
+            self.trabajador.enviar(PedidoCRUD.leer_pedidos_por_id, list(leer), lectura=True,
+                                   al_terminar=self.mostrar_pedidos_cambiados)
+
+    def mostrar_pedidos_cambiados(self, pedidos):
+        # El filtro y el cursor se leen al llegar: si se recargó entretanto, se usan los nuevos
+        texto, contiene = self.filtro_pedidos
+        for p in pedidos:
+            if self.tree_pedidos.exists(str(p.id)):
+                self.insertar_fila_pedido("end", p)  # solo actualiza sus valores
+                continue
+
+            # Mismo filtro que buscar_pedidos (prefijo o contiene sobre el email)
+            email = (p.cliente_email or "").lower()
+            if texto and not (texto in email if contiene else email.startswith(texto)):
+                continue
+
+            # Más antiguo que la última fila cargada: aparecerá al desplazarse.
+            # Sin fecha = datetime.min, igual en la clave de la fila y en el cursor
+            clave = (p.fecha or datetime.min, p.id)
+            if self.cursor_pedidos and clave < (self.cursor_pedidos[0] or datetime.min, self.cursor_pedidos[1]):
+                continue
+
+            # Orden fecha desc, id desc: va antes de la primera fila más antigua
+            hijos = self.tree_pedidos.get_children()
+            posicion = next((i for i, iid in enumerate(hijos) if self.claves_pedidos[iid] < clave), "end")
+            self.insertar_fila_pedido(posicion, p)
 
     # PESTAÑA GRAFICOS
 
@@ -862,63 +812,127 @@ class App(ctk.CTk):
         self.combo_tipo.set("Ventas por Fecha")
         self.combo_tipo.pack(side="left", padx=5)
 
-        # Selector de Periodo (Solo visible para Fechas)
+        # Selector de Periodo (Solo visible para Fechas); "Automático" ajusta la escala al rango
         self.combo_periodo = ctk.CTkComboBox(
             frame_ctrl,
-            values=["Diario", "Mensual", "Anual"],
+            values=list(PERIODOS),
             state="readonly",
-            width=100
+            width=120
         )
-        self.combo_periodo.set("Diario")
+        self.combo_periodo.set("Automático")
         self.combo_periodo.pack(side="left", padx=5)
 
+        # Barras (agrupadas hasta MAX_PUNTOS_BARRAS) o línea (reducida con LTTB)
+        self.combo_modo_grafico = ctk.CTkComboBox(frame_ctrl, values=["Barras", "Línea"],
+                                                  state="readonly", width=90)
+        self.combo_modo_grafico.set("Barras")
+        self.combo_modo_grafico.pack(side="left", padx=5)
+
+        # Rango de fechas (opcional: vacío = toda la historia)
+        self.entry_grafico_desde = ctk.CTkEntry(frame_ctrl, placeholder_text="Desde AAAA-MM-DD", width=130)
+        self.entry_grafico_desde.pack(side="left", padx=5)
+        self.entry_grafico_hasta = ctk.CTkEntry(frame_ctrl, placeholder_text="Hasta AAAA-MM-DD", width=130)
+        self.entry_grafico_hasta.pack(side="left", padx=5)
+
         # Botón Generar
         ctk.CTkButton(frame_ctrl, text="Generar Gráfico",
                       command=self.generar_grafico).pack(side="left", padx=20)
 
+        # En vivo: las ventas nuevas se suman a "Ventas por Fecha" sin volver a consultar
+        self.var_grafico_vivo = ctk.BooleanVar(value=False)
+        ctk.CTkCheckBox(frame_ctrl, text="En vivo", variable=self.var_grafico_vivo).pack(side="left", padx=5)
+
         # --- Área de Dibujo ---
         self.frame_canvas = ctk.CTkFrame(frame)
         self.frame_canvas.pack(expand=True, fill="both", padx=10, pady=10)
-        self.canvas_actual = None
+        # Figura y canvas únicos: se crean con el primer gráfico y luego se actualizan en su lugar
+        self.grafico = None
+        self.parametros_grafico = None  # (tipo, periodo, desde, hasta, max_puntos, modo) del gráfico a la vista
 
     def actualizar_combo_periodo(self, seleccion):
         """Habilita o deshabilita el periodo según el tipo de gráfico"""
-        if seleccion == "Ventas por Fecha":
-            self.combo_periodo.configure(state="normal")
-        else:
-            self.combo_periodo.configure(state="disabled")
+        estado = "readonly" if seleccion == "Ventas por Fecha" else "disabled"
+        self.combo_periodo.configure(state=estado)
+        self.combo_modo_grafico.configure(state=estado)
 
     def generar_grafico(self):
-        tipo = self.combo_tipo.get()
-        periodo = self.combo_periodo.get()
+        try:
+            desde = self.fecha_de_entry(self.entry_grafico_desde)
+            hasta = self.fecha_de_entry(self.entry_grafico_hasta)
+        except ValueError:
+            messagebox.showerror("Error", "Ingrese las fechas como AAAA-MM-DD (o déjelas vacías).")
+            return
+        if desde and hasta and desde > hasta:
+            messagebox.showerror("Error", "La fecha 'desde' es posterior a 'hasta'.")
+            return
 
-        # 1. Obtener sesión y Datos
-        db = next(get_session())
-        etiquetas, valores, error = Graficos.obtener_datos(db, tipo, periodo)
-        db.close()
+        modo = "linea" if self.combo_modo_grafico.get() == "Línea" else "barras"
+        max_puntos = MAX_PUNTOS_LINEA if modo == "linea" else MAX_PUNTOS_BARRAS
+        self.cargar_grafico(self.combo_tipo.get(), self.combo_periodo.get(), desde, hasta, max_puntos, modo)
+
+    def cargar_grafico(self, *parametros):
+        """parametros: (tipo, periodo, desde, hasta, max_puntos, modo), como Graficos.obtener_serie."""
+        # 1. Si nada cambió desde la última consulta, la serie ya está en caché: sin BD
+        serie = Graficos.serie_en_cache(*parametros)
+        if serie is not None:
+            self.trabajador.cancelar("grafico")
+            self.mostrar_grafico((serie, None), parametros)
+            return
+
+        # 2. Consulta en segundo plano (un gráfico nuevo cancela al anterior)
+        self.trabajador.enviar(Graficos.obtener_serie, *parametros,
+                               al_terminar=lambda r: self.mostrar_grafico(r, parametros),
+                               clave="grafico")
 
-        # 2. Validaciones de la Rúbrica
+    def mostrar_grafico(self, resultado, parametros):
+        serie, error = resultado
+
+        # 3. Validaciones de la Rúbrica
         if error:
             # Limpiar gráfico anterior
-            if self.canvas_actual:
-                self.canvas_actual.get_tk_widget().destroy()
-                self.canvas_actual = None
+            if self.grafico is not None:
+                self.grafico.limpiar()
+            self.parametros_grafico = None
 
             # "Mostrar mensaje si no existen registros"
             messagebox.showinfo("Información", error)
             return
 
-        # 3. Generar Figura
-        figura = Graficos.crear_figura(etiquetas, valores, tipo)
+        # 4. Dibujar: la primera vez crea el canvas; después actualiza el mismo
+        if self.grafico is None:
+            self.grafico = GraficoPersistente(self.frame_canvas)
+        etiquetas, valores, escala = serie
+        tipo, modo = parametros[0], parametros[-1]
+        self.grafico.mostrar(etiquetas, valores, tipo, escala, modo)
+        self.parametros_grafico = parametros
+
+    def actualizar_grafico_vivo(self, cambios):
+        """Modo en vivo: suma las ventas nuevas al gráfico de ventas que está a la vista."""
+        if not self.var_grafico_vivo.get() or self.parametros_grafico is None \
+                or self.grafico.tipo != "Ventas por Fecha":
+            return
+        if cambios["recargar"] or cambios["borrado"] or cambios["actualizado"] \
+                or self.grafico.modo != "barras":
+            # Anulaciones, cambios de fecha o línea (LTTB): no se pueden sumar, se vuelve a consultar
+            self.cargar_grafico(*self.parametros_grafico)
+            return
+        if cambios["insertado"]:
+            _, _, desde, hasta, _, _ = self.parametros_grafico
+            escala = self.grafico.periodo
+
+            def sumar(filas):
+                fechas = [f[3] for f in filas
+                          if (not desde or f[3].date() >= desde) and (not hasta or f[3].date() <= hasta)]
+                self.grafico.agregar_ventas(Graficos.agrupar_fechas(fechas, escala))
 
-        # 4. Incrustar en Tkinter
-        if self.canvas_actual:
-            self.canvas_actual.get_tk_widget().destroy()
+            self.trabajador.enviar(PedidoCRUD.leer_pedidos_por_id, list(cambios["insertado"]),
+                                   al_terminar=sumar)
 
-        self.canvas_actual = FigureCanvasTkAgg(
-            figura, master=self.frame_canvas)
-        self.canvas_actual.draw()
-        self.canvas_actual.get_tk_widget().pack(expand=True, fill="both")
+    @staticmethod
+    def fecha_de_entry(entry):
+        """Fecha AAAA-MM-DD escrita en el entry, o None si está vacío (ValueError si es inválida)."""
+        texto = entry.get().strip()
+        return datetime.strptime(texto, "%Y-%m-%d").date() if texto else None
 
     # --------------------------------------------------------------------------------------
     # PESTAÑA DE COMPRA
@@ -937,7 +951,7 @@ class App(ctk.CTk):
         self.combo_clientes_compra.pack(side="left", padx=5)
         
         # Botón para recargar la lista de clientes si creaste uno nuevo
-        ctk.CTkButton(frame_cli, text="🔄", width=30, command=self.cargar_combo_clientes).pack(side="left", padx=5)
+        ctk.CTkButton(frame_cli, text="🔄", width=30, command=lambda: self.cargar_combo_clientes(refrescar=True)).pack(side="left", padx=5)
 
         # --- SELECCIÓN DE PRODUCTOS ---
         frame_prod = ctk.CTkFrame(frame)
@@ -947,7 +961,7 @@ class App(ctk.CTk):
         self.combo_menus_compra = ctk.CTkComboBox(frame_prod, width=250, state="readonly")
         self.combo_menus_compra.pack(side="left", padx=5)
 
-        ctk.CTkButton(frame_prod, text="🔄", width=30, command=self.cargar_combo_menus).pack(side="left", padx=5)
+        ctk.CTkButton(frame_prod, text="🔄", width=30, command=lambda: self.cargar_combo_menus(refrescar=True)).pack(side="left", padx=5)
 
         ctk.CTkButton(frame_prod, text="Agregar al Carrito", command=self.agregar_al_carrito).pack(side="left", padx=10)
 
@@ -963,7 +977,8 @@ class App(ctk.CTk):
         
         ctk.CTkLabel(frame_fecha, text="Fecha del Pedido:").pack(side="left", padx=5)
         
-        # Widget de Calendario
+        # Widget de Calendario (tkcalendar se importa al abrir esta pestaña)
+        from tkcalendar import DateEntry
         self.cal_fecha_compra = DateEntry(frame_fecha, width=12, background='darkblue',
                                           foreground='white', borderwidth=2, date_pattern='yyyy-mm-dd')
         self.cal_fecha_compra.pack(side="left", padx=5)
@@ -975,29 +990,35 @@ class App(ctk.CTk):
         ctk.CTkButton(frame_actions, text="Limpiar Carrito", fg_color="red", command=self.limpiar_carrito).pack(side="left", padx=10)
         
         # EL BOTÓN PRINCIPAL
-        ctk.CTkButton(frame_actions, text="GENERAR BOLETA Y GUARDAR", fg_color="green", height=40, command=self.procesar_compra).pack(side="left", padx=10)
+        self.btn_procesar_compra = ctk.CTkButton(frame_actions, text="GENERAR BOLETA Y GUARDAR", fg_color="green", height=40, command=self.procesar_compra)
+        self.btn_procesar_compra.pack(side="left", padx=10)
 
         # Cargar datos iniciales
         self.cargar_combo_clientes()
         self.cargar_combo_menus()
 
-    def cargar_combo_clientes(self):
-        db = next(get_session())
-        clientes = ClienteCRUD.leer_clientes(db)
-        db.close()
+    def cargar_combo_clientes(self, refrescar=False):
+        # refrescar=True (botón 🔄) vuelve a leer desde la BD, p. ej. si otra caja creó clientes
+        if refrescar:
+            self.catalogo.refrescar("clientes")
+        clientes = self.catalogo.clientes()
         # Guardamos el email que es la PK
         lista = [c.email for c in clientes]
         self.combo_clientes_compra.configure(values=lista)
-        if lista: self.combo_clientes_compra.set(lista[0])
-
-    def cargar_combo_menus(self):
-        db = next(get_session())
-        menus = MenuCRUD.leer_menus(db)
-        db.close()
+        # Se mantiene el cliente elegido si sigue existiendo
+        if lista and self.combo_clientes_compra.get() not in lista:
+            self.combo_clientes_compra.set(lista[0])
+
+    def cargar_combo_menus(self, refrescar=False):
+        if refrescar:
+            self.catalogo.refrescar("menus")
+        # Desde el catálogo en memoria: no se vuelve a consultar la BD
+        menus = self.catalogo.menus()
         # Guardamos "ID: Nombre ($Precio)"
         lista = [f"{m.id}: {m.nombre} (${m.precio})" for m in menus]
         self.combo_menus_compra.configure(values=lista)
-        if lista: self.combo_menus_compra.set(lista[0])
+        if lista and self.combo_menus_compra.get() not in lista:
+            self.combo_menus_compra.set(lista[0])
 
     def agregar_al_carrito(self):
         seleccion = self.combo_menus_compra.get()
@@ -1009,17 +1030,10 @@ class App(ctk.CTk):
         except ValueError:
             return
 
-        if any(m.id == id_menu for m in self.lista_carrito):
-            return
-
-        db = next(get_session())
-        
-        # Usamos MenuIngrediente.ingrediente (Clase) en vez de "ingrediente" (String)
-        menu = db.query(Menu).options(
-            joinedload(Menu.ingredientes_receta).joinedload(MenuIngrediente.ingrediente)
-        ).get(id_menu)
-        
-        db.close()
+        # Se permiten menús repetidos: cada repetición es una unidad más.
+        # El carrito solo muestra id, nombre y precio: salen del catálogo en memoria
+        # (la receta la resuelve el CRUD al registrar la compra)
+        menu = next((m for m in self.catalogo.menus() if m.id == id_menu), None)
 
         if menu:
             self.lista_carrito.append(menu)
@@ -1029,10 +1043,15 @@ class App(ctk.CTk):
         self.text_boleta_preview.configure(state="normal")
         self.text_boleta_preview.delete("1.0", "end")
         
+        # Agrupamos por menú para mostrar la cantidad de cada uno
+        por_id = {m.id: m for m in self.lista_carrito}
+        cantidades = Counter(m.id for m in self.lista_carrito)
+
         total = 0
-        for m in self.lista_carrito:
-            self.text_boleta_preview.insert("end", f"• {m.nombre} \t\t ${m.precio}\n")
-            total += m.precio
+        for m_id, cant in cantidades.items():
+            m = por_id[m_id]
+            self.text_boleta_preview.insert("end", f"• {m.nombre} x{cant} \t\t ${m.precio * cant}\n")
+            total += m.precio * cant
             
         self.text_boleta_preview.insert("end", f"\nTOTAL ESTIMADO: ${total}")
         self.text_boleta_preview.configure(state="disabled")
@@ -1056,26 +1075,33 @@ class App(ctk.CTk):
             messagebox.showwarning("Carrito Vacío", "Agregue productos antes de generar la boleta.")
             return
 
-        # 3. Llamar al CRUD
-        db = next(get_session())
-        
+        # 3. Llamar al CRUD en segundo plano (el botón se bloquea para no duplicar la compra)
+        # Basta con los ids (uno por unidad del carrito): el CRUD usa la caché de recetas
         ids_menus = [m.id for m in self.lista_carrito]
-        
-        # Usamos la clase MenuIngrediente para evitar el error de strings
-        menus_frescos = db.query(Menu).options(
-            joinedload(Menu.ingredientes_receta).joinedload(MenuIngrediente.ingrediente)
-        ).filter(Menu.id.in_(ids_menus)).all()
 
+        self.btn_procesar_compra.configure(state="disabled")
         # PASAMOS LA FECHA AL CRUD
-        exito, resultado = PedidoCRUD.procesar_compra(db, email_cliente, menus_frescos, fecha_seleccionada=fecha_obj)
-        db.close()
+        self.trabajador.enviar(PedidoCRUD.registrar_compra, email_cliente, ids_menus, fecha_obj,
+                               al_terminar=self.al_terminar_compra,
+                               al_fallar=lambda e: self.al_terminar_compra((False, str(e))))
+
+    def al_terminar_compra(self, resultado_compra):
+        self.btn_procesar_compra.configure(state="normal")
+        exito, resultado = resultado_compra
 
         if exito:
-            messagebox.showinfo("Compra Exitosa", resultado)
+            # La venta ya está guardada: el PDF se arma en otro proceso mientras se muestra la boleta
+            self.servicio_boletas().generar(
+                resultado, al_terminar=lambda r: self.trabajador.notificar(self.al_generar_boletas, r))
+            messagebox.showinfo("Compra Exitosa", PedidoCRUD.texto_boleta(resultado))
             self.limpiar_carrito()
         else:
             messagebox.showerror("Error en Compra", resultado)
 
+    def al_generar_boletas(self, resultado):
+        archivo, cantidad, segundos = resultado
+        print(f"PDF generado: {archivo} ({cantidad} boleta(s) en {segundos:.2f} s)")
+
 
 if __name__ == "__main__":
     app = App()
@@ -0,0 +1,37 @@
+# Medición del tiempo de arranque de la app.
+# Se importa antes que todo en app.py; cada etapa se marca con marcar() y al
+# mostrarse la ventana se imprime el reporte si RESTAURANTE_PERFIL_ARRANQUE=1.
+# Para el detalle módulo por módulo: python -X importtime app.py
+import os
+import time
+
+_inicio = time.perf_counter()
+_etapas = []
+
+ACTIVO = os.environ.get("RESTAURANTE_PERFIL_ARRANQUE", "") not in ("", "0")
+
+
+def marcar(etapa):
+    """Registra el instante en que terminó 'etapa'."""
+    _etapas.append((etapa, time.perf_counter()))
+
+
+def total():
+    """Segundos desde que se importó este módulo."""
+    return time.perf_counter() - _inicio
+
+
+def reporte():
+    """Texto con la duración de cada etapa y el acumulado."""
+    lineas = ["Arranque:"]
+    anterior = _inicio
+    for etapa, instante in _etapas:
+        lineas.append(f"  {etapa:<35} {(instante - anterior) * 1000:8.1f} ms"
+                      f"  (acumulado {(instante - _inicio) * 1000:8.1f} ms)")
+        anterior = instante
+    return "\n".join(lineas)
+
+
+def imprimir_reporte():
+    if ACTIVO:
+        print(reporte())
@@ -0,0 +1,549 @@
+# Backend remoto: la App de escritorio usa la API HTTP (api.py) en vez de la BD.
+#
+#   RESTAURANTE_API_URL=http://192.168.1.10:8000 python app.py
+#
+# Las clases ClienteCRUD, IngredienteCRUD, MenuCRUD, PedidoCRUD, ResumenCRUD y
+# Graficos de este módulo tienen las mismas firmas y retornan lo mismo que las
+# del CRUD local (el argumento db se ignora: llega None desde sesion_scope()).
+# Así la App, el TrabajadorBD y las listas virtuales no distinguen un backend del otro.
+# Los cambios de otras cajas llegan por GET /cambios (long-poll) y se publican en
+# el bus local de eventos.py, igual que los commits locales.
+#
+# Errores: las escrituras responden con su contrato de siempre (None / False /
+# (False, mensaje)) e imprimen el motivo; las lecturas lanzan ErrorAPI.
+import os
+import json
+import datetime
+import threading
+import http.client
+from contextlib import contextmanager
+from types import SimpleNamespace
+from collections import namedtuple
+from urllib.parse import urlsplit, urlencode, quote
+import graficos
+from eventos import Cambio, publicar
+from crud.pedido_crud import PedidoCRUD as _PedidoLocal, DatosBoleta
+from crud.cache_recetas import RecetaMenu
+
+URL_API = os.environ.get("RESTAURANTE_API_URL", "").strip().rstrip("/")
+# Token compartido con el servidor (su RESTAURANTE_API_TOKEN); vacío = sin autenticación
+TOKEN_API = os.environ.get("RESTAURANTE_API_TOKEN", "").strip()
+TIMEOUT = 30.0
+ESPERA_CAMBIOS = 25.0  # segundos que el servidor retiene cada GET /cambios sin novedades
+
+# Misma forma que las filas de PedidoCRUD.buscar_pedidos (con atributos)
+FilaPedido = namedtuple("FilaPedido", "id cliente_email descripcion fecha")
+# Misma forma que las filas de MenuCRUD.leer_menus_basico
+FilaMenu = namedtuple("FilaMenu", "id nombre precio")
+
+
+class ErrorAPI(Exception):
+    """La API no respondió o respondió con un error inesperado."""
+
+    def __init__(self, mensaje, estado=None):
+        super().__init__(mensaje)
+        self.estado = estado
+
+
+class ConexionAPI:
+    """
+    Cliente HTTP/JSON con una conexión por hilo (http.client no es thread-safe).
+    Si el servidor mantiene la conexión abierta se reutiliza; si la cierra,
+    http.client abre otra en la siguiente petición.
+    """
+
+    def __init__(self, url, timeout=TIMEOUT, token=TOKEN_API):
+        partes = urlsplit(url)
+        if partes.scheme not in ("http", "https"):
+            raise ValueError(f"URL de la API inválida: {url}")
+        self.url = url
+        self._clase = http.client.HTTPSConnection if partes.scheme == "https" else http.client.HTTPConnection
+        self._host = partes.hostname
+        self._puerto = partes.port
+        self._base = partes.path.rstrip("/")
+        self.timeout = timeout
+        self._token = token
+        self._local = threading.local()
+
+    def _conexion(self):
+        conexion = getattr(self._local, "conexion", None)
+        if conexion is None:
+            conexion = self._local.conexion = self._clase(self._host, self._puerto, timeout=self.timeout)
+        return conexion
+
+    def _descartar(self):
+        conexion = getattr(self._local, "conexion", None)
+        if conexion is not None:
+            conexion.close()
+            self._local.conexion = None
+
+    def pedir(self, metodo, ruta, parametros=None, cuerpo=None, tipo=None, timeout=None):
+        """
+        Retorna (estado, datos): datos es el JSON decodificado, o bytes si la
+        respuesta no es JSON. Lanza ErrorAPI si no hubo respuesta.
+        """
+        ruta = self._base + ruta
+        if parametros:
+            ruta += "?" + urlencode({k: v for k, v in parametros.items() if v is not None})
+        encabezados = {"Authorization": f"Bearer {self._token}"} if self._token else {}
+        if cuerpo is not None and tipo is None:
+            cuerpo = json.dumps(cuerpo, default=_a_json).encode("utf-8")
+            tipo = "application/json"
+        if tipo:
+            encabezados["Content-Type"] = tipo
+
+        # Solo los GET se reintentan: un POST repetido podría registrar dos ventas
+        intentos = 2 if metodo == "GET" else 1
+        for intento in range(intentos):
+            conexion = self._conexion()
+            conexion.timeout = timeout or self.timeout
+            try:
+                conexion.request(metodo, ruta, body=cuerpo, headers=encabezados)
+                respuesta = conexion.getresponse()
+                datos = respuesta.read()
+                break
+            except (OSError, http.client.HTTPException) as e:
+                # Conexión reutilizada que el servidor ya había cerrado, o servidor caído
+                self._descartar()
+                if intento == intentos - 1:
+                    raise ErrorAPI(f"Sin respuesta de la API ({self.url}): {e}")
+
+        if respuesta.getheader("Connection", "").lower() == "close" or respuesta.version == 10:
+            self._descartar()
+        if (respuesta.getheader("Content-Type") or "").startswith("application/json"):
+            datos = json.loads(datos)
+        return respuesta.status, datos
+
+    def leer(self, ruta, **parametros):
+        """GET que debe responder 200; si no, lanza ErrorAPI con el mensaje del servidor."""
+        estado, datos = self.pedir("GET", ruta, parametros)
+        if estado != 200:
+            raise ErrorAPI(_mensaje(datos, estado), estado)
+        return datos
+
+
+def _a_json(valor):
+    if isinstance(valor, (datetime.datetime, datetime.date)):
+        return valor.isoformat()
+    if isinstance(valor, (set, frozenset, tuple)):
+        return list(valor)
+    raise TypeError(f"No serializable: {type(valor).__name__}")
+
+
+def _mensaje(datos, estado):
+    if isinstance(datos, dict):
+        return datos.get("error") or datos.get("mensaje") or datos.get("resultado") or f"HTTP {estado}"
+    return f"HTTP {estado}"
+
+
+def _fecha(texto):
+    """Inverso de api._a_json: 'AAAA-MM-DD' -> date, con hora -> datetime."""
+    if not texto:
+        return None
+    if len(texto) == 10:
+        return datetime.date.fromisoformat(texto)
+    return datetime.datetime.fromisoformat(texto)
+
+
+def _pagina(offset, limite, orden, descendente, despues_de):
+    return {"offset": offset, "limite": limite, "orden": orden, "descendente": "1" if descendente else "0",
+            "despues_de": json.dumps(list(despues_de), default=_a_json) if despues_de else None}
+
+
+def _cursor(cursor):
+    return tuple(cursor) if cursor else None
+
+
+def _ids(ids):
+    return ",".join(str(int(i)) for i in ids)
+
+
+_api = None
+_lock_api = threading.Lock()
+
+
+def api():
+    """Conexión compartida a URL_API (se crea al primer uso)."""
+    global _api
+    if _api is None:
+        with _lock_api:
+            if _api is None:
+                if not URL_API:
+                    raise ErrorAPI("No hay backend remoto configurado (RESTAURANTE_API_URL)")
+                _api = ConexionAPI(URL_API)
+    return _api
+
+
+def _escribir(metodo, ruta, cuerpo=None, tipo=None, operacion="la operación"):
+    """Escrituras: (estado, datos), o (None, mensaje) si la API no respondió."""
+    try:
+        return api().pedir(metodo, ruta, cuerpo=cuerpo, tipo=tipo)
+    except ErrorAPI as e:
+        print(f"Error en {operacion}: {e}")
+        return None, str(e)
+
+
+@contextmanager
+def sesion_scope(lectura=False):
+    """Reemplazo de database.sesion_scope: no hay sesión local, el CRUD remoto recibe None."""
+    yield None
+
+
+def verificar_conexion():
+    try:
+        return api().pedir("GET", "/salud", timeout=5)[0] == 200
+    except ErrorAPI as e:
+        print(f"Error conectando a la API: {e}")
+        return False
+
+
+# --- CRUD remoto (mismas firmas que crud/*.py) ---
+
+class ClienteCRUD:
+
+    @staticmethod
+    def crear_cliente(db, nombre: str, email: str, edad: int):
+        estado, datos = _escribir("POST", "/clientes", {"nombre": nombre, "email": email, "edad": edad},
+                                  operacion="crear_cliente")
+        if estado != 201:
+            if estado is not None:
+                print(f"Error al crear cliente: {_mensaje(datos, estado)}")
+            return None
+        return SimpleNamespace(**datos)
+
+    @staticmethod
+    def leer_clientes(db):
+        return [SimpleNamespace(**c) for c in api().leer("/clientes/catalogo")]
+
+    @staticmethod
+    def leer_clientes_pagina(db, offset: int = 0, limite: int = 100, orden: str = "nombre",
+                             descendente: bool = False, despues_de=None):
+        datos = api().leer("/clientes", **_pagina(offset, limite, orden, descendente, despues_de))
+        return datos["filas"], _cursor(datos["cursor"])
+
+    @staticmethod
+    def leer_clientes_por_email(db, emails):
+        emails = list(emails)
+        if not emails:
+            return []
+        return [tuple(f) for f in api().leer("/clientes/por-email", emails=json.dumps(emails))]
+
+    @staticmethod
+    def contar_clientes(db):
+        return api().leer("/clientes/cantidad")["cantidad"]
+
+    @staticmethod
+    def borrar_cliente(db, email: str):
+        estado, datos = _escribir("DELETE", "/clientes/" + quote(email, safe=""), operacion="borrar_cliente")
+        if estado is None:
+            return "Error"
+        return datos.get("resultado", "Error") if isinstance(datos, dict) else "Error"
+
+
+class IngredienteCRUD:
+
+    @staticmethod
+    def crear_ingrediente(db, nombre: str, unidad: str, cantidad: float):
+        estado, datos = _escribir("POST", "/ingredientes",
+                                  {"nombre": nombre, "unidad": unidad, "cantidad": cantidad},
+                                  operacion="crear_ingrediente")
+        if estado != 201:
+            if estado is not None:
+                print(f"Error al crear ingrediente: {_mensaje(datos, estado)}")
+            return None
+        return SimpleNamespace(**datos)
+
+    @staticmethod
+    def borrar_ingrediente(db, ingrediente_id: int):
+        estado, _ = _escribir("DELETE", f"/ingredientes/{int(ingrediente_id)}", operacion="borrar_ingrediente")
+        return estado == 200
+
+    @staticmethod
+    def leer_ingredientes_pagina(db, offset: int = 0, limite: int = 100, orden: str = "id",
+                                 descendente: bool = False, despues_de=None, umbral: float = None):
+        datos = api().leer("/ingredientes", umbral=umbral,
+                           **_pagina(offset, limite, orden, descendente, despues_de))
+        return datos["filas"], _cursor(datos["cursor"])
+
+    @staticmethod
+    def leer_ingredientes_por_id(db, ids):
+        ids = list(ids)
+        if not ids:
+            return []
+        return [tuple(f) for f in api().leer("/ingredientes/por-id", ids=_ids(ids))]
+
+    @staticmethod
+    def contar_ingredientes(db, umbral: float = None):
+        return api().leer("/ingredientes/cantidad", umbral=umbral)["cantidad"]
+
+    @staticmethod
+    def cargar_masivamente_desde_csv(db, ruta_archivo: str, tamano_lote: int = 5000):
+        # El servidor usa su propio tamaño de lote
+        try:
+            with open(ruta_archivo, "rb") as archivo:
+                contenido = archivo.read()
+        except OSError as e:
+            return f"Error al leer el archivo: {e}"
+        estado, datos = _escribir("POST", "/ingredientes/csv", contenido, tipo="text/csv",
+                                  operacion="la carga de CSV")
+        if estado is None:
+            return f"Error: {datos}"
+        return _mensaje(datos, estado) if estado != 200 else datos["mensaje"]
+
+
+class MenuCRUD:
+
+    @staticmethod
+    def _menu(datos):
+        # Misma navegación que un Menu del ORM: menu.ingredientes_receta[i].ingrediente.nombre
+        receta = [SimpleNamespace(ingrediente_id=i_id, cantidad_requerida=cant,
+                                  ingrediente=SimpleNamespace(id=i_id, nombre=nombre, unidad=unidad))
+                  for i_id, nombre, cant, unidad in datos.get("receta", [])]
+        return SimpleNamespace(id=datos["id"], nombre=datos["nombre"], descripcion=datos["descripcion"],
+                               precio=datos["precio"], ingredientes_receta=receta)
+
+    @staticmethod
+    def leer_menus(db):
+        return [MenuCRUD._menu(m) for m in api().leer("/menus/catalogo")]
+
+    @staticmethod
+    def leer_menus_basico(db, ids=None):
+        filas = [FilaMenu(*f) for f in api().leer("/menus/basico")]
+        if ids is None:
+            return filas
+        ids = set(ids)
+        return [f for f in filas if f.id in ids]
+
+    @staticmethod
+    def leer_menus_pagina(db, offset: int = 0, limite: int = 100, orden: str = "id",
+                          descendente: bool = False, despues_de=None):
+        datos = api().leer("/menus", **_pagina(offset, limite, orden, descendente, despues_de))
+        return datos["filas"], _cursor(datos["cursor"])
+
+    @staticmethod
+    def leer_menus_por_id(db, ids):
+        ids = list(ids)
+        if not ids:
+            return []
+        return [tuple(f) for f in api().leer("/menus/por-id", ids=_ids(ids))]
+
+    @staticmethod
+    def contar_menus(db):
+        return api().leer("/menus/cantidad")["cantidad"]
+
+    @staticmethod
+    def obtener_recetas(db, ids_menus):
+        ids_menus = list(ids_menus)
+        if not ids_menus:
+            return {}
+        return {r["id"]: RecetaMenu(r["id"], r["nombre"], r["precio"], tuple(map(tuple, r["receta"])))
+                for r in api().leer("/menus/recetas", ids=_ids(ids_menus))}
+
+    @staticmethod
+    def calcular_porciones_disponibles(db):
+        return [tuple(f) for f in api().leer("/menus/porciones")]
+
+    @staticmethod
+    def crear_menu(db, nombre: str, descripcion: str, lista_ingredientes: list, precio: float):
+        estado, datos = _escribir("POST", "/menus", {"nombre": nombre, "descripcion": descripcion,
+                                                     "ingredientes": lista_ingredientes, "precio": precio},
+                                  operacion="crear_menu")
+        if estado != 201:
+            if estado is not None:
+                print(f"Error al crear menú: {_mensaje(datos, estado)}")
+            return None
+        return SimpleNamespace(**datos)
+
+    @staticmethod
+    def borrar_menu(db, menu_id: int):
+        estado, _ = _escribir("DELETE", f"/menus/{int(menu_id)}", operacion="borrar_menu")
+        return estado == 200
+
+
+class PedidoCRUD:
+
+    texto_boleta = staticmethod(_PedidoLocal.texto_boleta)
+
+    @staticmethod
+    def registrar_compra(db, cliente_email: str, lista_menus: list, fecha_seleccionada=None):
+        """Mismo contrato que el local: (True, DatosBoleta) o (False, mensaje)."""
+        # Se aceptan ids o RecetaMenu/Menu, como en PedidoCRUD.registrar_compra
+        ids = [m if isinstance(m, int) else m.id for m in lista_menus]
+        estado, datos = _escribir("POST", "/ventas", {"cliente_email": cliente_email, "menus": ids,
+                                                      "fecha": fecha_seleccionada},
+                                  operacion="registrar_compra")
+        if estado is None:
+            return False, f"Error BD: {datos}"
+        if estado != 201:
+            return False, _mensaje(datos, estado)
+        boleta = datos["boleta"]
+        return True, DatosBoleta(boleta["id"], boleta["cliente"], boleta["email"], _fecha(boleta["fecha"]),
+                                 [tuple(it) for it in boleta["items"]])
+
+    @staticmethod
+    def procesar_compra(db, cliente_email: str, lista_menus: list, fecha_seleccionada=None):
+        exito, resultado = PedidoCRUD.registrar_compra(db, cliente_email, lista_menus, fecha_seleccionada)
+        if not exito:
+            return False, resultado
+        return True, PedidoCRUD.texto_boleta(resultado)
+
+    @staticmethod
+    def _filas(filas):
+        return [FilaPedido(f[0], f[1], f[2], _fecha(f[3])) for f in filas]
+
+    @staticmethod
+    def buscar_pedidos(db, texto_email: str = "", fecha_desde=None, fecha_hasta=None,
+                       despues_de=None, limite: int = 100, contiene: bool = False):
+        datos = api().leer("/pedidos", texto=texto_email or "", desde=_a_texto(fecha_desde),
+                           hasta=_a_texto(fecha_hasta), limite=limite, contiene="1" if contiene else "0",
+                           despues_de=json.dumps(list(despues_de), default=_a_json) if despues_de else None)
+        cursor = datos["cursor"]
+        return PedidoCRUD._filas(datos["filas"]), (_fecha(cursor[0]), cursor[1]) if cursor else None
+
+    @staticmethod
+    def leer_pedidos_por_id(db, ids):
+        ids = list(ids)
+        if not ids:
+            return []
+        return PedidoCRUD._filas(api().leer("/pedidos/por-id", ids=_ids(ids)))
+
+    @staticmethod
+    def borrar_pedido_y_restaurar_stock(db, pedido_id: int):
+        estado, datos = _escribir("DELETE", f"/pedidos/{int(pedido_id)}", operacion="anular el pedido")
+        if estado not in (200, None):
+            print(f"No se pudo anular el pedido: {_mensaje(datos, estado)}")
+        return estado == 200
+
+    @staticmethod
+    def calcular_total_ventas(db):
+        return float(api().leer("/ventas/total")["total"])
+
+
+class ResumenCRUD:
+
+    @staticmethod
+    def reconstruir_si_vacio(db):
+        # Los resúmenes los mantiene el servidor sobre su propia BD
+        return False
+
+
+def _a_texto(fecha):
+    return fecha.isoformat() if fecha else None
+
+
+class Graficos(graficos.Graficos):
+    """
+    Series por HTTP (GET /graficos); el dibujo sigue siendo local (GraficoPersistente).
+    Lo recibido se guarda en la caché local de gráficos, que se invalida con los
+    cambios que publica SeguidorCambios.
+    """
+
+    @staticmethod
+    def obtener_serie(db, tipo_grafico, periodo=None, fecha_desde=None, fecha_hasta=None,
+                      max_puntos=None, modo="barras"):
+        clave = graficos.Graficos._clave_cache(tipo_grafico, periodo, fecha_desde, fecha_hasta, max_puntos, modo)
+        entrada = graficos.cache.obtener(clave)
+        if entrada is not None and entrada["serie"] is not None:
+            return entrada["serie"], None
+
+        try:
+            estado, datos = api().pedir("GET", "/graficos", {
+                "tipo": tipo_grafico, "periodo": periodo, "desde": _a_texto(fecha_desde),
+                "hasta": _a_texto(fecha_hasta), "max_puntos": max_puntos, "modo": modo})
+        except ErrorAPI as e:
+            return None, str(e)
+        if estado != 200:
+            return None, _mensaje(datos, estado)
+        serie = (datos["etiquetas"], datos["valores"], datos["escala"])
+        graficos.cache.guardar(clave, serie=serie)
+        return serie, None
+
+
+# --- Catálogo y cambios de otras cajas ---
+
+class CatalogoRemoto:
+    """
+    Mismo uso que catalogo.Catalogo (clientes(), menus(), refrescar(), aplicar_cambios()),
+    con listas traídas de la API. Un cambio recarga la lista afectada con una petición.
+    """
+
+    def __init__(self):
+        self._clientes = None
+        self._menus = None
+
+    def clientes(self):
+        if self._clientes is None:
+            self._clientes = ClienteCRUD.leer_clientes(None)
+        return self._clientes
+
+    def menus(self):
+        if self._menus is None:
+            self._menus = MenuCRUD.leer_menus_basico(None)
+        return self._menus
+
+    def refrescar(self, *que):
+        que = que or ("clientes", "menus")
+        if "clientes" in que:
+            self._clientes = None
+        if "menus" in que:
+            self._menus = None
+
+    def aplicar_cambios(self, que, cambios):
+        lista = self._clientes if que == "clientes" else self._menus
+        if lista is None:
+            return False
+        if not (cambios["recargar"] or cambios["insertado"] or cambios["actualizado"] or cambios["borrado"]):
+            return False
+        self.refrescar(que)
+        return True
+
+    def cerrar(self):
+        self.refrescar()
+
+
+class SeguidorCambios:
+    """
+    Hilo que consulta GET /cambios (long-poll) y publica lo recibido con
+    eventos.publicar, como si fueran commits locales. Si se perdieron cambios
+    (servidor reiniciado o buffer superado) publica "recargar" para cada entidad.
+    """
+
+    def __init__(self, espera=ESPERA_CAMBIOS, reintento=2.0):
+        self.espera = espera
+        self.reintento = reintento
+        self._detener = threading.Event()
+        self._hilo = None
+        self._ultimo = -1
+        # Conexión propia: el long-poll no debe ocupar la de los hilos de trabajo
+        self._conexion = ConexionAPI(URL_API, timeout=espera + TIMEOUT) if URL_API else None
+
+    def iniciar(self):
+        if self._conexion is not None and self._hilo is None:
+            self._hilo = threading.Thread(target=self._ciclo, name="seguidor-cambios", daemon=True)
+            self._hilo.start()
+
+    def detener(self):
+        self._detener.set()
+
+    def _ciclo(self):
+        sin_conexion = False
+        while not self._detener.is_set():
+            try:
+                datos = self._conexion.leer("/cambios", desde=self._ultimo,
+                                            espera=self.espera if self._ultimo >= 0 else 0)
+            except ErrorAPI as e:
+                if not sin_conexion:
+                    print(f"Seguimiento de cambios interrumpido: {e}")
+                    sin_conexion = True
+                self._detener.wait(self.reintento)
+                continue
+            if sin_conexion:
+                print("Seguimiento de cambios reanudado.")
+                sin_conexion = False
+
+            self._ultimo = datos["ultimo"]
+            if datos["recargar"]:
+                publicar([Cambio(entidad, "recargar", None) for entidad in datos["entidades"]])
+            elif datos["cambios"]:
+                # Las claves compuestas llegan como listas: se vuelven tuplas (hashables)
+                publicar([Cambio(e, a, tuple(c) if isinstance(c, list) else c) for e, a, c in datos["cambios"]])
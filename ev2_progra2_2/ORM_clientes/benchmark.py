@@ -0,0 +1,398 @@
+# Generador de datos sintéticos y benchmark de la capa CRUD.
+#
+#   python benchmark.py generar --bd sqlite:///bench.db --clientes 10000 --pedidos 500000
+#   python benchmark.py medir --bd sqlite:///bench.db --salida resultados.json
+#   python benchmark.py comparar base.json resultados.json --tolerancia 0.2
+#
+# 'generar' carga todo con INSERT masivos (executemany por tramos) y reconstruye
+# los resúmenes diarios al final. 'medir' corre cada caso dentro de una transacción
+# externa que se deshace al terminar (los commit del CRUD quedan como SAVEPOINT):
+# la BD no cambia y cada corrida mide sobre los mismos datos.
+# 'comparar' termina con código 1 si algún caso es más lento que la tolerancia.
+import os
+import sys
+import csv
+import json
+import time
+import random
+import argparse
+import platform
+import datetime
+import statistics
+import subprocess
+import tempfile
+from contextlib import contextmanager
+from sqlalchemy import insert, select, func, event
+import sqlalchemy
+from database import crear_motor, SesionRastreada
+from migraciones import preparar_esquema
+from models import (Cliente, Ingrediente, Menu, MenuIngrediente, Pedido, PedidoMenu,
+                    normalizar_nombre)
+from crud.cliente_crud import ClienteCRUD
+from crud.ingrediente_crud import IngredienteCRUD
+from crud.menu_crud import MenuCRUD
+from crud.pedido_crud import PedidoCRUD
+from crud.resumen_crud import ResumenCRUD
+from graficos import Graficos
+
+NOMBRES = ["Carlos", "María", "José", "Ana", "Luis", "Camila", "Jorge", "Valentina", "Pedro",
+           "Fernanda", "Diego", "Javiera", "Matías", "Catalina", "Felipe", "Constanza"]
+APELLIDOS = ["Pérez", "González", "Muñoz", "Rojas", "Díaz", "Soto", "Contreras", "Silva",
+             "Martínez", "Sepúlveda", "Morales", "Rodríguez", "López", "Fuentes"]
+INGREDIENTES = ["Pan", "Carne", "Queso", "Tomate", "Palta", "Mayonesa", "Lechuga", "Cebolla",
+                "Vienesa", "Papas", "Pollo", "Tocino", "Huevo", "Pepinillo", "Ají"]
+UNIDADES = ["unid", "kg", "lt", "gr"]
+PLATOS = ["Completo", "Hamburguesa", "Churrasco", "Barros Luco", "Chacarero", "Ave Palta",
+          "Lomito", "Papas Fritas", "Chorrillana", "Sándwich"]
+
+TAMANO_TRAMO = 10000
+
+
+# --- Generación ---
+
+def _insertar_por_tramos(db, tabla, filas):
+    """executemany de a TAMANO_TRAMO filas (filas puede ser un generador)."""
+    tramo = []
+    for fila in filas:
+        tramo.append(fila)
+        if len(tramo) == TAMANO_TRAMO:
+            db.execute(insert(tabla), tramo)
+            tramo = []
+    if tramo:
+        db.execute(insert(tabla), tramo)
+
+
+def generar(db, clientes, ingredientes, menus, pedidos, anios, semilla):
+    """
+    Agrega un conjunto de datos realista a la BD:
+    - clientes con nombres y edades variados;
+    - ingredientes con stock alto (las compras del benchmark no se quedan sin stock);
+    - menús con recetas de 2 a 6 ingredientes;
+    - pedidos de 1 a 4 menús repartidos en los últimos 'anios' años, más
+      frecuentes los fines de semana y concentrados en el 20% de los clientes.
+    Retorna los segundos de cada etapa.
+    """
+    azar = random.Random(semilla)
+    tiempos = {}
+    inicio = time.perf_counter()
+
+    # Prefijos por corrida: se puede generar varias veces sobre la misma BD
+    corrida = f"{semilla}-{int(time.time())}"
+
+    emails = [f"cliente{i}.{corrida}@bench.cl" for i in range(clientes)]
+    _insertar_por_tramos(db, Cliente, (
+        {"email": email, "nombre": f"{azar.choice(NOMBRES)} {azar.choice(APELLIDOS)}",
+         "edad": azar.randint(18, 80)}
+        for email in emails))
+    tiempos["clientes"] = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    nombres_ing = [f"{INGREDIENTES[i % len(INGREDIENTES)]} {i} {corrida}" for i in range(ingredientes)]
+    filas = db.execute(insert(Ingrediente).returning(Ingrediente.id), [
+        {"nombre": n, "nombre_normalizado": normalizar_nombre(n),
+         "unidad": azar.choice(UNIDADES), "cantidad": 1e9}
+        for n in nombres_ing]).all()
+    ids_ing = [f.id for f in filas]
+    tiempos["ingredientes"] = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    filas = db.execute(insert(Menu).returning(Menu.id, Menu.precio), [
+        {"nombre": f"{PLATOS[i % len(PLATOS)]} {i}", "descripcion": "Menú de prueba",
+         "precio": azar.randrange(2000, 15000, 500)}
+        for i in range(menus)]).all()
+    precios = {f.id: f.precio for f in filas}
+    ids_menus = list(precios)
+    _insertar_por_tramos(db, MenuIngrediente, (
+        {"menu_id": m_id, "ingrediente_id": i_id, "cantidad_requerida": round(azar.uniform(0.1, 3), 2)}
+        for m_id in ids_menus
+        for i_id in azar.sample(ids_ing, min(len(ids_ing), azar.randint(2, 6)))))
+    tiempos["menus"] = time.perf_counter() - inicio
+
+    # Pedidos ordenados por fecha, con id explícito para poder insertar sus líneas sin RETURNING
+    inicio = time.perf_counter()
+    ahora = datetime.datetime.now().replace(microsecond=0)
+    segundos_rango = int(anios * 365 * 86400)
+    frecuentes = emails[:max(1, len(emails) // 5)]
+
+    def fecha_al_azar():
+        while True:
+            fecha = ahora - datetime.timedelta(seconds=azar.randrange(segundos_rango))
+            # Fines de semana con el doble de movimiento
+            if fecha.weekday() >= 5 or azar.random() < 0.5:
+                return fecha
+
+    fechas = sorted(fecha_al_azar() for _ in range(pedidos))
+    primer_id = (db.query(func.max(Pedido.id)).scalar() or 0) + 1
+
+    # Por tramos: primero los pedidos y luego sus líneas (la FK exige ese orden)
+    for desde in range(0, len(fechas) if clientes and menus else 0, TAMANO_TRAMO):
+        filas, lineas = [], []
+        for n, fecha in enumerate(fechas[desde:desde + TAMANO_TRAMO], start=primer_id + desde):
+            elegidos = azar.sample(ids_menus, min(len(ids_menus), azar.randint(1, 4)))
+            cantidades = [azar.choice((1, 1, 1, 2, 3)) for _ in elegidos]
+            total = sum(precios[m] * c for m, c in zip(elegidos, cantidades))
+            email = azar.choice(frecuentes) if azar.random() < 0.8 else azar.choice(emails)
+            filas.append({"id": n, "descripcion": f"Compra de {sum(cantidades)} items. Total: ${total}",
+                          "fecha": fecha, "cliente_email": email})
+            lineas.extend({"pedido_id": n, "menu_id": m, "cantidad": c, "precio_unitario": precios[m]}
+                          for m, c in zip(elegidos, cantidades))
+        db.execute(insert(Pedido), filas)
+        db.execute(insert(PedidoMenu), lineas)
+    tiempos["pedidos"] = time.perf_counter() - inicio
+
+    db.commit()
+
+    inicio = time.perf_counter()
+    ResumenCRUD.reconstruir(db)
+    tiempos["resumenes"] = time.perf_counter() - inicio
+    return tiempos
+
+
+# --- Medición ---
+
+def motor_descartable(url):
+    """
+    Motor para 'medir'. En SQLite el driver abre la transacción recién con el primer
+    INSERT/UPDATE y así los SAVEPOINT no quedan dentro de ella: se desactiva ese manejo
+    y el BEGIN lo emite SQLAlchemy (receta de la documentación de pysqlite).
+    """
+    motor = crear_motor(url)
+    if motor.dialect.name == "sqlite":
+        @event.listens_for(motor, "connect")
+        def _sin_begin_del_driver(conexion_dbapi, _registro):
+            conexion_dbapi.isolation_level = None
+
+        @event.listens_for(motor, "begin")
+        def _begin(conexion):
+            conexion.exec_driver_sql("BEGIN")
+    return motor
+
+
+@contextmanager
+def sesion_descartable(motor):
+    """
+    Sesión dentro de una transacción externa que se deshace al salir: los commit
+    y rollback del CRUD solo cierran SAVEPOINTs, así que la BD queda como estaba.
+    """
+    conexion = motor.connect()
+    transaccion = conexion.begin()
+    db = SesionRastreada(bind=conexion, join_transaction_mode="create_savepoint")
+    try:
+        yield db
+    finally:
+        db.close()
+        transaccion.rollback()
+        conexion.close()
+
+
+def _estadisticas(segundos, operaciones):
+    ordenados = sorted(segundos)
+    mediana = statistics.median(ordenados)
+    return {
+        "repeticiones": len(ordenados),
+        "operaciones": operaciones,
+        "min_s": round(ordenados[0], 6),
+        "mediana_s": round(mediana, 6),
+        "media_s": round(statistics.fmean(ordenados), 6),
+        "p95_s": round(ordenados[min(len(ordenados) - 1, int(len(ordenados) * 0.95))], 6),
+        "ops_por_segundo": round(operaciones / mediana, 1) if mediana else None,
+    }
+
+
+def _medir(motor, preparar, ejecutar, repeticiones, calentamiento=1):
+    """
+    Corre 'ejecutar(db, datos)' repeticiones + calentamiento veces, cada una en su
+    sesión descartable; 'preparar(db)' arma los datos fuera del tiempo medido.
+    Retorna (segundos por repetición, operaciones por repetición).
+    """
+    segundos = []
+    operaciones = 1
+    for i in range(calentamiento + repeticiones):
+        with sesion_descartable(motor) as db:
+            datos = preparar(db, i) if preparar else None
+            inicio = time.perf_counter()
+            operaciones = ejecutar(db, datos) or 1
+            transcurrido = time.perf_counter() - inicio
+        if i >= calentamiento:
+            segundos.append(transcurrido)
+    return segundos, operaciones
+
+
+def casos(azar, por_repeticion, filas_csv, carpeta_temporal):
+    """Casos del benchmark: nombre -> (preparar, ejecutar)."""
+
+    def preparar_clientes(db, i):
+        return [(f"{azar.choice(NOMBRES)} {azar.choice(APELLIDOS)}", f"nuevo{i}.{n}@bench.cl",
+                 azar.randint(18, 80)) for n in range(por_repeticion)]
+
+    def crear_clientes(db, datos):
+        for nombre, email, edad in datos:
+            ClienteCRUD.crear_cliente(db, nombre, email, edad)
+        return len(datos)
+
+    def preparar_csv(db, i):
+        # Mitad ingredientes existentes (se suman) y mitad nuevos
+        existentes = [n for (n,) in db.query(Ingrediente.nombre).limit(filas_csv // 2)]
+        ruta = os.path.join(carpeta_temporal, f"ingredientes_{i}.csv")
+        with open(ruta, "w", newline="", encoding="utf-8") as archivo:
+            escritor = csv.writer(archivo)
+            escritor.writerow(["nombre", "unidad", "cantidad"])
+            for n in range(filas_csv):
+                nombre = existentes[n] if n < len(existentes) else f"Insumo {i}-{n}"
+                escritor.writerow([nombre, azar.choice(UNIDADES), azar.randint(1, 100)])
+        return ruta
+
+    def cargar_csv(db, ruta):
+        IngredienteCRUD.cargar_masivamente_desde_csv(db, ruta)
+        return filas_csv
+
+    def preparar_compras(db, i):
+        emails = [e for (e,) in db.query(Cliente.email).limit(1000)]
+        ids_menus = [m for (m,) in db.query(Menu.id)]
+        fecha = datetime.datetime.now()
+        return [(azar.choice(emails), [azar.choice(ids_menus) for _ in range(azar.randint(1, 4))], fecha)
+                for _ in range(por_repeticion)] if emails and ids_menus else []
+
+    def procesar_compras(db, datos):
+        for email, menus, fecha in datos:
+            PedidoCRUD.procesar_compra(db, email, menus, fecha)
+        return len(datos)
+
+    lista = {
+        "ClienteCRUD.crear_cliente": (preparar_clientes, crear_clientes),
+        "IngredienteCRUD.cargar_masivamente_desde_csv": (preparar_csv, cargar_csv),
+        "MenuCRUD.leer_menus": (None, lambda db, _: len(MenuCRUD.leer_menus(db)) and 1),
+        "PedidoCRUD.procesar_compra": (preparar_compras, procesar_compras),
+        "PedidoCRUD.calcular_total_ventas": (None, lambda db, _: PedidoCRUD.calcular_total_ventas(db) and 1),
+    }
+    graficos = [("Ventas por Fecha", p) for p in ("Diario", "Semanal", "Mensual", "Anual", "Automático")]
+    graficos += [("Distribución Menús", None), ("Uso de Ingredientes", None)]
+    for tipo, periodo in graficos:
+        nombre = f"Graficos.obtener_datos[{tipo}{'/' + periodo if periodo else ''}]"
+        lista[nombre] = (None, lambda db, _, t=tipo, p=periodo: Graficos.obtener_datos(db, t, p) and 1)
+    return lista
+
+
+def contar_dataset(motor):
+    with motor.connect() as conexion:
+        return {tabla.__tablename__: conexion.execute(select(func.count()).select_from(tabla)).scalar()
+                for tabla in (Cliente, Ingrediente, Menu, MenuIngrediente, Pedido, PedidoMenu)}
+
+
+def commit_actual():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def medir(motor, repeticiones, por_repeticion, filas_csv, solo=None, semilla=1):
+    azar = random.Random(semilla)
+    resultados = {}
+    with tempfile.TemporaryDirectory() as carpeta:
+        for nombre, (preparar, ejecutar) in casos(azar, por_repeticion, filas_csv, carpeta).items():
+            if solo and not any(s.lower() in nombre.lower() for s in solo):
+                continue
+            segundos, operaciones = _medir(motor, preparar, ejecutar, repeticiones)
+            resultados[nombre] = _estadisticas(segundos, operaciones)
+            print(f"  {nombre:<55} mediana {resultados[nombre]['mediana_s'] * 1000:9.2f} ms"
+                  f"  ({resultados[nombre]['ops_por_segundo']} ops/s)")
+    return resultados
+
+
+def comparar(base, nuevo, tolerancia):
+    """Imprime la razón nuevo/base de cada caso; retorna los nombres que empeoraron más que 'tolerancia'."""
+    regresiones = []
+    print(f"{'caso':<55} {'base ms':>10} {'nuevo ms':>10} {'razón':>7}")
+    for nombre, datos in nuevo["resultados"].items():
+        anterior = base["resultados"].get(nombre)
+        if anterior is None:
+            print(f"{nombre:<55} {'-':>10} {datos['mediana_s'] * 1000:10.2f}   (nuevo)")
+            continue
+        razon = datos["mediana_s"] / anterior["mediana_s"] if anterior["mediana_s"] else float("inf")
+        marca = "  <-- REGRESIÓN" if razon > 1 + tolerancia else ""
+        if marca:
+            regresiones.append(nombre)
+        print(f"{nombre:<55} {anterior['mediana_s'] * 1000:10.2f} {datos['mediana_s'] * 1000:10.2f} "
+              f"{razon:7.2f}{marca}")
+    return regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Datos sintéticos y benchmark del CRUD del restaurante.")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p_gen = sub.add_parser("generar", help="Carga un conjunto de datos sintético")
+    p_gen.add_argument("--bd", default="sqlite:///bench.db", help="URL de la BD (default: sqlite:///bench.db)")
+    p_gen.add_argument("--clientes", type=int, default=10000)
+    p_gen.add_argument("--ingredientes", type=int, default=200)
+    p_gen.add_argument("--menus", type=int, default=100)
+    p_gen.add_argument("--pedidos", type=int, default=200000)
+    p_gen.add_argument("--anios", type=float, default=3)
+    p_gen.add_argument("--semilla", type=int, default=1)
+
+    p_med = sub.add_parser("medir", help="Corre el benchmark y guarda los resultados en JSON")
+    p_med.add_argument("--bd", default="sqlite:///bench.db")
+    p_med.add_argument("--repeticiones", type=int, default=5)
+    p_med.add_argument("--por-repeticion", type=int, default=50,
+                       help="Clientes / compras creados en cada repetición")
+    p_med.add_argument("--filas-csv", type=int, default=5000)
+    p_med.add_argument("--solo", nargs="*", help="Medir solo los casos que contengan estos textos")
+    p_med.add_argument("--salida", default=None, help="Archivo JSON (default: benchmark_<fecha>.json)")
+
+    p_cmp = sub.add_parser("comparar", help="Compara dos resultados JSON")
+    p_cmp.add_argument("base")
+    p_cmp.add_argument("nuevo")
+    p_cmp.add_argument("--tolerancia", type=float, default=0.2,
+                       help="Empeoramiento permitido de la mediana (0.2 = 20%%)")
+
+    args = parser.parse_args()
+
+    if args.comando == "comparar":
+        with open(args.base, encoding="utf-8") as f:
+            base = json.load(f)
+        with open(args.nuevo, encoding="utf-8") as f:
+            nuevo = json.load(f)
+        regresiones = comparar(base, nuevo, args.tolerancia)
+        if regresiones:
+            print(f"{len(regresiones)} caso(s) más lentos que la tolerancia.")
+            sys.exit(1)
+        return
+
+    motor = crear_motor(args.bd) if args.comando == "generar" else motor_descartable(args.bd)
+    preparar_esquema(motor)
+
+    if args.comando == "generar":
+        db = SesionRastreada(bind=motor)
+        try:
+            tiempos = generar(db, args.clientes, args.ingredientes, args.menus, args.pedidos,
+                              args.anios, args.semilla)
+        finally:
+            db.close()
+        for etapa, segundos in tiempos.items():
+            print(f"  {etapa:<15} {segundos:8.2f} s")
+        print(f"Datos: {contar_dataset(motor)}")
+        return
+
+    print(f"Midiendo sobre {contar_dataset(motor)}")
+    resultados = medir(motor, args.repeticiones, args.por_repeticion, args.filas_csv, args.solo)
+    informe = {
+        "fecha": datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit": commit_actual(),
+        "bd": motor.url.render_as_string(hide_password=True),
+        "python": platform.python_version(),
+        "sqlalchemy": sqlalchemy.__version__,
+        "dataset": contar_dataset(motor),
+        "parametros": {"repeticiones": args.repeticiones, "por_repeticion": args.por_repeticion,
+                       "filas_csv": args.filas_csv},
+        "resultados": resultados,
+    }
+    salida = args.salida or f"benchmark_{datetime.datetime.now():%Y%m%d_%H%M%S}.json"
+    with open(salida, "w", encoding="utf-8") as f:
+        json.dump(informe, f, indent=2, ensure_ascii=False)
+    print(f"Resultados guardados en {salida}")
+
+
+if __name__ == "__main__":
+    main()
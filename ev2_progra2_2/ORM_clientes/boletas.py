@@ -0,0 +1,262 @@
+# Servicio de boletas PDF.
+# Los PDF se arman en un pool de procesos, fuera del hilo de Tk y de la venta:
+# la compra se confirma apenas se guarda el pedido y el PDF llega después.
+# A los procesos solo viajan datos planos (DatosBoleta); para un rango de fechas
+# el proceso lee la BD por su cuenta y escribe las boletas en un PDF; si son más de
+# MAX_BOLETAS_POR_ARCHIVO siguen en archivo_2.pdf, archivo_3.pdf, ... (memoria acotada).
+#
+# Uso por consola (boletas de un período en un solo archivo):
+#   python boletas.py 2025-01-01 2025-01-31 boletas_enero.pdf
+import os
+import sys
+import time
+import datetime
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from fpdf import FPDF
+from database import sesion_scope
+from crud.pedido_crud import PedidoCRUD, DatosBoleta
+
+# Datos fijos del encabezado (iguales en todas las boletas)
+NEGOCIO = {
+    "titulo": "Boleta Restaurante",
+    "razon_social": "Razón Social del Negocio",
+    "rut": "12345678-9",
+    "direccion": "Calle Falsa 123",
+    "telefono": "+56 9 1234 5678",
+}
+PIE = ("Gracias por su compra. Para cualquier consulta, llámenos al +56 9 777 5678.",
+       "Los productos adquiridos no tienen garantía.")
+IVA = 0.19
+# FPDF mantiene cada página en memoria (~3 KiB por boleta) hasta guardar el archivo
+MAX_BOLETAS_POR_ARCHIVO = 5000
+
+
+def totales(items):
+    """(subtotal, iva, total) de items [(nombre, cantidad, precio_unitario), ...]."""
+    subtotal = sum(cant * precio for _, cant, precio in items)
+    iva = subtotal * IVA
+    return subtotal, iva, subtotal + iva
+
+
+def datos_de_pedido(pedido):
+    """DatosBoleta a partir de un Pedido ORM (con items, menu y cliente accesibles)."""
+    return DatosBoleta(pedido.id, pedido.cliente.nombre, pedido.cliente.email, pedido.fecha,
+                       [(it.menu.nombre, it.cantidad, it.precio_unitario) for it in pedido.items])
+
+
+# --- Armado del PDF (corre dentro de los procesos del pool) ---
+
+def _plantilla_encabezado():
+    """
+    Celdas del encabezado fijo: (estilo, tamaño, texto). Se arma una vez por
+    proceso; cada página solo las vuelca, sin volver a formatear los datos del negocio.
+    """
+    return (
+        ('B', 16, NEGOCIO["titulo"]),
+        ('', 12, NEGOCIO["razon_social"]),
+        ('', 12, f"RUT: {NEGOCIO['rut']}"),
+        ('', 12, f"Dirección: {NEGOCIO['direccion']}"),
+        ('', 12, f"Teléfono: {NEGOCIO['telefono']}"),
+    )
+
+
+_ENCABEZADO = _plantilla_encabezado()
+
+
+class PDFBoletas(FPDF):
+    """FPDF que dibuja el encabezado del negocio en cada página (header() lo llama add_page)."""
+
+    def header(self):
+        for estilo, tamano, texto in _ENCABEZADO:
+            self.set_font("Helvetica", estilo, tamano)
+            self.cell(0, 10, texto, new_x="LMARGIN", new_y="NEXT", align='L')
+        self.set_font("Helvetica", size=12)
+
+    def agregar_boleta(self, datos: DatosBoleta):
+        """Agrega la boleta en una página nueva (si es larga, sigue en las siguientes)."""
+        self.add_page()
+        subtotal, iva, total = totales(datos.items)
+
+        self.cell(0, 10, f"Cliente: {datos.cliente} ({datos.email})", new_x="LMARGIN", new_y="NEXT")
+        self.cell(0, 10, f"Fecha: {datos.fecha.strftime('%d/%m/%Y %H:%M:%S')}",
+                  new_x="LMARGIN", new_y="NEXT", align='R')
+        self.ln(10)
+
+        # --- Tabla de Menús ---
+        self.set_font("Helvetica", 'B', 12)
+        self.cell(70, 10, "Nombre Menú", border=1)
+        self.cell(20, 10, "Cant.", border=1)
+        self.cell(35, 10, "Precio Unitario", border=1)
+        self.ln()
+
+        self.set_font("Helvetica", size=12)
+        for nombre, cantidad, precio in datos.items:
+            self.cell(70, 10, nombre, border=1)
+            self.cell(20, 10, str(cantidad), border=1)
+            self.cell(35, 10, f"${precio:.2f}", border=1)
+            self.ln()
+
+        # --- Totales ---
+        self.set_font("Helvetica", 'B', 12)
+        for etiqueta, valor in (("Subtotal:", subtotal), ("IVA (19%):", iva), ("Total:", total)):
+            self.cell(125, 10, etiqueta, align='R')
+            self.cell(35, 10, f"${valor:.2f}", new_x="LMARGIN", new_y="NEXT", align='R')
+
+        # --- Pie ---
+        self.set_font("Helvetica", 'I', 10)
+        self.ln(10)
+        for linea in PIE:
+            self.multi_cell(0, 10, linea, align='C', new_x="LMARGIN", new_y="NEXT")
+
+
+def _guardar(pdf, archivo):
+    # Se escribe a un temporal y se renombra: nunca queda un PDF a medio escribir
+    carpeta = os.path.dirname(archivo)
+    if carpeta:
+        os.makedirs(carpeta, exist_ok=True)
+    temporal = archivo + ".tmp"
+    pdf.output(temporal)
+    os.replace(temporal, archivo)
+
+
+def archivo_parte(archivo, numero):
+    """boletas.pdf, boletas_2.pdf, boletas_3.pdf, ...: la primera parte conserva el nombre."""
+    if numero == 1:
+        return archivo
+    base, extension = os.path.splitext(archivo)
+    return f"{base}_{numero}{extension}"
+
+
+def escribir_boletas(lista_datos, archivo, maximo_por_archivo=None):
+    """
+    Escribe una o varias boletas (iterable de DatosBoleta) en un PDF.
+    Con maximo_por_archivo, cada vez que se llena una parte se guarda y se sigue
+    en la siguiente (ver archivo_parte): la memoria no crece con el rango.
+    Retorna (archivo, cantidad, segundos); archivo es la primera parte.
+    """
+    inicio = time.perf_counter()
+    pdf = PDFBoletas()
+    cantidad = en_parte = 0
+    parte = 1
+    for datos in lista_datos:
+        if maximo_por_archivo and en_parte == maximo_por_archivo:
+            _guardar(pdf, archivo_parte(archivo, parte))
+            pdf, en_parte, parte = PDFBoletas(), 0, parte + 1
+        pdf.agregar_boleta(datos)
+        cantidad += 1
+        en_parte += 1
+    if en_parte:
+        _guardar(pdf, archivo_parte(archivo, parte))
+    return archivo, cantidad, time.perf_counter() - inicio
+
+
+def escribir_boleta(datos: DatosBoleta, archivo):
+    return escribir_boletas([datos], archivo)
+
+
+def escribir_rango(fecha_desde, fecha_hasta, archivo, tamano_lote=500):
+    """
+    Boletas de todos los pedidos del rango, leídas de la BD por tramos, en partes
+    de hasta MAX_BOLETAS_POR_ARCHIVO boletas (un solo PDF en rangos normales).
+    """
+    with sesion_scope(lectura=True) as db:
+        return escribir_boletas(
+            PedidoCRUD.leer_datos_boletas(db, fecha_desde, fecha_hasta, tamano_lote), archivo,
+            MAX_BOLETAS_POR_ARCHIVO)
+
+
+def cantidad_partes(cantidad):
+    """Cuántos archivos escribe escribir_rango para 'cantidad' boletas."""
+    return -(-cantidad // MAX_BOLETAS_POR_ARCHIVO)
+
+
+# --- Servicio (proceso principal) ---
+
+class ServicioBoletas:
+    """
+    Envía boletas al pool de procesos y lleva la cuenta del rendimiento.
+    generar(datos) y generar_rango(desde, hasta, archivo) retornan un Future; los
+    callbacks al_terminar((archivo, cantidad, segundos)) / al_fallar(error) se llaman
+    desde un hilo interno del pool: en Tk, pasarlos por TrabajadorBD.notificar.
+    El pool se crea con la primera boleta (cada proceso tarda ~0.5 s en importar fpdf).
+    """
+
+    def __init__(self, carpeta="boletas", procesos=None):
+        self.carpeta = carpeta
+        self.procesos = procesos or max(1, min(4, (os.cpu_count() or 2) - 1))
+        self._pool = None
+        self._lock = threading.Lock()
+        self._boletas = 0
+        self._segundos = 0.0      # tiempo de armado sumado de todos los procesos
+        self._primera = None      # instante del primer envío (para boletas/s reales)
+
+    def _ejecutor(self):
+        if self._pool is None:
+            # 'spawn' en todos los sistemas: hacer fork con Tk y los hilos de la BD vivos no es seguro
+            self._pool = ProcessPoolExecutor(max_workers=self.procesos,
+                                             mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    def _enviar(self, funcion, args, al_terminar, al_fallar):
+        with self._lock:
+            if self._primera is None:
+                self._primera = time.perf_counter()
+        futuro = self._ejecutor().submit(funcion, *args)
+
+        def terminado(f):
+            try:
+                archivo, cantidad, segundos = resultado = f.result()
+            except Exception as e:
+                if al_fallar is None:
+                    print(f"Error generando boleta PDF: {e}")
+                else:
+                    al_fallar(e)
+                return
+            with self._lock:
+                self._boletas += cantidad
+                self._segundos += segundos
+            if al_terminar is not None:
+                al_terminar(resultado)
+
+        futuro.add_done_callback(terminado)
+        return futuro
+
+    def generar(self, datos: DatosBoleta, al_terminar=None, al_fallar=None):
+        archivo = os.path.join(self.carpeta, f"boleta_{datos.id}.pdf")
+        return self._enviar(escribir_boleta, (datos, archivo), al_terminar, al_fallar)
+
+    def generar_rango(self, fecha_desde, fecha_hasta, archivo, al_terminar=None, al_fallar=None):
+        return self._enviar(escribir_rango, (fecha_desde, fecha_hasta, archivo), al_terminar, al_fallar)
+
+    def rendimiento(self):
+        """{"boletas", "segundos_armado", "boletas_por_segundo"} desde el primer envío."""
+        with self._lock:
+            transcurrido = time.perf_counter() - self._primera if self._primera else 0.0
+            return {
+                "boletas": self._boletas,
+                "segundos_armado": round(self._segundos, 3),
+                "boletas_por_segundo": round(self._boletas / transcurrido, 1) if transcurrido else 0.0,
+            }
+
+    def cerrar(self, esperar=True):
+        """Con esperar=True terminan las boletas en curso (no se pierden PDF de ventas ya hechas)."""
+        if self._pool is not None:
+            self._pool.shutdown(wait=esperar)
+            self._pool = None
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 4:
+        print("Uso: python boletas.py AAAA-MM-DD AAAA-MM-DD archivo.pdf")
+        sys.exit(1)
+    desde, hasta = (datetime.datetime.strptime(f, "%Y-%m-%d").date() for f in sys.argv[1:3])
+    archivo, cantidad, segundos = escribir_rango(desde, hasta, sys.argv[3])
+    if cantidad:
+        print(f"{cantidad} boletas en {archivo}: {segundos:.2f} s ({cantidad / segundos:.0f} boletas/s)")
+        partes = cantidad_partes(cantidad)
+        if partes > 1:
+            print(f"Repartidas en {partes} archivos: {archivo} ... {archivo_parte(archivo, partes)}")
+    else:
+        print("No hay pedidos en ese rango.")
@@ -0,0 +1,94 @@
+# Catálogo en memoria para la UI: clientes y menús cambian poco, pero los
+# combos del panel de compra los necesitan completos. En vez de recargarlos en
+# cada clic, se mantienen en una sesión de lectura de larga duración y se
+# recargan solo cuando la propia app los modifica (refrescar).
+# De los menús se guardan solo (id, nombre, precio): la receta de lo que se vende
+# sale de CacheRecetas, no del grafo ORM menú -> receta -> ingrediente.
+# (Las tablas de las pestañas usan ListaVirtual y leen solo la ventana visible.)
+from database import SessionLectura
+from models import Cliente
+from crud.cliente_crud import ClienteCRUD
+from crud.menu_crud import MenuCRUD
+
+
+class Catalogo:
+    """
+    Usar solo desde el hilo de Tk (una Session no es thread-safe).
+    Los objetos quedan en el identity map de la sesión; tras cada carga se
+    cierra la transacción (commit sin expirar) para no retener la conexión
+    ni impedir los checkpoints del WAL.
+    """
+
+    def __init__(self):
+        self._db = SessionLectura(expire_on_commit=False)
+        self._db.marcar_larga_duracion()
+        self._clientes = None
+        self._menus = None
+
+    def _terminar_lectura(self):
+        # Devuelve la conexión al pool; los objetos siguen cargados
+        self._db.commit()
+
+    def clientes(self):
+        if self._clientes is None:
+            self._clientes = ClienteCRUD.leer_clientes(self._db)
+            self._terminar_lectura()
+        return self._clientes
+
+    def menus(self):
+        """Filas (id, nombre, precio) de los menús (ver MenuCRUD.leer_menus_basico)."""
+        if self._menus is None:
+            self._menus = MenuCRUD.leer_menus_basico(self._db)
+            self._terminar_lectura()
+        return self._menus
+
+    def refrescar(self, *que):
+        """
+        Marca como obsoletos 'clientes' y/o 'menus' (todo si no se indica nada).
+        Se expiran los objetos del identity map para que la próxima carga traiga
+        los valores actuales en vez de reutilizar los viejos.
+        """
+        que = que or ("clientes", "menus")
+        if "clientes" in que and self._clientes is not None:
+            for cliente in self._clientes:
+                self._db.expire(cliente)
+            self._clientes = None
+        if "menus" in que:
+            self._menus = None  # filas sueltas: no hay nada que expirar
+
+    def aplicar_cambios(self, que, cambios):
+        """
+        Aplica un resumen de cambios (ver eventos.resumir) a 'clientes' o 'menus'
+        sin releer la lista completa: se quitan los borrados y se leen solo los
+        insertados/actualizados. Retorna True si la lista cambió.
+        """
+        lista = self._clientes if que == "clientes" else self._menus
+        if lista is None:
+            return False  # aún no se cargó: la primera lectura ya traerá lo nuevo
+        if cambios["recargar"]:
+            self.refrescar(que)
+            return True
+
+        clave = (lambda o: o.email) if que == "clientes" else (lambda o: o.id)
+
+        quitar = cambios["borrado"] | cambios["insertado"] | cambios["actualizado"]
+        if not quitar:
+            return False
+        lista[:] = [o for o in lista if clave(o) not in quitar]
+
+        leer = cambios["insertado"] | cambios["actualizado"]
+        if que == "menus":
+            if leer:
+                lista.extend(MenuCRUD.leer_menus_basico(self._db, leer))
+            lista.sort(key=lambda m: m.id)
+        else:
+            for k in leer:
+                # populate_existing: pisa los valores viejos del identity map
+                objeto = self._db.get(Cliente, k, populate_existing=True)
+                if objeto is not None:
+                    lista.append(objeto)
+        self._terminar_lectura()
+        return True
+
+    def cerrar(self):
+        self._db.close()
@@ -0,0 +1,91 @@
+# Contrapartes asyncio de ClienteCRUD, IngredienteCRUD, MenuCRUD y PedidoCRUD
+# sobre AsyncSession (motores y sesiones en database_async.py):
+#
+#   async with sesion_async_scope() as db:
+#       exito, boleta = await PedidoCRUDAsync.registrar_compra(db, email, ids_menus)
+#
+#   # ventas y reportes en paralelo, cada uno con su sesión
+#   await asyncio.gather(vender(...), vender(...), reporte(...))
+#
+# Cada método async corre el método síncrono del mismo nombre con
+# AsyncSession.run_sync: validaciones, mensajes, commits y lo que se retorna son
+# exactamente los mismos, y mientras una corrutina espera a la BD el event loop
+# atiende a las demás. Una AsyncSession no se comparte entre corrutinas concurrentes.
+# Los métodos sin BD (texto_boleta, calcular_requerimientos) quedan síncronos.
+# Los objetos ORM retornados vienen cargados, pero sus relaciones no cargadas no
+# se pueden recorrer fuera de run_sync (lanza MissingGreenlet).
+import inspect
+import functools
+from sqlalchemy.ext.asyncio import AsyncSession
+from crud.cliente_crud import ClienteCRUD
+from crud.ingrediente_crud import IngredienteCRUD
+from crud.menu_crud import MenuCRUD
+from crud.pedido_crud import PedidoCRUD
+
+
+def _en_run_sync(funcion):
+    @functools.wraps(funcion)
+    async def envoltura(db: AsyncSession, *args, **kwargs):
+        return await db.run_sync(funcion, *args, **kwargs)
+    return envoltura
+
+
+def contraparte_async(clase_sync):
+    """
+    Decorador de clase: agrega la versión async de cada @staticmethod público de
+    clase_sync cuyo primer parámetro es 'db'; los demás se copian tal cual.
+    Los métodos definidos en la clase decorada tienen prioridad (p. ej. los
+    generadores, que run_sync no puede recorrer por tramos).
+    """
+    def decorador(cls):
+        for nombre, valor in vars(clase_sync).items():
+            if nombre.startswith("_") or not isinstance(valor, staticmethod) or nombre in vars(cls):
+                continue
+            funcion = valor.__func__
+            if inspect.isgeneratorfunction(inspect.unwrap(funcion)):
+                continue
+            parametros = list(inspect.signature(funcion).parameters)
+            if parametros and parametros[0] == "db":
+                setattr(cls, nombre, staticmethod(_en_run_sync(funcion)))
+            else:
+                setattr(cls, nombre, valor)
+        return cls
+    return decorador
+
+
+@contraparte_async(ClienteCRUD)
+class ClienteCRUDAsync:
+    """ClienteCRUD con AsyncSession (crear_cliente, leer_clientes_pagina, borrar_cliente, ...)."""
+
+
+@contraparte_async(IngredienteCRUD)
+class IngredienteCRUDAsync:
+    """IngredienteCRUD con AsyncSession (crear_ingrediente, reservar_stock, cargar_masivamente_desde_csv, ...)."""
+
+
+@contraparte_async(MenuCRUD)
+class MenuCRUDAsync:
+    """MenuCRUD con AsyncSession (crear_menu, obtener_recetas, calcular_porciones_disponibles, ...)."""
+
+
+@contraparte_async(PedidoCRUD)
+class PedidoCRUDAsync:
+    """PedidoCRUD con AsyncSession (registrar_compra, procesar_compras_lote, buscar_pedidos, ...)."""
+
+    @staticmethod
+    async def leer_datos_boletas(db: AsyncSession, fecha_desde=None, fecha_hasta=None, tamano_lote: int = 500):
+        """
+        Generador async de DatosBoleta del rango, como PedidoCRUD.leer_datos_boletas:
+        'async for datos in PedidoCRUDAsync.leer_datos_boletas(db, desde, hasta)'.
+        Lee por tramos con db.stream (el resultado no se carga entero en memoria).
+        """
+        consulta = PedidoCRUD._consulta_boletas(fecha_desde, fecha_hasta)
+        filas = await db.stream(consulta.execution_options(yield_per=tamano_lote))
+        lineas = []
+        async for fila in filas:
+            if lineas and fila[0] != lineas[0][0]:
+                yield PedidoCRUD._datos_boleta(lineas)
+                lineas = []
+            lineas.append(fila)
+        if lineas:
+            yield PedidoCRUD._datos_boleta(lineas)
@@ -0,0 +1,111 @@
+import threading
+from collections import Counter
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from models import Menu, MenuIngrediente
+
+
+class RecetaMenu:
+    """
+    Versión liviana (sin ORM) de un Menu: lo justo para vender.
+    receta: tupla de (ingrediente_id, cantidad_requerida)
+    """
+    __slots__ = ("id", "nombre", "precio", "receta")
+
+    def __init__(self, id, nombre, precio, receta):
+        self.id = id
+        self.nombre = nombre
+        self.precio = precio
+        self.receta = receta
+
+
+class CacheRecetas:
+    """
+    Caché en memoria del proceso: menu_id -> RecetaMenu.
+    Evita recorrer menu.ingredientes_receta -> item.ingrediente en cada compra.
+    Se invalida desde MenuCRUD.crear_menu / borrar_menu e IngredienteCRUD.borrar_ingrediente.
+    Es por proceso: en la API, los cambios de otros procesos llegan por la tabla
+    cambio_registrado y se aplican con invalidar_por_cambios().
+    """
+    _datos = {}
+    _lock = threading.Lock()
+    _generacion = 0  # sube con cada invalidar(): una carga en curso ya no se guarda
+    aciertos = 0
+    fallos = 0
+
+    @classmethod
+    def obtener(cls, db: Session, ids_menus):
+        """
+        Retorna {menu_id: RecetaMenu} para los ids pedidos que existan.
+        Los que no están en caché se cargan con dos consultas (menús y recetas).
+        """
+        ids_menus = set(ids_menus)
+        with cls._lock:
+            encontrados = {i: cls._datos[i] for i in ids_menus if i in cls._datos}
+            faltantes = ids_menus - encontrados.keys()
+            cls.aciertos += len(encontrados)
+            cls.fallos += len(faltantes)
+            generacion = cls._generacion
+
+        if not faltantes:
+            return encontrados
+
+        cargados = {
+            m_id: RecetaMenu(m_id, nombre, precio, [])
+            for m_id, nombre, precio in db.execute(
+                select(Menu.id, Menu.nombre, Menu.precio).where(Menu.id.in_(faltantes)))
+        }
+        for m_id, i_id, cant in db.execute(
+                select(MenuIngrediente.menu_id, MenuIngrediente.ingrediente_id,
+                       MenuIngrediente.cantidad_requerida)
+                .where(MenuIngrediente.menu_id.in_(cargados.keys()))):
+            cargados[m_id].receta.append((i_id, float(cant)))
+
+        for receta in cargados.values():
+            receta.receta = tuple(receta.receta)
+
+        with cls._lock:
+            # Si se invalidó durante la carga, lo leído puede ser anterior al cambio
+            if cls._generacion == generacion:
+                cls._datos.update(cargados)
+
+        encontrados.update(cargados)
+        return encontrados
+
+    @staticmethod
+    def requerimientos(recetas: dict, cantidades: dict):
+        """
+        recetas: {menu_id: RecetaMenu}, cantidades: {menu_id: unidades}
+        Retorna {ingrediente_id: cantidad_total} para validar/descontar stock.
+        """
+        total = Counter()
+        for m_id, unidades in cantidades.items():
+            for i_id, cant in recetas[m_id].receta:
+                total[i_id] += unidades * cant
+        return dict(total)
+
+    @classmethod
+    def invalidar(cls, menu_id=None):
+        """Borra un menú de la caché, o toda la caché si no se indica id."""
+        with cls._lock:
+            cls._generacion += 1
+            if menu_id is None:
+                cls._datos.clear()
+            else:
+                cls._datos.pop(menu_id, None)
+
+    @classmethod
+    def invalidar_por_cambios(cls, cambios):
+        """Invalida lo que afecten los Cambio recibidos (ver eventos.py) de otro proceso."""
+        for entidad, accion, clave in cambios:
+            if entidad == "Menu":
+                cls.invalidar(clave)
+            elif entidad == "MenuIngrediente":
+                cls.invalidar(clave[0] if clave else None)
+            elif entidad == "Ingrediente" and accion in ("borrado", "recargar"):
+                cls.invalidar()
+
+    @classmethod
+    def estadisticas(cls):
+        with cls._lock:
+            return {"aciertos": cls.aciertos, "fallos": cls.fallos, "entradas": len(cls._datos)}
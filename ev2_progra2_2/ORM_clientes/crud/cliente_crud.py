@@ -1,8 +1,12 @@
 import re
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy import select
 from models import Cliente
+from instrumentacion import instrumentar_clase
+from crud.paginacion import leer_pagina, contar
 
+@instrumentar_clase
 class ClienteCRUD:
     @staticmethod
     def crear_cliente(db: Session, nombre: str, email: str, edad: int):
@@ -49,6 +53,27 @@ class ClienteCRUD:
     def leer_clientes(db: Session):
         return db.query(Cliente).all()
 
+    # Columnas por las que la lista virtual puede ordenar
+    COLUMNAS_ORDEN = {"nombre": Cliente.nombre, "email": Cliente.email, "edad": Cliente.edad}
+
+    @staticmethod
+    def leer_clientes_pagina(db: Session, offset: int = 0, limite: int = 100, orden: str = "nombre",
+                             descendente: bool = False, despues_de=None):
+        """Ventana de filas (nombre, email, edad) ordenada en SQL. Ver crud.paginacion.leer_pagina."""
+        return leer_pagina(db, select(Cliente.nombre, Cliente.email, Cliente.edad),
+                           ClienteCRUD.COLUMNAS_ORDEN, orden, Cliente.email,
+                           offset, limite, descendente, despues_de)
+
+    @staticmethod
+    def contar_clientes(db: Session):
+        return contar(db, select(Cliente.email))
+
+    @staticmethod
+    def leer_clientes_por_email(db: Session, emails):
+        """Filas (nombre, email, edad) de los clientes indicados (para refrescar filas sueltas)."""
+        return [tuple(r) for r in db.execute(
+            select(Cliente.nombre, Cliente.email, Cliente.edad).where(Cliente.email.in_(list(emails))))]
+
     @staticmethod
     def actualizar_cliente(db: Session, email_actual: str, nuevo_nombre: str, nuevo_email: str, edad: int):
         cliente = db.query(Cliente).get(email_actual)
@@ -1,10 +1,43 @@
+from collections import Counter
+from sqlalchemy import update, insert, select, bindparam
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import SQLAlchemyError
-from models import Ingrediente
+from models import Ingrediente, normalizar_nombre
+from instrumentacion import instrumentar_clase
+from crud.cache_recetas import CacheRecetas
+from crud.paginacion import leer_pagina, contar
+from eventos import registrar_cambio
+import metricas
 import csv
+import math
 import os
 import re
+import time
 
+# UPDATE condicional de reservar_stock, armado una sola vez: en cada venta solo
+# cambian los parámetros y SQLAlchemy reutiliza la compilación en caché.
+_tabla_ing = Ingrediente.__table__
+_RESERVAR = (
+    update(_tabla_ing)
+    .where(_tabla_ing.c.id == bindparam("r_id"), _tabla_ing.c.cantidad >= bindparam("r_cant"))
+    .values(cantidad=_tabla_ing.c.cantidad - bindparam("r_cant"))
+)
+
+# Métricas de stock y de importación CSV (ver metricas.py)
+RESERVAS_FALLIDAS = metricas.contador(
+    "restaurante_reservas_stock_fallidas_total", "Reservas de stock rechazadas por falta de algún ingrediente")
+LATENCIA_DESCUENTO = metricas.histograma(
+    "restaurante_descuento_stock_segundos", "Duración de descontar_stock_receta")
+DURACION_CSV = metricas.histograma(
+    "restaurante_importacion_csv_segundos", "Duración de cada importación masiva de ingredientes",
+    limites=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300))
+FILAS_CSV = metricas.contador(
+    "restaurante_importacion_csv_filas_total", "Filas de CSV leídas (aceptadas y rechazadas)")
+RITMO_CSV = metricas.medidor(
+    "restaurante_importacion_csv_filas_por_segundo", "Filas por segundo de la última importación")
+
+
+@instrumentar_clase
 class IngredienteCRUD:
 
     @staticmethod
@@ -16,8 +49,9 @@ class IngredienteCRUD:
             print(f"Error: Datos inválidos para '{nombre}'.")
             return None
 
-        # 2. Upsert (Actualizar si existe)
-        ingrediente_existente = db.query(Ingrediente).filter(Ingrediente.nombre.ilike(nombre)).first()
+        # 2. Upsert (Actualizar si existe) usando el índice único del nombre normalizado
+        ingrediente_existente = db.query(Ingrediente).filter(
+            Ingrediente.nombre_normalizado == normalizar_nombre(nombre)).first()
         
         if ingrediente_existente:
             ingrediente_existente.cantidad += float(cantidad)
@@ -49,7 +83,15 @@ class IngredienteCRUD:
         ing = db.query(Ingrediente).get(ingrediente_id)
         if ing:
             db.delete(ing)
-            db.commit()
+            try:
+                db.commit()
+            except SQLAlchemyError as e:
+                # Con foreign_keys=ON la BD rechaza borrar un ingrediente usado en recetas
+                db.rollback()
+                print(f"Error al borrar ingrediente {ingrediente_id}: {e}")
+                return False
+            # Las recetas en caché podían usar este ingrediente
+            CacheRecetas.invalidar()
             return True
         return False
 
@@ -57,110 +99,266 @@ class IngredienteCRUD:
     def obtener_ingredientes_bajo_stock(db: Session, umbral: float = 5.0):
         todos = db.query(Ingrediente).all()
         return list(filter(lambda ing: ing.cantidad <= umbral, todos))
+
+    # Columnas por las que la lista virtual puede ordenar
+    COLUMNAS_ORDEN = {"id": Ingrediente.id, "nombre": Ingrediente.nombre,
+                      "unidad": Ingrediente.unidad, "cantidad": Ingrediente.cantidad}
+
+    @staticmethod
+    def _consulta_listado(umbral=None):
+        consulta = select(Ingrediente.id, Ingrediente.nombre, Ingrediente.unidad, Ingrediente.cantidad)
+        if umbral is not None:
+            # Filtro de bajo stock resuelto en SQL
+            consulta = consulta.where(Ingrediente.cantidad <= umbral)
+        return consulta
+
+    @staticmethod
+    def leer_ingredientes_pagina(db: Session, offset: int = 0, limite: int = 100, orden: str = "id",
+                                 descendente: bool = False, despues_de=None, umbral: float = None):
+        """
+        Ventana de filas (id, nombre, unidad, cantidad) ordenada en SQL.
+        Con 'umbral' solo trae los de bajo stock. Ver crud.paginacion.leer_pagina.
+        """
+        return leer_pagina(db, IngredienteCRUD._consulta_listado(umbral),
+                           IngredienteCRUD.COLUMNAS_ORDEN, orden, Ingrediente.id,
+                           offset, limite, descendente, despues_de)
+
+    @staticmethod
+    def contar_ingredientes(db: Session, umbral: float = None):
+        return contar(db, IngredienteCRUD._consulta_listado(umbral))
+
+    @staticmethod
+    def leer_ingredientes_por_id(db: Session, ids):
+        """Filas (id, nombre, unidad, cantidad) de los ingredientes indicados."""
+        return [tuple(r) for r in db.execute(
+            IngredienteCRUD._consulta_listado().where(Ingrediente.id.in_(list(ids))))]
     
     # --- FUNCIONES TRANSACCIONALES (Las que faltaban) ---
 
     @staticmethod
+    def calcular_requerimientos(lista_menus: list):
+        """
+        Recibe una lista de objetos Menu (puede repetir menús).
+        Retorna {ingrediente_id: cantidad_total}, sumando lo que piden todos los menús
+        (dos menús con "Pan de hamburguesa" se validan contra la necesidad combinada).
+        """
+        requerimientos = Counter()
+        for menu in lista_menus:
+            for item in menu.ingredientes_receta:
+                requerimientos[item.ingrediente_id] += float(item.cantidad_requerida)
+        return dict(requerimientos)
+
+    @staticmethod
+    def reservar_stock(db: Session, requerimientos: dict):
+        """
+        Recibe: {ingrediente_id: cantidad_total}
+        Descuenta con UPDATE condicional en la BD:
+            UPDATE ingrediente SET cantidad = cantidad - :c WHERE id = :id AND cantidad >= :c
+        La verificación y el descuento son una sola sentencia, así que dos cajas vendiendo
+        a la vez no pueden dejar stock negativo.
+        Retorna la lista de nombres de ingredientes faltantes ([] si todo alcanzó).
+        NO hace commit ni rollback: si falta algo, el llamador debe hacer rollback.
+        """
+        faltantes_ids = []
+        conexion = db.connection()
+
+        # Orden fijo por id para que transacciones concurrentes bloqueen en el mismo orden.
+        # Una sentencia por ingrediente (no executemany) para leer el rowcount de cada una.
+        for ing_id in sorted(requerimientos):
+            resultado = conexion.execute(
+                _RESERVAR, {"r_id": ing_id, "r_cant": float(requerimientos[ing_id])})
+            if resultado.rowcount != 1:
+                faltantes_ids.append(ing_id)
+
+        if not faltantes_ids:
+            # UPDATE por Core: el bus de cambios no lo ve solo
+            registrar_cambio(db, "Ingrediente", "actualizado", sorted(requerimientos))
+            return []
+
+        RESERVAS_FALLIDAS.inc()
+        nombres = dict(db.query(Ingrediente.id, Ingrediente.nombre)
+                       .filter(Ingrediente.id.in_(faltantes_ids)).all())
+        return list(map(lambda i: nombres.get(i, f"ID {i} (no existe)"), faltantes_ids))
+
+    @staticmethod
+    @metricas.cronometrar(LATENCIA_DESCUENTO)
     def descontar_stock_receta(db: Session, lista_ingredientes_requeridos: list):
         """
         Recibe: [(ingrediente_obj, cantidad_necesaria), ...]
-        Resta el stock. Retorna True si tuvo éxito, False si faltó stock.
+        Agrupa por ingrediente y reserva con reservar_stock.
+        Retorna True si tuvo éxito, False si faltó stock.
+        Como reservar_stock, NO hace commit ni rollback: con False pueden quedar
+        descuentos parciales en la transacción y el llamador debe hacer rollback.
         """
-        # 1. Verificar stock de TODO primero
-        for ing, cant_req in lista_ingredientes_requeridos:
-            if ing.cantidad < cant_req:
-                return False
-        
-        # 2. Si todo alcanza, descontamos
+        requerimientos = Counter()
         for ing, cant_req in lista_ingredientes_requeridos:
-            ing.cantidad -= float(cant_req)
-        
-        return True
+            requerimientos[ing.id] += float(cant_req)
+
+        return not IngredienteCRUD.reservar_stock(db, requerimientos)
 
     @staticmethod
     def devolver_stock_receta(db: Session, lista_menus: list):
         """
         Recibe una lista de objetos Menu.
-        Recorre sus ingredientes y suma el stock de vuelta.
+        Suma el stock de vuelta con un UPDATE atómico por ingrediente.
         """
-        for menu in lista_menus:
-            # Accedemos a la tabla intermedia MenuIngrediente
-            for item in menu.ingredientes_receta:
-                ingrediente = item.ingrediente 
-                cantidad_a_devolver = item.cantidad_requerida
-                
-                ingrediente.cantidad += float(cantidad_a_devolver)
+        IngredienteCRUD.devolver_stock(db, IngredienteCRUD.calcular_requerimientos(lista_menus))
+
+    @staticmethod
+    def devolver_stock(db: Session, requerimientos: dict):
+        """
+        Recibe: {ingrediente_id: cantidad_total}
+        Suma el stock de vuelta con un UPDATE atómico por ingrediente (sin commit).
+        """
+        for ing_id in sorted(requerimientos):
+            db.execute(
+                update(Ingrediente)
+                .where(Ingrediente.id == ing_id)
+                .values(cantidad=Ingrediente.cantidad + requerimientos[ing_id])
+                .execution_options(synchronize_session=False)
+            )
+        registrar_cambio(db, "Ingrediente", "actualizado", sorted(requerimientos))
+
+    @staticmethod
+    def _upsert_lote(db: Session, lote: dict):
+        """
+        Aplica un tramo ya agregado {clave: [nombre, unidad, cantidad]} con:
+        una consulta IN para encontrar existentes, un UPDATE executemany
+        (cantidad = cantidad + delta) y un INSERT executemany.
+        Retorna (cantidad_insertados, cantidad_actualizados).
+        """
+        tabla = Ingrediente.__table__
+
+        # Existentes por nombre normalizado (una consulta IN sobre el índice único)
+        existentes = {
+            clave: ing_id for ing_id, clave in db.execute(
+                select(Ingrediente.id, Ingrediente.nombre_normalizado)
+                .where(Ingrediente.nombre_normalizado.in_(list(lote))))
+        }
+
+        actualizaciones = [
+            {"b_id": existentes[clave], "b_delta": datos[2]}
+            for clave, datos in lote.items() if clave in existentes
+        ]
+        nuevos = [
+            {"nombre": datos[0], "nombre_normalizado": clave, "unidad": datos[1], "cantidad": datos[2]}
+            for clave, datos in lote.items() if clave not in existentes
+        ]
+
+        if actualizaciones:
+            db.execute(
+                update(tabla)
+                .where(tabla.c.id == bindparam("b_id"))
+                .values(cantidad=tabla.c.cantidad + bindparam("b_delta")),
+                actualizaciones
+            )
+        if nuevos:
+            db.execute(insert(tabla), nuevos)
+
+        return len(nuevos), len(actualizaciones)
 
     @staticmethod
-    def cargar_masivamente_desde_csv(db: Session, ruta_archivo: str):
+    def cargar_masivamente_desde_csv(db: Session, ruta_archivo: str, tamano_lote: int = 5000):
         """
-        Carga ingredientes desde CSV.
+        Carga ingredientes desde CSV en streaming (memoria acotada, sirve para archivos de 1M filas).
         Maneja BOM (utf-8-sig) y espacios en las cabeceras.
+        Lee por tramos, agrupa las filas por nombre (sin distinguir mayúsculas, así
+        "Vienesa" repetida se suma en una sola fila) y aplica inserts/updates masivos.
+        Todo el archivo se aplica en una transacción: si algo falla, no se carga nada.
+        Los nuevos/actualizados se cuentan por tramo: un nombre que se repite en
+        tramos distintos se inserta en el primero y cuenta como actualizado en los demás.
         """
         if not os.path.exists(ruta_archivo):
             return "Archivo no encontrado."
+        inicio = time.perf_counter()
 
         try:
             # Apertura del stream en modo READ para trabajar el archivo
             # Se usa 'utf-8-sig' para leer archivos creados en Excel/Windows correctamente
-            with open(ruta_archivo, mode='r', encoding='utf-8-sig') as f:
-                
+            with open(ruta_archivo, mode='r', encoding='utf-8-sig', newline='') as f:
+
                 # Detección del separador CSV con csv.Sniffer
                 sample = f.read(1024)
                 f.seek(0)
                 dialect = csv.Sniffer().sniff(sample)
-                
-                # Conversión a diccionario (no usamos DF ahora)
+
+                # Conversión a diccionario (el reader es un iterador: no carga todo el archivo)
                 reader = csv.DictReader(f, dialect=dialect)
-                
+
                 # Normalización de cabeceras
                 if reader.fieldnames:
                     reader.fieldnames = [col.strip().lower() for col in reader.fieldnames]
 
                 # Validar Columnas
                 columnas_requeridas = {'nombre', 'unidad', 'cantidad'}
-                columnas_en_csv = set(reader.fieldnames)
+                columnas_en_csv = set(reader.fieldnames or [])
 
                 if not columnas_requeridas.issubset(columnas_en_csv):
                     return f"Error: Faltan columnas. El CSV tiene: {list(columnas_en_csv)}"
 
-                # Convertimos a lista para aplicar Filter
-                filas = list(reader) 
+                count_nuevos = 0
+                count_actualizados = 0
+                filas_leidas = 0
+                count_rechazadas = 0
+                lineas_rechazadas = []  # solo las primeras, para no crecer sin límite
+                MAX_LINEAS_INFORMADAS = 20
 
-                # Filtrar filas vacías
-                filas_validas = list(filter(lambda row: row.get('nombre') and row.get('cantidad'), filas))
+                lote = {}  # clave normalizada -> [nombre, unidad, cantidad acumulada]
+                filas_en_lote = 0
 
-                # Registro de ingredientes nuevos
-                count_agregados = 0
-                # Registro de ingredientes existentes actualizados
-                count_actualizados = 0
-                
-                for row in filas_validas:
+                for row in reader:
+                    filas_leidas += 1
                     try:
                         # Normalización/formateo de valores
-                        nombre = row['nombre'].strip()
-                        unidad = row['unidad'].strip()
+                        nombre = " ".join((row.get('nombre') or "").split())
+                        unidad = (row.get('unidad') or "").strip() or "unid"
                         # Reemplazar coma por punto si el Excel guardó decimales como "10,5"
-                        cant_str = row['cantidad'].replace(',', '.')
-                        cantidad = float(cant_str)
-
-                        # Lógica de Upsert (Actualizar o Crear)
-                        ing_existente = db.query(Ingrediente).filter(Ingrediente.nombre.ilike(nombre)).first()
-                        
-                        if ing_existente:
-                            ing_existente.cantidad += cantidad
-                            count_actualizados += 1
-                        else:
-                            nuevo = Ingrediente(nombre=nombre, unidad=unidad, cantidad=cantidad)
-                            db.add(nuevo)
-                            count_agregados += 1
-                    
+                        cantidad = float((row.get('cantidad') or "").strip().replace(',', '.'))
+                        if not nombre or not math.isfinite(cantidad) or cantidad < 0:
+                            raise ValueError
                     except ValueError:
-                        continue # Saltar filas con errores numéricos
+                        count_rechazadas += 1
+                        if len(lineas_rechazadas) < MAX_LINEAS_INFORMADAS:
+                            lineas_rechazadas.append(reader.line_num)
+                        continue
+
+                    # Pre-agregación por nombre dentro del tramo
+                    clave = normalizar_nombre(nombre)
+                    if clave in lote:
+                        lote[clave][2] += cantidad
+                    else:
+                        lote[clave] = [nombre, unidad, cantidad]
+
+                    filas_en_lote += 1
+                    if filas_en_lote >= tamano_lote:
+                        insertados, actualizados = IngredienteCRUD._upsert_lote(db, lote)
+                        count_nuevos += insertados
+                        count_actualizados += actualizados
+                        lote, filas_en_lote = {}, 0
 
+                if lote:
+                    insertados, actualizados = IngredienteCRUD._upsert_lote(db, lote)
+                    count_nuevos += insertados
+                    count_actualizados += actualizados
+
+                # Carga masiva: se avisa que cambió la tabla completa, no fila por fila
+                registrar_cambio(db, "Ingrediente", "recargar")
                 db.commit()
-                return f"Éxito: {count_agregados} nuevos, {count_actualizados} actualizados."
+
+                segundos = time.perf_counter() - inicio
+                DURACION_CSV.observar(segundos)
+                FILAS_CSV.inc(filas_leidas)
+                RITMO_CSV.fijar(filas_leidas / segundos if segundos else 0.0)
+
+                mensaje = (f"Éxito: {count_nuevos} nuevos, {count_actualizados} actualizados, "
+                           f"{count_rechazadas} filas rechazadas.")
+                if lineas_rechazadas:
+                    detalle = ", ".join(map(str, lineas_rechazadas))
+                    if count_rechazadas > len(lineas_rechazadas):
+                        detalle += ", ..."
+                    mensaje += f"\nLíneas rechazadas: {detalle}"
+                return mensaje
 
         except Exception as e:
             db.rollback()
-            return f"Error crítico: {str(e)}"
\ No newline at end of file
+            return f"Error crítico: {str(e)}"
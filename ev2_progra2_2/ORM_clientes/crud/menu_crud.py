@@ -1,9 +1,15 @@
+from sqlalchemy import func, select
 from sqlalchemy.orm import Session, joinedload
 from sqlalchemy.exc import SQLAlchemyError
 from models import Menu, Ingrediente, MenuIngrediente
+from instrumentacion import instrumentar_clase
+from crud.cache_recetas import CacheRecetas
+from crud.paginacion import leer_pagina, contar
 from functools import reduce
+import math
 
 
+@instrumentar_clase
 class MenuCRUD:
     @staticmethod
     def leer_menus(db: Session):
@@ -16,6 +22,94 @@ class MenuCRUD:
             joinedload(Menu.ingredientes_receta).joinedload(MenuIngrediente.ingrediente)
         ).all()
 
+    @staticmethod
+    def leer_menus_basico(db: Session, ids=None):
+        """
+        Filas (id, nombre, precio) de los menús (o de los indicados en ids), ordenadas
+        por id: lo que necesita el combo de compra, sin cargar recetas ni ingredientes.
+        """
+        consulta = select(Menu.id, Menu.nombre, Menu.precio).order_by(Menu.id)
+        if ids is not None:
+            consulta = consulta.where(Menu.id.in_(list(ids)))
+        return db.execute(consulta).all()
+
+    # Columnas por las que la lista virtual puede ordenar
+    COLUMNAS_ORDEN = {"id": Menu.id, "nombre": Menu.nombre,
+                      "descripcion": Menu.descripcion, "precio": Menu.precio}
+
+    @staticmethod
+    def leer_menus_pagina(db: Session, offset: int = 0, limite: int = 100, orden: str = "id",
+                          descendente: bool = False, despues_de=None):
+        """
+        Ventana de filas (id, nombre, descripcion, detalle_receta, precio) ordenada en SQL.
+        El texto de la receta se arma solo para los menús de la página, con una consulta.
+        """
+        filas, cursor = leer_pagina(db, select(Menu.id, Menu.nombre, Menu.descripcion, Menu.precio),
+                                    MenuCRUD.COLUMNAS_ORDEN, orden, Menu.id,
+                                    offset, limite, descendente, despues_de)
+        return MenuCRUD._con_receta(db, filas), cursor
+
+    @staticmethod
+    def leer_menus_por_id(db: Session, ids):
+        """Mismas filas que leer_menus_pagina, de los menús indicados (para refrescar filas sueltas)."""
+        filas = db.execute(select(Menu.id, Menu.nombre, Menu.descripcion, Menu.precio)
+                           .where(Menu.id.in_(list(ids)))).all()
+        return MenuCRUD._con_receta(db, filas)
+
+    @staticmethod
+    def _con_receta(db: Session, filas):
+        """(id, nombre, descripcion, precio) -> (id, nombre, descripcion, detalle_receta, precio)."""
+        recetas = {}
+        if filas:
+            consulta = (
+                select(MenuIngrediente.menu_id, Ingrediente.nombre,
+                       MenuIngrediente.cantidad_requerida, Ingrediente.unidad)
+                .join(Ingrediente, Ingrediente.id == MenuIngrediente.ingrediente_id)
+                .where(MenuIngrediente.menu_id.in_([f[0] for f in filas]))
+            )
+            for m_id, nombre, cant, unidad in db.execute(consulta):
+                recetas.setdefault(m_id, []).append(f"{nombre} ({cant} {unidad})")
+
+        # Si no tiene ingredientes (por seguridad), mostramos texto fijo
+        return [
+            (m_id, nombre, desc, ", ".join(recetas.get(m_id, [])) or "Sin ingredientes definidos", precio)
+            for m_id, nombre, desc, precio in filas
+        ]
+
+    @staticmethod
+    def contar_menus(db: Session):
+        return contar(db, select(Menu.id))
+
+    @staticmethod
+    def obtener_recetas(db: Session, ids_menus):
+        """{menu_id: RecetaMenu} desde la caché de recetas (ver CacheRecetas)."""
+        return CacheRecetas.obtener(db, ids_menus)
+
+    @staticmethod
+    def calcular_porciones_disponibles(db: Session):
+        """
+        Cuántas porciones de cada menú se pueden preparar con el stock actual:
+        min(stock / cantidad_requerida) sobre la receta, para TODOS los menús en una
+        sola consulta agrupada (no se recorren relaciones ORM).
+        Retorna [(menu_id, nombre, porciones)], porciones = None si el menú no tiene receta.
+        """
+        # Un ingrediente borrado de la receta cuenta como stock 0
+        rendimiento = func.min(
+            func.coalesce(Ingrediente.cantidad, 0) / MenuIngrediente.cantidad_requerida)
+
+        filas = (
+            db.query(Menu.id, Menu.nombre, rendimiento)
+            .outerjoin(MenuIngrediente, MenuIngrediente.menu_id == Menu.id)
+            .outerjoin(Ingrediente, Ingrediente.id == MenuIngrediente.ingrediente_id)
+            .group_by(Menu.id, Menu.nombre)
+            .order_by(Menu.id)
+            .all()
+        )
+
+        # floor con tolerancia: 0.3 / 0.1 da 2.9999999999999996 y debe contar como 3
+        porciones = lambda r: None if r is None else max(0, math.floor(r + 1e-9))
+        return list(map(lambda f: (f[0], f[1], porciones(f[2])), filas))
+
     @staticmethod
     def crear_menu(db: Session, nombre: str, descripcion: str, lista_ingredientes: list, precio: float):
 
@@ -76,6 +170,7 @@ class MenuCRUD:
             db.add_all(receta_objetos)
             db.commit()
             db.refresh(nuevo_menu)
+            CacheRecetas.invalidar(nuevo_menu.id)
             return nuevo_menu
 
         except SQLAlchemyError as e:
@@ -89,5 +184,6 @@ class MenuCRUD:
         if menu:
             db.delete(menu)
             db.commit()
+            CacheRecetas.invalidar(menu_id)
             return True
         return False
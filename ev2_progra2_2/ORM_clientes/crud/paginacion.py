@@ -0,0 +1,50 @@
+from sqlalchemy import select, func, or_, and_
+from sqlalchemy.orm import Session
+
+
+def leer_pagina(db: Session, consulta, columnas_orden: dict, orden: str, clave_pk,
+                offset: int = 0, limite: int = 100, descendente: bool = False, despues_de=None):
+    """
+    Lee una ventana de 'consulta' (un select de las columnas a mostrar) ordenada en SQL.
+      columnas_orden: {nombre_columna: columna} permitidas para ordenar (lista blanca)
+      clave_pk: columna única que desempata el orden
+      despues_de: cursor (valor_orden, pk) de la página anterior -> keyset (no recorre
+                  las filas previas); si es None se usa OFFSET (saltos del scrollbar)
+    Retorna (filas, cursor) con cursor = (valor_orden, pk) de la última fila,
+    o None si no hay más filas o el valor de orden es NULL (la siguiente usa OFFSET).
+    """
+    columna = columnas_orden.get(orden, clave_pk)
+    anulable = getattr(columna, "nullable", False)
+
+    # NULL primero en ascendente y al final en descendente (como SQLite) en todos los motores
+    if descendente:
+        orden_sql = [columna.desc().nulls_last() if anulable else columna.desc(), clave_pk.desc()]
+    else:
+        orden_sql = [columna.asc().nulls_first() if anulable else columna.asc(), clave_pk.asc()]
+
+    consulta = consulta.add_columns(columna.label("_orden"), clave_pk.label("_pk"))
+
+    if despues_de is not None and despues_de[0] is not None:
+        valor, pk = despues_de
+        if descendente:
+            condicion = or_(columna < valor, and_(columna == valor, clave_pk < pk))
+            if anulable:
+                condicion = or_(condicion, columna.is_(None))
+        else:
+            condicion = or_(columna > valor, and_(columna == valor, clave_pk > pk))
+        consulta = consulta.where(condicion)
+    elif offset:
+        consulta = consulta.offset(offset)
+
+    resultado = db.execute(consulta.order_by(*orden_sql).limit(limite)).all()
+
+    filas = [tuple(r)[:-2] for r in resultado]
+    cursor = None
+    if len(resultado) == limite:
+        cursor = (resultado[-1]._orden, resultado[-1]._pk)
+    return filas, cursor
+
+
+def contar(db: Session, consulta):
+    """Cantidad de filas de 'consulta' (para dimensionar el scrollbar de la lista virtual)."""
+    return db.execute(select(func.count()).select_from(consulta.subquery())).scalar()
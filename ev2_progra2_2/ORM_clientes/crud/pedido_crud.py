@@ -1,35 +1,110 @@
+from collections import Counter, namedtuple
 from functools import reduce
+from itertools import islice, groupby
 from sqlalchemy.orm import Session, joinedload
 from sqlalchemy.exc import SQLAlchemyError
-from models import Pedido, Cliente, Menu, MenuIngrediente
+from sqlalchemy import func, insert, select, or_, and_
+from models import Pedido, PedidoMenu, Cliente, Ingrediente, Menu, VentaDiaria
+from instrumentacion import instrumentar_clase
 from crud.ingrediente_crud import IngredienteCRUD
+from crud.resumen_crud import ResumenCRUD
+from crud.cache_recetas import CacheRecetas
+from eventos import registrar_cambio
+import metricas
 import datetime
 
+# Datos planos de una boleta (se pueden enviar a otro proceso para armar el PDF)
+# items: [(nombre_menu, cantidad, precio_unitario), ...]
+DatosBoleta = namedtuple("DatosBoleta", "id cliente email fecha items")
+
+# Métricas de venta (ver metricas.py). Intentos totales = restaurante_venta_segundos_count
+LATENCIA_VENTA = metricas.histograma(
+    "restaurante_venta_segundos", "Duración de registrar una compra (validación, stock, pedido y resúmenes)")
+VENTAS = metricas.contador(
+    "restaurante_ventas_total", "Compras terminadas por resultado (ok, sin_stock, error_bd)", ("resultado",))
+
+
+@instrumentar_clase
 class PedidoCRUD:
-    
+
+    @staticmethod
+    def _formatear_boleta(pedido_id, nombre_cliente, fecha, items: list, total):
+        """Arma el texto de la boleta. items: [(nombre_menu, cantidad, precio_unitario), ...]"""
+        items_texto = list(map(
+            lambda it: f"- {it[0]}: ${it[2]}" if it[1] == 1 else f"- {it[0]} x{it[1]}: ${it[1] * it[2]}",
+            items))
+
+        # Formateamos la fecha para la boleta
+        fecha_str = fecha.strftime('%Y-%m-%d') if hasattr(fecha, 'strftime') else str(fecha)
+
+        return (
+            f"--- BOLETA ---\n"
+            f"ID: {pedido_id} | Cliente: {nombre_cliente}\n"
+            f"Fecha Emisión: {fecha_str}\n"
+            f"----------------\n"
+            + "\n".join(items_texto) + "\n"
+            f"----------------\n"
+            f"TOTAL: ${total}"
+        )
+
     @staticmethod
     def procesar_compra(db: Session, cliente_email: str, lista_menus: list, fecha_seleccionada=None):
+        """
+        Registra la compra (ver registrar_compra) y retorna (True, texto_boleta)
+        o (False, mensaje_error).
+        """
+        exito, resultado = PedidoCRUD.registrar_compra(db, cliente_email, lista_menus, fecha_seleccionada)
+        if not exito:
+            return False, resultado
+        return True, PedidoCRUD.texto_boleta(resultado)
+
+    @staticmethod
+    def texto_boleta(datos: DatosBoleta):
+        """Texto de la boleta a partir de DatosBoleta."""
+        total = sum(cant * precio for _, cant, precio in datos.items)
+        return PedidoCRUD._formatear_boleta(datos.id, datos.cliente, datos.fecha, datos.items, total)
+
+    @staticmethod
+    @metricas.cronometrar(LATENCIA_VENTA)
+    def registrar_compra(db: Session, cliente_email: str, lista_menus: list, fecha_seleccionada=None):
         """
         Gestiona la transacción completa.
         Ahora acepta 'fecha_seleccionada' para el registro histórico.
+        'lista_menus' puede traer ids de menú u objetos con .id (Menu, RecetaMenu) y
+        puede repetir un menú: cada repetición es una unidad más y se guarda como
+        una sola línea de pedido_menu con su 'cantidad'.
+        Las recetas y precios salen de CacheRecetas: no se cargan grafos ORM.
+        Retorna (True, DatosBoleta) o (False, mensaje_error).
         """
         # 1. Validaciones
         cliente = db.query(Cliente).get(cliente_email)
         if not cliente: return False, "Error: Cliente no válido."
         if not lista_menus: return False, "Error: Carrito vacío."
 
+        ids_menus = list(map(lambda m: m if isinstance(m, int) else m.id, lista_menus))
+        cantidades = Counter(ids_menus)
+        recetas = CacheRecetas.obtener(db, cantidades.keys())
+
+        inexistentes = [m_id for m_id in cantidades if m_id not in recetas]
+        if inexistentes: return False, f"Error: Menús inexistentes: {inexistentes}."
+
         # 2. Calculo Total
-        precios = map(lambda m: m.precio, lista_menus)
+        precios = map(lambda m_id: recetas[m_id].precio, ids_menus)
         total_compra = reduce(lambda a, b: a + b, precios, 0)
 
-        # 3. Stock
-        ingredientes_necesarios = []
-        for menu in lista_menus:
-            for item in menu.ingredientes_receta:
-                ingredientes_necesarios.append((item.ingrediente, item.cantidad_requerida))
+        # 3. Stock: reserva atómica (UPDATE condicional) sobre la necesidad combinada
+        requerimientos = CacheRecetas.requerimientos(recetas, cantidades)
+        try:
+            faltantes = IngredienteCRUD.reservar_stock(db, requerimientos)
+        except SQLAlchemyError as e:
+            db.rollback()
+            VENTAS.inc(resultado="error_bd")
+            return False, f"Error BD: {str(e)}"
 
-        if not IngredienteCRUD.descontar_stock_receta(db, ingredientes_necesarios):
-             return False, "Error: Stock insuficiente."
+        if faltantes:
+            db.rollback()
+            VENTAS.inc(resultado="sin_stock")
+            return False, f"Error: Stock insuficiente de: {', '.join(faltantes)}."
 
         # 4. Guardar Pedido CON FECHA
         try:
@@ -39,58 +114,315 @@ class PedidoCRUD:
             else:
                 fecha_final = fecha_seleccionada
 
-            descripcion = f"Compra de {len(lista_menus)} items. Total: ${total_compra}"
-            
+            descripcion = f"Compra de {len(ids_menus)} items. Total: ${total_compra}"
+
+            # Una línea por menú: (menu_id, cantidad, precio_unitario, receta)
+            lineas = [(m_id, cant, recetas[m_id].precio, recetas[m_id].receta)
+                      for m_id, cant in cantidades.items()]
+
             # AQUÍ ASIGNAMOS LA FECHA SELECCIONADA
             nuevo_pedido = Pedido(descripcion=descripcion, cliente=cliente, fecha=fecha_final)
-            nuevo_pedido.menus = lista_menus 
-            
+            nuevo_pedido.items = list(map(
+                lambda l: PedidoMenu(menu_id=l[0], cantidad=l[1], precio_unitario=l[2]), lineas))
+
             db.add(nuevo_pedido)
+
+            # Resúmenes diarios en la misma transacción
+            ResumenCRUD.registrar_pedido(db, fecha_final, lineas)
+
             db.commit()
             db.refresh(nuevo_pedido)
 
-            # 5. Boleta
-            items_texto = list(map(lambda m: f"- {m.nombre}: ${m.precio}", lista_menus))
-            
-            # Formateamos la fecha para la boleta
-            fecha_str = fecha_final.strftime('%Y-%m-%d') if hasattr(fecha_final, 'strftime') else str(fecha_final)
-
-            boleta = (
-                f"--- BOLETA ---\n"
-                f"ID: {nuevo_pedido.id} | Cliente: {cliente.nombre}\n"
-                f"Fecha Emisión: {fecha_str}\n"
-                f"----------------\n"
-                + "\n".join(items_texto) + "\n"
-                f"----------------\n"
-                f"TOTAL: ${total_compra}"
-            )
-            return True, boleta
+            # 5. Datos de la boleta
+            items = list(map(lambda l: (recetas[l[0]].nombre, l[1], l[2]), lineas))
+            VENTAS.inc(resultado="ok")
+            return True, DatosBoleta(nuevo_pedido.id, cliente.nombre, cliente.email, fecha_final, items)
 
         except SQLAlchemyError as e:
             db.rollback()
+            VENTAS.inc(resultado="error_bd")
             return False, f"Error BD: {str(e)}"
 
+    @staticmethod
+    def procesar_compras_lote(db: Session, registros, tamano_lote: int = 1000):
+        """
+        Ingesta masiva de pedidos (ej: plataformas de delivery).
+        registros: iterable de (cliente_email, [menu_id, ...], fecha)
+
+        Por cada tramo de 'tamano_lote' pedidos: resuelve clientes con una consulta IN
+        y recetas con CacheRecetas (ambos con caché entre tramos), valida el stock en memoria en el orden
+        recibido, descuenta el stock agregado con UPDATE condicional e inserta
+        'pedido' y 'pedido_menu' con executemany, todo en una transacción por tramo.
+
+        Retorna una lista alineada con 'registros' de tuplas (exito, detalle):
+        detalle es el id del pedido si exito, o el mensaje de error si no.
+        Las boletas no se arman aquí: usar PedidoCRUD.generar_boleta(db, id) cuando se necesiten.
+        """
+        resultados = []
+        clientes_validos = set()   # emails ya verificados
+        clientes_revisados = set() # emails consultados (existan o no)
+        recetas = {}               # menu_id -> RecetaMenu (desde CacheRecetas)
+
+        iterador = iter(registros)
+        while True:
+            tramo = list(islice(iterador, tamano_lote))
+            if not tramo:
+                break
+
+            # 1. Resolver clientes y menús desconocidos (una consulta IN cada uno)
+            emails = {(email or "").strip().lower() for email, _, _ in tramo} - clientes_revisados
+            if emails:
+                clientes_validos.update(e for (e,) in db.query(Cliente.email).filter(Cliente.email.in_(emails)))
+                clientes_revisados.update(emails)
+
+            ids_menus = {m_id for _, menus, _ in tramo for m_id in (menus or [])} - recetas.keys()
+            if ids_menus:
+                recetas.update(CacheRecetas.obtener(db, ids_menus))
+
+            # 2. Stock actual de los ingredientes involucrados (una consulta)
+            ids_ing = {i_id for _, menus, _ in tramo for m_id in (menus or []) if m_id in recetas
+                       for i_id, _ in recetas[m_id].receta}
+            stock = dict(db.query(Ingrediente.id, Ingrediente.cantidad).filter(Ingrediente.id.in_(ids_ing))) if ids_ing else {}
+            nombres_ing = {}
+
+            # 3. Validación en memoria, en el orden recibido
+            resultados_tramo = []
+            aceptados = []  # (posicion, email, ids_menus, fecha, total)
+            requerimiento_tramo = Counter()
+            ventas, unidades, usos, consumo = {}, Counter(), Counter(), Counter()
+
+            for email, menus, fecha in tramo:
+                email = (email or "").strip().lower()
+                menus = list(menus or [])
+
+                if email not in clientes_validos:
+                    resultados_tramo.append((False, "Error: Cliente no válido."))
+                    continue
+                if not menus:
+                    resultados_tramo.append((False, "Error: Carrito vacío."))
+                    continue
+                inexistentes = [m_id for m_id in menus if m_id not in recetas]
+                if inexistentes:
+                    resultados_tramo.append((False, f"Error: Menús inexistentes: {inexistentes}."))
+                    continue
+                requerido = Counter()
+                for m_id in menus:
+                    for i_id, cant in recetas[m_id].receta:
+                        requerido[i_id] += cant
+
+                faltantes = [i_id for i_id, cant in requerido.items() if stock.get(i_id, 0.0) < cant]
+                if faltantes:
+                    if not nombres_ing:
+                        nombres_ing = dict(db.query(Ingrediente.id, Ingrediente.nombre).filter(Ingrediente.id.in_(ids_ing)))
+                    nombres = ", ".join(nombres_ing.get(i, f"ID {i}") for i in faltantes)
+                    resultados_tramo.append((False, f"Error: Stock insuficiente de: {nombres}."))
+                    continue
+
+                for i_id, cant in requerido.items():
+                    stock[i_id] -= cant
+                requerimiento_tramo.update(requerido)
+
+                fecha = fecha or datetime.datetime.now()
+                total = sum(recetas[m_id].precio for m_id in menus)
+                aceptados.append((len(resultados_tramo), email, menus, fecha, total))
+                resultados_tramo.append(None)  # se completa con el id al insertar
+
+                # Deltas para los resúmenes diarios
+                dia = ResumenCRUD._a_dia(fecha)
+                cant_dia, total_dia = ventas.get(dia, (0, 0))
+                ventas[dia] = (cant_dia + 1, total_dia + total)
+                for m_id in menus:
+                    unidades[(dia, m_id)] += 1
+                    for i_id, cant in recetas[m_id].receta:
+                        usos[(dia, i_id)] += 1
+                        consumo[(dia, i_id)] += cant
+
+            # 4. Escritura del tramo en una sola transacción
+            if aceptados:
+                try:
+                    faltantes = IngredienteCRUD.reservar_stock(db, requerimiento_tramo)
+                    if faltantes:
+                        # Otra caja consumió stock entre la lectura y el descuento
+                        db.rollback()
+                        error = f"Error: Stock insuficiente de: {', '.join(faltantes)}."
+                        for pos, *_ in aceptados:
+                            resultados_tramo[pos] = (False, error)
+                    else:
+                        ids_pedidos = db.scalars(
+                            insert(Pedido).returning(Pedido.id, sort_by_parameter_order=True),
+                            [{"descripcion": f"Compra de {len(menus)} items. Total: ${total}",
+                              "cliente_email": email, "fecha": fecha}
+                             for _, email, menus, fecha, total in aceptados]
+                        ).all()
+
+                        # Una línea por menú distinto, con su cantidad y precio cobrado
+                        db.execute(insert(PedidoMenu), [
+                            {"pedido_id": p_id, "menu_id": m_id, "cantidad": cant,
+                             "precio_unitario": recetas[m_id].precio}
+                            for p_id, (_, _, menus, _, _) in zip(ids_pedidos, aceptados)
+                            for m_id, cant in Counter(menus).items()
+                        ])
+
+                        ResumenCRUD.registrar_agregado(db, ventas, unidades, usos, consumo)
+                        registrar_cambio(db, "Pedido", "insertado", ids_pedidos)
+                        db.commit()
+
+                        for p_id, (pos, *_) in zip(ids_pedidos, aceptados):
+                            resultados_tramo[pos] = (True, p_id)
+
+                except SQLAlchemyError as e:
+                    db.rollback()
+                    for pos, *_ in aceptados:
+                        resultados_tramo[pos] = (False, f"Error BD: {str(e)}")
+
+            resultados.extend(resultados_tramo)
+
+        return resultados
+
+    @staticmethod
+    def generar_boleta(db: Session, pedido_id: int):
+        """Arma bajo demanda el texto de la boleta de un pedido ya guardado."""
+        pedido = db.query(Pedido).options(
+            joinedload(Pedido.items).joinedload(PedidoMenu.menu), joinedload(Pedido.cliente)
+        ).get(pedido_id)
+        if not pedido: return None
+
+        items = list(map(lambda it: (it.menu.nombre, it.cantidad, it.precio_unitario), pedido.items))
+        total = sum(cant * precio for _, cant, precio in items)
+        return PedidoCRUD._formatear_boleta(pedido.id, pedido.cliente.nombre, pedido.fecha, items, total)
+
+    @staticmethod
+    def _consulta_boletas(fecha_desde=None, fecha_hasta=None):
+        """Filas planas (pedido, fecha, cliente, email, menú, cantidad, precio) del rango, por fecha."""
+        consulta = (
+            select(Pedido.id, Pedido.fecha, Cliente.nombre, Cliente.email,
+                   Menu.nombre, PedidoMenu.cantidad, PedidoMenu.precio_unitario)
+            .join(Cliente, Pedido.cliente)
+            .join(PedidoMenu, Pedido.items)
+            .join(Menu, PedidoMenu.menu)
+            .order_by(Pedido.fecha, Pedido.id, Menu.nombre)
+        )
+        if fecha_desde:
+            consulta = consulta.where(Pedido.fecha >= fecha_desde)
+        if fecha_hasta:
+            if not isinstance(fecha_hasta, datetime.datetime):
+                fecha_hasta = datetime.datetime.combine(fecha_hasta, datetime.time.max)
+            consulta = consulta.where(Pedido.fecha <= fecha_hasta)
+        return consulta
+
+    @staticmethod
+    def _datos_boleta(lineas):
+        """DatosBoleta a partir de las filas de _consulta_boletas de un mismo pedido."""
+        pedido_id, fecha, nombre, email = lineas[0][:4]
+        return DatosBoleta(pedido_id, nombre, email, fecha,
+                           [(menu, cant, precio) for *_, menu, cant, precio in lineas])
+
+    @staticmethod
+    def leer_datos_boletas(db: Session, fecha_desde=None, fecha_hasta=None, tamano_lote: int = 500):
+        """
+        Genera DatosBoleta de los pedidos del rango (inclusive), ordenados por fecha.
+        Una sola consulta plana (pedido + cliente + líneas) leída por tramos con
+        yield_per: no carga objetos ORM ni todo el rango en memoria.
+        """
+        consulta = PedidoCRUD._consulta_boletas(fecha_desde, fecha_hasta)
+        filas = db.execute(consulta.execution_options(yield_per=tamano_lote))
+        for _, lineas in groupby(filas, key=lambda f: f[0]):
+            yield PedidoCRUD._datos_boleta(list(lineas))
+
     @staticmethod
     def leer_pedidos(db: Session):
         return db.query(Pedido).options(joinedload(Pedido.menus)).all()
 
+    @staticmethod
+    def buscar_pedidos(db: Session, texto_email: str = "", fecha_desde=None, fecha_hasta=None,
+                       despues_de=None, limite: int = 100, contiene: bool = False):
+        """
+        Búsqueda paginada de pedidos, resuelta completamente en SQL.
+        - texto_email: prefijo del email (usa el índice pedido(cliente_email, fecha));
+          con contiene=True busca el texto en cualquier parte del email.
+        - fecha_desde / fecha_hasta: rango de fechas (inclusive).
+        - despues_de: cursor (fecha, id) de la última fila de la página anterior
+          (paginación por keyset: no usa OFFSET, cada página cuesta lo mismo).
+        Orden: más recientes primero; los pedidos sin fecha al final (fecha None en el cursor).
+        Retorna (filas, cursor_siguiente); filas = [(id, cliente_email, descripcion, fecha)]
+        y cursor_siguiente = None cuando no hay más páginas.
+        """
+        consulta = db.query(Pedido.id, Pedido.cliente_email, Pedido.descripcion, Pedido.fecha)
+
+        texto = (texto_email or "").strip().lower()
+        if texto and contiene:
+            # El texto libre se busca en la tabla cliente (mucho más chica que pedido)
+            # y luego se usan los emails encontrados contra el índice de pedido
+            emails = select(Cliente.email).where(Cliente.email.contains(texto, autoescape=True))
+            consulta = consulta.filter(Pedido.cliente_email.in_(emails))
+        elif texto:
+            # Rango [texto, texto_siguiente) en vez de LIKE: así SQLite usa el índice
+            siguiente = texto[:-1] + chr(ord(texto[-1]) + 1)
+            consulta = consulta.filter(Pedido.cliente_email >= texto, Pedido.cliente_email < siguiente)
+
+        if fecha_desde:
+            consulta = consulta.filter(Pedido.fecha >= fecha_desde)
+        if fecha_hasta:
+            # Inclusive: si llega un date, se incluye todo ese día
+            if not isinstance(fecha_hasta, datetime.datetime):
+                fecha_hasta = datetime.datetime.combine(fecha_hasta, datetime.time.max)
+            consulta = consulta.filter(Pedido.fecha <= fecha_hasta)
+
+        # Los pedidos sin fecha van al final. Se leen aparte (por id) cuando se acaban
+        # los fechados: un "OR fecha IS NULL" en el keyset impediría usar el índice
+        fecha_cursor, id_cursor = despues_de if despues_de else (None, None)
+        filas = []
+        if fecha_cursor is not None or not despues_de:
+            con_fecha = consulta.filter(Pedido.fecha.isnot(None))
+            if despues_de:
+                con_fecha = con_fecha.filter(or_(
+                    Pedido.fecha < fecha_cursor,
+                    and_(Pedido.fecha == fecha_cursor, Pedido.id < id_cursor)
+                ))
+            filas = con_fecha.order_by(Pedido.fecha.desc(), Pedido.id.desc()).limit(limite + 1).all()
+            id_cursor = None  # los sin fecha se leen desde el principio
+        if len(filas) <= limite and not (fecha_desde or fecha_hasta):
+            sin_fecha = consulta.filter(Pedido.fecha.is_(None))
+            if id_cursor is not None:
+                sin_fecha = sin_fecha.filter(Pedido.id < id_cursor)
+            filas += sin_fecha.order_by(Pedido.id.desc()).limit(limite + 1 - len(filas)).all()
+
+        # Pedimos una fila extra solo para saber si hay otra página
+        hay_mas = len(filas) > limite
+        filas = filas[:limite]
+        cursor = (filas[-1].fecha, filas[-1].id) if hay_mas else None
+        return filas, cursor
+
+    @staticmethod
+    def leer_pedidos_por_id(db: Session, ids):
+        """Mismas filas que buscar_pedidos, pero de los pedidos indicados (para refrescar filas sueltas)."""
+        return (db.query(Pedido.id, Pedido.cliente_email, Pedido.descripcion, Pedido.fecha)
+                .filter(Pedido.id.in_(list(ids))).all())
+
     @staticmethod
     def borrar_pedido_y_restaurar_stock(db: Session, pedido_id: int):
         """
         Borra el pedido y DEVUELVE los ingredientes al stock.
         """
-        # Cargar pedido con sus menús e ingredientes (Deep Eager Loading)
-        pedido = db.query(Pedido).options(
-            joinedload(Pedido.menus).joinedload(Menu.ingredientes_receta).joinedload(MenuIngrediente.ingrediente)
-        ).get(pedido_id)
+        # Cargar pedido con sus líneas; las recetas salen de la caché
+        pedido = db.query(Pedido).options(joinedload(Pedido.items)).get(pedido_id)
 
         if not pedido: return False
 
         try:
+            cantidades = {it.menu_id: it.cantidad for it in pedido.items}
+            recetas = CacheRecetas.obtener(db, cantidades.keys())
+
             # 1. Devolver Stock
-            IngredienteCRUD.devolver_stock_receta(db, pedido.menus)
+            IngredienteCRUD.devolver_stock(db, CacheRecetas.requerimientos(recetas, cantidades))
+
+            # 2. Descontar de los resúmenes diarios (con el precio que se cobró)
+            lineas = list(map(
+                lambda it: (it.menu_id, it.cantidad, it.precio_unitario, recetas[it.menu_id].receta),
+                pedido.items))
+            ResumenCRUD.revertir_pedido(db, pedido.fecha, lineas)
 
-            # 2. Borrar Pedido
+            # 3. Borrar Pedido
             db.delete(pedido)
             db.commit()
             return True
@@ -100,9 +432,6 @@ class PedidoCRUD:
 
     @staticmethod
     def calcular_total_ventas(db: Session):
-        pedidos = db.query(Pedido).options(joinedload(Pedido.menus)).all()
-        if not pedidos: return 0.0
-        
-        # Sumar precios de todos los menús de todos los pedidos
-        montos = map(lambda p: sum(m.precio for m in p.menus), pedidos)
-        return reduce(lambda a, b: a + b, montos, 0.0)
\ No newline at end of file
+        # Se suma el resumen diario (una fila por día) en vez de recorrer todos los pedidos
+        total = db.query(func.sum(VentaDiaria.total)).scalar()
+        return float(total or 0.0)
\ No newline at end of file
@@ -0,0 +1,186 @@
+from collections import Counter
+import datetime
+from sqlalchemy import func, select, cast, Date
+from sqlalchemy.orm import Session
+from sqlalchemy.exc import SQLAlchemyError
+from models import (Pedido, PedidoMenu, MenuIngrediente,
+                    VentaDiaria, VentaMenuDiaria, ConsumoIngredienteDiario)
+from instrumentacion import instrumentar_clase
+
+_UPSERTS = {}  # (dialecto, modelo, claves, columnas) -> INSERT ... ON CONFLICT ya armado
+
+
+@instrumentar_clase
+class ResumenCRUD:
+    """
+    Mantiene las tablas resumen diarias (venta_diaria, venta_menu_diaria,
+    consumo_ingrediente_diario). Los métodos registrar/revertir NO hacen commit:
+    se ejecutan dentro de la transacción de PedidoCRUD.
+    """
+
+    @staticmethod
+    def _a_dia(fecha):
+        # Pedido.fecha puede venir como datetime (ahora) o date (calendario)
+        if isinstance(fecha, datetime.datetime):
+            return fecha.date()
+        return fecha
+
+    @staticmethod
+    def _expr_dia(db: Session, columna):
+        # SQLite guarda DateTime como texto: date() extrae 'YYYY-MM-DD'
+        if db.get_bind().dialect.name == "sqlite":
+            return func.date(columna)
+        return cast(columna, Date)
+
+    @staticmethod
+    def _acumular(db: Session, modelo, claves: list, filas: list):
+        """
+        UPSERT aditivo: INSERT ... ON CONFLICT DO UPDATE SET col = col + excluded.col.
+        Es atómico en la BD, por lo que dos cajas vendiendo el mismo día no se pisan.
+        """
+        if not filas:
+            return
+
+        nombre_dialecto = db.get_bind().dialect.name
+        columnas_suma = tuple(c for c in filas[0] if c not in claves)
+        llave = (nombre_dialecto, modelo, tuple(claves), columnas_suma)
+        stmt = _UPSERTS.get(llave)
+        if stmt is None:
+            # Se arma una vez por tabla: cada venta pasa por aquí tres veces
+            if nombre_dialecto == "postgresql":
+                from sqlalchemy.dialects.postgresql import insert
+            else:
+                from sqlalchemy.dialects.sqlite import insert
+
+            tabla = modelo.__table__
+            stmt = insert(tabla)
+            stmt = _UPSERTS[llave] = stmt.on_conflict_do_update(
+                index_elements=claves,
+                set_={c: tabla.c[c] + stmt.excluded[c] for c in columnas_suma}
+            )
+        db.connection().execute(stmt, filas)
+
+    @staticmethod
+    def _aplicar(db: Session, fecha, lineas: list, signo: int):
+        if fecha is None:
+            return
+        dia = ResumenCRUD._a_dia(fecha)
+
+        total = sum(map(lambda l: l[1] * l[2], lineas))
+        ventas = {dia: (signo, signo * total)}
+
+        unidades = Counter()
+        usos = Counter()
+        consumo = Counter()
+        for menu_id, cantidad, _, receta in lineas:
+            unidades[(dia, menu_id)] += signo * cantidad
+            for ing_id, cant_req in receta:
+                usos[(dia, ing_id)] += signo * cantidad
+                consumo[(dia, ing_id)] += signo * cantidad * cant_req
+
+        ResumenCRUD.registrar_agregado(db, ventas, unidades, usos, consumo)
+
+    @staticmethod
+    def registrar_agregado(db: Session, ventas: dict, unidades: dict, usos: dict, consumo: dict):
+        """
+        Vuelca deltas ya agregados (usado por las cargas por lotes):
+          ventas:   {dia: (cantidad_pedidos, total)}
+          unidades: {(dia, menu_id): unidades}
+          usos / consumo: {(dia, ingrediente_id): valor}
+        """
+        ResumenCRUD._acumular(db, VentaDiaria, ["fecha"], [
+            {"fecha": dia, "cantidad_pedidos": cant, "total": total}
+            for dia, (cant, total) in ventas.items()
+        ])
+        ResumenCRUD._acumular(db, VentaMenuDiaria, ["fecha", "menu_id"], [
+            {"fecha": dia, "menu_id": m_id, "unidades": cant}
+            for (dia, m_id), cant in unidades.items()
+        ])
+        ResumenCRUD._acumular(db, ConsumoIngredienteDiario, ["fecha", "ingrediente_id"], [
+            {"fecha": dia, "ingrediente_id": i_id, "usos": usos[(dia, i_id)],
+             "cantidad": float(consumo.get((dia, i_id), 0.0))}
+            for (dia, i_id) in usos
+        ])
+
+    @staticmethod
+    def registrar_pedido(db: Session, fecha, lineas: list):
+        """
+        Suma un pedido recién creado a los resúmenes del día.
+        lineas: [(menu_id, cantidad, precio_unitario, receta), ...]
+        con receta = [(ingrediente_id, cantidad_requerida), ...] (ver CacheRecetas)
+        """
+        ResumenCRUD._aplicar(db, fecha, lineas, 1)
+
+    @staticmethod
+    def revertir_pedido(db: Session, fecha, lineas: list):
+        """Descuenta de los resúmenes un pedido que se está anulando (mismas lineas)."""
+        ResumenCRUD._aplicar(db, fecha, lineas, -1)
+
+    @staticmethod
+    def reconstruir(db: Session):
+        """
+        Vacía y vuelve a poblar los resúmenes desde las filas de 'pedido'
+        usando INSERT ... SELECT con GROUP BY (todo se resuelve en la BD).
+        Retorna True si tuvo éxito.
+        """
+        try:
+            db.query(VentaDiaria).delete()
+            db.query(VentaMenuDiaria).delete()
+            db.query(ConsumoIngredienteDiario).delete()
+
+            dia = ResumenCRUD._expr_dia(db, Pedido.fecha).label("dia")
+
+            # Total de cada pedido (cantidad x precio cobrado en cada línea)
+            totales = (
+                select(PedidoMenu.pedido_id,
+                       func.sum(PedidoMenu.cantidad * PedidoMenu.precio_unitario).label("total"))
+                .group_by(PedidoMenu.pedido_id)
+                .subquery()
+            )
+            ventas = (
+                select(dia, func.count(Pedido.id), func.coalesce(func.sum(totales.c.total), 0))
+                .outerjoin(totales, totales.c.pedido_id == Pedido.id)
+                .where(Pedido.fecha.isnot(None))
+                .group_by(dia)
+            )
+            db.execute(VentaDiaria.__table__.insert().from_select(
+                ["fecha", "cantidad_pedidos", "total"], ventas))
+
+            por_menu = (
+                select(dia, PedidoMenu.menu_id, func.sum(PedidoMenu.cantidad))
+                .select_from(PedidoMenu)
+                .join(Pedido, Pedido.id == PedidoMenu.pedido_id)
+                .where(Pedido.fecha.isnot(None))
+                .group_by(dia, PedidoMenu.menu_id)
+            )
+            db.execute(VentaMenuDiaria.__table__.insert().from_select(
+                ["fecha", "menu_id", "unidades"], por_menu))
+
+            por_ingrediente = (
+                select(dia, MenuIngrediente.ingrediente_id, func.sum(PedidoMenu.cantidad),
+                       func.sum(PedidoMenu.cantidad * MenuIngrediente.cantidad_requerida))
+                .select_from(PedidoMenu)
+                .join(Pedido, Pedido.id == PedidoMenu.pedido_id)
+                .join(MenuIngrediente, MenuIngrediente.menu_id == PedidoMenu.menu_id)
+                .where(Pedido.fecha.isnot(None))
+                .group_by(dia, MenuIngrediente.ingrediente_id)
+            )
+            db.execute(ConsumoIngredienteDiario.__table__.insert().from_select(
+                ["fecha", "ingrediente_id", "usos", "cantidad"], por_ingrediente))
+
+            db.commit()
+            return True
+        except SQLAlchemyError as e:
+            db.rollback()
+            print(f"Error reconstruyendo resúmenes: {e}")
+            return False
+
+    @staticmethod
+    def reconstruir_si_vacio(db: Session):
+        """
+        Backfill automático para bases de datos creadas antes de los resúmenes:
+        si hay pedidos pero los resúmenes están vacíos, se reconstruyen.
+        """
+        if db.query(VentaDiaria.fecha).first() is None and db.query(Pedido.id).first() is not None:
+            return ResumenCRUD.reconstruir(db)
+        return False
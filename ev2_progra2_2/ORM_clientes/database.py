@@ -1,15 +1,188 @@
 # Configuración de la base de datos y sesión
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+import os
+import sys
+import time
+import threading
+import weakref
+import configparser
+from contextlib import contextmanager
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
 from sqlalchemy import text
 
+# URL por defecto (SQLite en el directorio de trabajo)
+DATABASE_URL_DEFECTO = 'sqlite:///mi_base_de_datos.db'
+
+# Archivo de configuración opcional (ver bd.ini.ejemplo). Se puede cambiar con RESTAURANTE_CONFIG_BD.
+ARCHIVO_CONFIG = os.environ.get("RESTAURANTE_CONFIG_BD", "bd.ini")
+
+# Valores por defecto de [base_de_datos]. Los pragmas solo aplican a SQLite.
+CONFIG_DEFECTO = {
+    "url": DATABASE_URL_DEFECTO,
+    "url_lectura": "",            # vacío = misma BD que la de escritura
+    "busy_timeout_ms": "15000",   # espera ante "database is locked" en vez de fallar
+    "synchronous": "NORMAL",      # seguro con WAL y mucho más rápido que FULL
+    "mmap_size": str(256 * 1024 * 1024),
+    "cache_size_kb": "65536",
+    "pool_escritura": "2",
+    "overflow_escritura": "3",
+    "pool_lectura": "4",
+    "overflow_lectura": "4",
+    "pool_timeout": "30",
+    "pool_recycle": "1800",
+}
+
+
+def leer_configuracion():
+    """
+    Configuración de la BD: valores por defecto <- archivo bd.ini <- variables de entorno.
+    DATABASE_URL y DATABASE_URL_LECTURA tienen prioridad sobre el archivo.
+    """
+    config = dict(CONFIG_DEFECTO)
+
+    parser = configparser.ConfigParser()
+    if parser.read(ARCHIVO_CONFIG, encoding="utf-8") and parser.has_section("base_de_datos"):
+        config.update(parser["base_de_datos"])
+
+    if os.environ.get("DATABASE_URL"):
+        config["url"] = os.environ["DATABASE_URL"]
+    if os.environ.get("DATABASE_URL_LECTURA"):
+        config["url_lectura"] = os.environ["DATABASE_URL_LECTURA"]
+    return config
+
+
+def _configurar_sqlite(motor, config, solo_lectura):
+    """Aplica los pragmas en cada conexión nueva del pool."""
+
+    @event.listens_for(motor, "connect")
+    def aplicar_pragmas(conexion_dbapi, registro):
+        cursor = conexion_dbapi.cursor()
+        # WAL: los lectores no bloquean al escritor ni viceversa (queda guardado en el archivo)
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA synchronous={config['synchronous']}")
+        cursor.execute(f"PRAGMA busy_timeout={int(config['busy_timeout_ms'])}")
+        cursor.execute(f"PRAGMA mmap_size={int(config['mmap_size'])}")
+        # cache_size negativo = tamaño en KiB
+        cursor.execute(f"PRAGMA cache_size=-{int(config['cache_size_kb'])}")
+        cursor.execute("PRAGMA foreign_keys=ON")
+        if solo_lectura:
+            cursor.execute("PRAGMA query_only=ON")
+        cursor.close()
+
+
+def opciones_motor(url, solo_lectura, config):
+    """Argumentos de create_engine para la URL (los comparte database_async.py)."""
+    tipo = "lectura" if solo_lectura else "escritura"
+    opciones_pool = {
+        "pool_size": int(config[f"pool_{tipo}"]),
+        "max_overflow": int(config[f"overflow_{tipo}"]),
+        "pool_timeout": int(config["pool_timeout"]),
+    }
+
+    if url.startswith("sqlite"):
+        if ":memory:" in url or url.split("?")[0].rstrip("/").endswith(":"):
+            # Una BD en memoria vive en su conexión: no admite pool
+            return {}
+        return opciones_pool
+
+    return dict(pool_pre_ping=True, pool_recycle=int(config["pool_recycle"]), **opciones_pool)
+
+
+def crear_motor(url=None, solo_lectura=False, config=None):
+    """
+    Crea un Engine según el dialecto:
+      - SQLite: pragmas de rendimiento/concurrencia y pool chico (hay un solo escritor a la vez).
+      - PostgreSQL u otros: pool con pre_ping y reciclado de conexiones.
+    solo_lectura elige el tamaño de pool de lectura (y en SQLite activa query_only).
+    """
+    config = config or leer_configuracion()
+    url = url or config["url"]
+
+    motor = create_engine(url, **opciones_motor(url, solo_lectura, config))
+    if url.startswith("sqlite"):
+        _configurar_sqlite(motor, config, solo_lectura)
+    return motor
+
+
 # Configuración del motor y la sesión
-DATABASE_URL = 'sqlite:///mi_base_de_datos.db'
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+_config = leer_configuracion()
+DATABASE_URL = _config["url"]
+engine = crear_motor(DATABASE_URL, config=_config)
+# Motor para consultas que no escriben (búsquedas, gráficos): no compite por el pool del escritor
+engine_lectura = crear_motor(_config["url_lectura"] or DATABASE_URL, solo_lectura=True, config=_config)
+
+
+# --- Detector de fugas de sesiones ---
+# Cada sesión se registra al crearse (con el archivo:línea que la pidió) y se
+# quita al cerrarse. Si el recolector de basura elimina una sesión que nunca se
+# cerró, se avisa por consola; reportar_sesiones_abiertas() lista las vivas.
+_sesiones_abiertas = {}
+_lock_sesiones = threading.Lock()
+
+
+_ESTE_ARCHIVO = os.path.abspath(__file__)
+
+
+def _origen_llamada():
+    """Primer frame fuera de SQLAlchemy / contextlib / este módulo: quien pidió la sesión."""
+    frame = sys._getframe(2)
+    while frame is not None:
+        archivo = frame.f_code.co_filename
+        if not (os.path.abspath(archivo) == _ESTE_ARCHIVO or "sqlalchemy" in archivo or archivo.endswith("contextlib.py")):
+            return f"{os.path.basename(archivo)}:{frame.f_lineno} ({frame.f_code.co_name})"
+        frame = frame.f_back
+    return "desconocido"
+
+
+def _sesion_perdida(clave, registro):
+    with _lock_sesiones:
+        seguia_abierta = _sesiones_abiertas.pop(clave, None) is not None
+    if seguia_abierta and not registro["larga_duracion"]:
+        print(f"Advertencia: sesión de BD no cerrada, creada en {registro['origen']}")
+
+
+class SesionRastreada(Session):
+    """Session que se anota en el registro de sesiones abiertas hasta su close()."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._registro = {"origen": _origen_llamada(), "inicio": time.monotonic(),
+                          "hilo": threading.current_thread().name, "larga_duracion": False}
+        with _lock_sesiones:
+            _sesiones_abiertas[id(self)] = self._registro
+        self._finalizador = weakref.finalize(self, _sesion_perdida, id(self), self._registro)
+
+    def marcar_larga_duracion(self):
+        """Excluye del reporte de fugas a una sesión que se mantiene abierta a propósito."""
+        self._registro["larga_duracion"] = True
+
+    def close(self):
+        super().close()
+        with _lock_sesiones:
+            _sesiones_abiertas.pop(id(self), None)
+        self._finalizador.detach()
+
+
+def sesiones_abiertas(min_segundos=0.0):
+    """Lista de (origen, hilo, segundos_abierta) de las sesiones sin cerrar."""
+    ahora = time.monotonic()
+    with _lock_sesiones:
+        registros = list(_sesiones_abiertas.values())
+    return [(r["origen"], r["hilo"], ahora - r["inicio"])
+            for r in registros
+            if not r["larga_duracion"] and ahora - r["inicio"] >= min_segundos]
+
+
+def reportar_sesiones_abiertas(min_segundos=0.0):
+    """Imprime las sesiones que siguen abiertas. Retorna cuántas hay."""
+    abiertas = sesiones_abiertas(min_segundos)
+    for origen, hilo, segundos in abiertas:
+        print(f"Sesión abierta hace {segundos:.1f}s, creada en {origen} [{hilo}]")
+    return len(abiertas)
+
+
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine, class_=SesionRastreada)
+SessionLectura = sessionmaker(autocommit=False, autoflush=False, bind=engine_lectura, class_=SesionRastreada)
 
 # Base declarativa
 Base = declarative_base()  # Definimos Base aquí
@@ -22,6 +195,32 @@ def get_session():
     finally:
         db.close()
 
+def get_session_lectura():
+    """Igual que get_session, pero sobre el motor de solo lectura."""
+    db = SessionLectura()
+    try:
+        yield db
+    finally:
+        db.close()
+
+@contextmanager
+def sesion_scope(lectura=False):
+    """
+    Unidad de trabajo: 'with sesion_scope() as db:'
+    Hace commit si el bloque termina bien, rollback si lanza una excepción,
+    y siempre cierra la sesión (a diferencia de next(get_session()), cuyo
+    finally no corre si el generador nunca se agota).
+    """
+    db = SessionLectura() if lectura else SessionLocal()
+    try:
+        yield db
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
 def verificar_conexion():
     """
     Intenta conectar a la base de datos para validar que el motor está activo.
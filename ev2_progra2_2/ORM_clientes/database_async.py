@@ -0,0 +1,96 @@
+# Motores y sesiones asyncio (AsyncSession) para servicios de integración: muchas
+# ventas o reportes en curso a la vez en un solo hilo, solapando la espera a la BD
+# en vez de ocupar un hilo y una conexión por tarea (ver crud/asincrono.py).
+#
+# Usa la misma configuración que database.py (bd.ini / DATABASE_URL), cambiando el
+# driver por su versión async: sqlite -> sqlite+aiosqlite, postgresql -> postgresql+asyncpg.
+# Requiere greenlet y el driver (pip install aiosqlite / asyncpg); por eso este
+# módulo no lo importa la App, solo quien use el CRUD async.
+#
+# Los motores quedan ligados al event loop que abrió sus conexiones: crear y
+# cerrar (cerrar_motores) dentro del mismo asyncio.run().
+import threading
+from contextlib import asynccontextmanager
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from database import leer_configuracion, opciones_motor, _configurar_sqlite, SesionRastreada
+
+# Driver async por dialecto; una URL que ya usa uno de DRIVERS_ASYNC se deja tal cual
+DRIVER_ASYNC = {"sqlite": "aiosqlite", "postgresql": "asyncpg"}
+DRIVERS_ASYNC = {"aiosqlite", "asyncpg", "psycopg"}
+
+
+def url_async(url):
+    """'sqlite:///x.db' -> 'sqlite+aiosqlite:///x.db', 'postgresql+psycopg2://...' -> 'postgresql+asyncpg://...'."""
+    partes = make_url(url)
+    if partes.get_driver_name() in DRIVERS_ASYNC:
+        return partes.render_as_string(hide_password=False)
+    driver = DRIVER_ASYNC.get(partes.get_backend_name())
+    if driver is None:
+        raise ValueError(f"No hay driver async configurado para '{partes.drivername}'")
+    return partes.set(drivername=f"{partes.get_backend_name()}+{driver}").render_as_string(hide_password=False)
+
+
+def crear_motor_async(url=None, solo_lectura=False, config=None):
+    """AsyncEngine con los mismos pools y pragmas de SQLite que database.crear_motor."""
+    config = config or leer_configuracion()
+    url = url_async(url or config["url"])
+    motor = create_async_engine(url, **opciones_motor(url, solo_lectura, config))
+    if url.startswith("sqlite"):
+        # Los eventos de conexión se registran en el Engine síncrono que envuelve al async
+        _configurar_sqlite(motor.sync_engine, config, solo_lectura)
+    return motor
+
+
+def crear_sesiones_async(motor):
+    """
+    Fábrica de AsyncSession. expire_on_commit=False: tras el commit los objetos
+    retornados se siguen pudiendo leer sin otra consulta (una carga implícita
+    fuera de run_sync no está permitida en asyncio).
+    La sesión síncrona interna es SesionRastreada: publica en eventos.py y entra
+    en el detector de fugas como las demás.
+    """
+    return async_sessionmaker(motor, autoflush=False, expire_on_commit=False,
+                              sync_session_class=SesionRastreada)
+
+
+_motores = {}  # "escritura" / "lectura" -> (motor, fábrica de sesiones)
+_lock = threading.Lock()
+
+
+def _obtener(tipo):
+    with _lock:
+        if tipo not in _motores:
+            config = leer_configuracion()
+            url = config["url_lectura"] if tipo == "lectura" and config["url_lectura"] else config["url"]
+            motor = crear_motor_async(url, solo_lectura=tipo == "lectura", config=config)
+            _motores[tipo] = (motor, crear_sesiones_async(motor))
+        return _motores[tipo]
+
+
+@asynccontextmanager
+async def sesion_async_scope(lectura=False):
+    """
+    Unidad de trabajo async: 'async with sesion_async_scope() as db:'.
+    Igual que database.sesion_scope: commit al terminar bien, rollback si hay
+    excepción y siempre close. Cada tarea concurrente debe abrir la suya.
+    """
+    _, fabrica = _obtener("lectura" if lectura else "escritura")
+    db = fabrica()
+    try:
+        yield db
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+    finally:
+        await db.close()
+
+
+async def cerrar_motores():
+    """Cierra las conexiones de los motores por defecto (al terminar el event loop)."""
+    with _lock:
+        motores = [motor for motor, _ in _motores.values()]
+        _motores.clear()
+    for motor in motores:
+        await motor.dispose()
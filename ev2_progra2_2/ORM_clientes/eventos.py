@@ -0,0 +1,175 @@
+# Bus de cambios: avisa qué filas de Cliente, Ingrediente, Menu y Pedido
+# cambiaron para que la UI actualice solo esas filas en vez de recargar tablas.
+# También publica las líneas de pedido y de receta (PedidoMenu, MenuIngrediente,
+# con clave (id, id)) para quien dependa de ellas, como la caché de gráficos.
+# Los listeners del mapper anotan los cambios en la sesión durante el flush;
+# se publican recién al hacer commit (un rollback los descarta).
+# Las rutas masivas que usan Core (UPDATE/INSERT executemany) no disparan los
+# eventos del mapper: esas llaman a registrar_cambio() a mano.
+# Con activar_registro_bd() los cambios además quedan en la tabla cambio_registrado
+# (misma transacción), para que otros procesos sobre la misma BD los lean.
+import os
+import json
+import uuid
+import threading
+from collections import namedtuple
+from sqlalchemy import event, insert, select
+from sqlalchemy.orm import object_session
+from database import SesionRastreada
+from models import Cliente, Ingrediente, Menu, Pedido, PedidoMenu, MenuIngrediente, CambioRegistrado
+
+# accion: "insertado", "actualizado", "borrado" o "recargar" (clave None: cambió toda la tabla)
+Cambio = namedtuple("Cambio", "entidad accion clave")
+
+ENTIDADES = {Cliente: "Cliente", Ingrediente: "Ingrediente", Menu: "Menu", Pedido: "Pedido",
+             PedidoMenu: "PedidoMenu", MenuIngrediente: "MenuIngrediente"}
+
+_suscriptores = []
+_lock = threading.Lock()
+
+
+def suscribir(callback):
+    """callback(lista_de_Cambio) se llama tras cada commit con cambios, en el hilo que hizo commit."""
+    with _lock:
+        _suscriptores.append(callback)
+
+
+def desuscribir(callback):
+    with _lock:
+        if callback in _suscriptores:
+            _suscriptores.remove(callback)
+
+
+def registrar_cambio(db, entidad: str, accion: str, claves=(None,)):
+    """Anota cambios hechos sin el ORM; se publican con el próximo commit de 'db'."""
+    pendientes = db.info.setdefault("cambios_pendientes", [])
+    pendientes.extend(Cambio(entidad, accion, clave) for clave in claves)
+
+
+def resumir(cambios):
+    """
+    Combina una secuencia de cambios en {entidad: {"insertado": set, "actualizado": set,
+    "borrado": set, "recargar": bool}}: insertar+borrar se anula, borrar gana a actualizar
+    e insertar+actualizar queda como insertado.
+    """
+    resumen = {}
+    for entidad, accion, clave in cambios:
+        r = resumen.setdefault(entidad, {"insertado": set(), "actualizado": set(),
+                                         "borrado": set(), "recargar": False})
+        if accion == "recargar":
+            r["recargar"] = True
+        elif accion == "insertado":
+            r["borrado"].discard(clave)
+            r["insertado"].add(clave)
+        elif accion == "actualizado":
+            if clave not in r["insertado"]:
+                r["actualizado"].add(clave)
+        elif accion == "borrado":
+            r["actualizado"].discard(clave)
+            if clave in r["insertado"]:
+                r["insertado"].discard(clave)
+            else:
+                r["borrado"].add(clave)
+    return resumen
+
+
+# --- Listeners del mapper (rutas ORM) ---
+
+def _clave(mapper, objeto):
+    # Clave primaria: un valor (id, email) o una tupla si es compuesta (líneas de pedido/receta)
+    clave = mapper.primary_key_from_instance(objeto)
+    return clave[0] if len(clave) == 1 else tuple(clave)
+
+
+def _anotar(accion):
+    def listener(mapper, connection, objeto):
+        db = object_session(objeto)
+        if db is None:
+            return
+        # after_update también llega si solo cambió una relación (ej: cliente.pedido.append);
+        # eso no cambia ninguna columna visible, así que no se anota
+        if accion == "actualizado" and not db.is_modified(objeto, include_collections=False):
+            return
+        registrar_cambio(db, ENTIDADES[type(objeto)], accion, [_clave(mapper, objeto)])
+    return listener
+
+
+for _modelo in ENTIDADES:
+    event.listen(_modelo, "after_insert", _anotar("insertado"))
+    event.listen(_modelo, "after_update", _anotar("actualizado"))
+    event.listen(_modelo, "after_delete", _anotar("borrado"))
+
+
+# --- Publicación al confirmar la transacción ---
+
+def publicar(cambios):
+    """
+    Entrega una lista de Cambio a los suscriptores. La llaman los commits de
+    SesionRastreada y quien reciba cambios de otro lado (ver backend_remoto.py).
+    """
+    with _lock:
+        suscriptores = list(_suscriptores)
+    for callback in suscriptores:
+        try:
+            callback(cambios)
+        except Exception as e:
+            print(f"Error notificando cambios: {e}")
+
+
+@event.listens_for(SesionRastreada, "after_commit")
+def _publicar(db):
+    cambios = db.info.pop("cambios_pendientes", None)
+    if cambios:
+        publicar(cambios)
+
+
+@event.listens_for(SesionRastreada, "after_rollback")
+def _descartar(db):
+    db.info.pop("cambios_pendientes", None)
+
+
+# --- Registro en la BD (varios procesos sobre la misma BD) ---
+
+_origen = None  # identificador de este proceso; None = no se registra en la BD
+
+
+def activar_registro_bd():
+    """
+    Desde ahora cada commit con cambios también los inserta en cambio_registrado,
+    dentro de la misma transacción. Retorna el origen con que se marcan las filas.
+    """
+    global _origen
+    if _origen is None:
+        _origen = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+    return _origen
+
+
+def origen_local():
+    return _origen
+
+
+@event.listens_for(SesionRastreada, "before_commit")
+def _guardar_en_bd(db):
+    if _origen is None:
+        return
+    db.flush()  # los listeners del mapper anotan durante el flush
+    cambios = db.info.get("cambios_pendientes")
+    if cambios:
+        db.execute(insert(CambioRegistrado), [
+            {"origen": _origen, "entidad": c.entidad, "accion": c.accion, "clave": json.dumps(c.clave)}
+            for c in cambios])
+
+
+def _clave_json(texto):
+    clave = json.loads(texto) if texto else None
+    return tuple(clave) if isinstance(clave, list) else clave
+
+
+def leer_cambios_bd(db, desde, limite=1000):
+    """Lista de (id, origen, Cambio) con id > desde, en orden de id."""
+    filas = db.execute(
+        select(CambioRegistrado.id, CambioRegistrado.origen, CambioRegistrado.entidad,
+               CambioRegistrado.accion, CambioRegistrado.clave)
+        .where(CambioRegistrado.id > desde).order_by(CambioRegistrado.id).limit(limite))
+    return [(i, origen, Cambio(entidad, accion, _clave_json(clave)))
+            for i, origen, entidad, accion, clave in filas]
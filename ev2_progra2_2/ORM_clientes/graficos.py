@@ -1,104 +1,326 @@
-import matplotlib.pyplot as plt
-from matplotlib.figure import Figure
-from sqlalchemy.orm import joinedload
-from models import Pedido, Menu, MenuIngrediente
-from collections import Counter
+import io
+import math
+import base64
+import datetime
+import threading
+from collections import OrderedDict, Counter
+from sqlalchemy import func
+from models import (Pedido, Menu, Ingrediente,
+                    VentaDiaria, VentaMenuDiaria, ConsumoIngredienteDiario)
+from eventos import suscribir
+from instrumentacion import instrumentar
+import metricas
+
+# Formatos strftime para agrupar las ventas según el periodo elegido
+FORMATOS_PERIODO = {
+    "Diario": "%Y-%m-%d",
+    "Mensual": "%Y-%m",
+    "Anual": "%Y",
+}
+
+# Equivalentes para to_char() de PostgreSQL
+FORMATOS_PERIODO_PG = {
+    "Diario": "YYYY-MM-DD",
+    "Mensual": "YYYY-MM",
+    "Anual": "YYYY",
+}
+
+# "Semanal" se etiqueta con el lunes de cada semana (AAAA-MM-DD).
+# "Automático" elige la escala más fina cuyo número de puntos cabe en max_puntos.
+ESCALAS = ("Diario", "Semanal", "Mensual", "Anual")
+PERIODOS = ("Automático",) + ESCALAS
+
+# Presupuesto de puntos por defecto: acota el tiempo de dibujo sin importar la historia
+MAX_PUNTOS_BARRAS = 60
+MAX_PUNTOS_LINEA = 400
+MAX_MARCAS = 24        # etiquetas del eje X en barras
+MAX_ANOTACIONES = 31   # valores escritos sobre las barras
+
+# Escrituras que cambian lo que muestran los gráficos (nombres incluidos)
+ENTIDADES_GRAFICOS = {"Pedido", "PedidoMenu", "MenuIngrediente", "Menu", "Ingrediente"}
+
+
+class CacheGraficos:
+    """
+    Caché LRU de gráficos: (tipo, periodo, version) -> {"serie": (etiquetas, valores),
+    "imagen": (ancho, alto, png_base64)}.
+    'version' sube con cada commit que toca ENTIDADES_GRAFICOS (ver eventos.py); al subir
+    se vacía la caché, y lo calculado con una versión anterior ya no se guarda.
+    Se limita por cantidad de entradas y por bytes de imagen.
+    """
+
+    def __init__(self, max_entradas=32, max_bytes=16 * 1024 * 1024):
+        self.max_entradas = max_entradas
+        self.max_bytes = max_bytes
+        self.version = 0
+        self.aciertos = 0
+        self.fallos = 0
+        self._entradas = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def invalidar(self):
+        with self._lock:
+            self.version += 1
+            self._entradas.clear()
+            self._bytes = 0
+
+    def obtener(self, clave):
+        """Entrada de la clave (y la marca como recién usada), o None."""
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None:
+                self.fallos += 1
+                return None
+            self.aciertos += 1
+            self._entradas.move_to_end(clave)
+            return entrada
+
+    def guardar(self, clave, serie=None, imagen=None):
+        """Guarda la serie y/o la imagen de la clave, si su versión sigue vigente."""
+        with self._lock:
+            if clave[-1] != self.version:
+                return
+            entrada = self._entradas.setdefault(clave, {"serie": None, "imagen": None})
+            self._entradas.move_to_end(clave)
+            if serie is not None:
+                entrada["serie"] = serie
+            if imagen is not None:
+                if entrada["imagen"] is not None:
+                    self._bytes -= len(entrada["imagen"][2])
+                entrada["imagen"] = imagen
+                self._bytes += len(imagen[2])
+
+            while len(self._entradas) > self.max_entradas or \
+                    (self._bytes > self.max_bytes and len(self._entradas) > 1):
+                _, vieja = self._entradas.popitem(last=False)
+                if vieja["imagen"] is not None:
+                    self._bytes -= len(vieja["imagen"][2])
+
+
+cache = CacheGraficos()
+
+# Métricas (ver metricas.py)
+LATENCIA_CONSULTA = metricas.histograma(
+    "restaurante_grafico_consulta_segundos", "Duración de la consulta de datos de un gráfico por tipo", ("tipo",))
+LATENCIA_RENDER = metricas.histograma(
+    "restaurante_grafico_render_segundos", "Duración de dibujar un gráfico a PNG por tipo", ("tipo",))
+metricas.medidor("restaurante_grafico_cache_aciertos", "Aciertos acumulados de la caché de gráficos",
+                 funcion=lambda: cache.aciertos)
+metricas.medidor("restaurante_grafico_cache_fallos", "Fallos acumulados de la caché de gráficos",
+                 funcion=lambda: cache.fallos)
+
+
+def _al_publicar_cambios(cambios):
+    if any(c.entidad in ENTIDADES_GRAFICOS for c in cambios):
+        cache.invalidar()
+
+
+suscribir(_al_publicar_cambios)
+
 
 class Graficos:
-    
+
+    @staticmethod
+    def _clave_periodo(db, periodo, columna):
+        """Expresión de agrupación por periodo según el motor (strftime en SQLite, to_char en PostgreSQL)."""
+        postgres = db.get_bind().dialect.name == "postgresql"
+        if periodo == "Semanal":
+            # Lunes de la semana: 'weekday 0' avanza al domingo y se retroceden 6 días
+            if postgres:
+                return func.to_char(func.date_trunc('week', columna), FORMATOS_PERIODO_PG["Diario"])
+            return func.date(columna, 'weekday 0', '-6 days')
+        if periodo not in FORMATOS_PERIODO:
+            periodo = "Diario"
+        if postgres:
+            return func.to_char(columna, FORMATOS_PERIODO_PG[periodo])
+        return func.strftime(FORMATOS_PERIODO[periodo], columna)
+
+    @staticmethod
+    def _cantidad_puntos(escala, desde, hasta):
+        """Cuántas barras da la escala entre dos fechas (inclusive)."""
+        if escala == "Diario":
+            return (hasta - desde).days + 1
+        if escala == "Semanal":
+            lunes = lambda f: f - datetime.timedelta(days=f.weekday())
+            return (lunes(hasta) - lunes(desde)).days // 7 + 1
+        if escala == "Mensual":
+            return (hasta.year - desde.year) * 12 + hasta.month - desde.month + 1
+        return hasta.year - desde.year + 1
+
+    @staticmethod
+    def resolver_periodo(db, periodo, fecha_desde=None, fecha_hasta=None, max_puntos=None):
+        """
+        Retorna (escala, desde, hasta) para "Ventas por Fecha":
+        - los extremos que falten se toman de las ventas registradas (una consulta);
+        - con max_puntos, la escala es la más fina (desde la pedida, o Diario si es
+          "Automático") cuyo número de barras cabe en el presupuesto.
+        """
+        if isinstance(fecha_desde, datetime.datetime):
+            fecha_desde = fecha_desde.date()
+        if isinstance(fecha_hasta, datetime.datetime):
+            fecha_hasta = fecha_hasta.date()
+        if fecha_desde is None or fecha_hasta is None:
+            primera, ultima = (db.query(func.min(VentaDiaria.fecha), func.max(VentaDiaria.fecha))
+                               .filter(VentaDiaria.cantidad_pedidos > 0).one())
+            fecha_desde = fecha_desde or primera
+            fecha_hasta = fecha_hasta or ultima
+
+        inicio = ESCALAS.index(periodo) if periodo in ESCALAS else 0
+        if max_puntos and fecha_desde and fecha_hasta and fecha_desde <= fecha_hasta:
+            for escala in ESCALAS[inicio:]:
+                if Graficos._cantidad_puntos(escala, fecha_desde, fecha_hasta) <= max_puntos:
+                    return escala, fecha_desde, fecha_hasta
+            return ESCALAS[-1], fecha_desde, fecha_hasta
+        return ESCALAS[inicio], fecha_desde, fecha_hasta
+
+    @staticmethod
+    def _filtrar_rango(consulta, columna, fecha_desde, fecha_hasta):
+        if fecha_desde:
+            consulta = consulta.filter(columna >= fecha_desde)
+        if fecha_hasta:
+            consulta = consulta.filter(columna <= fecha_hasta)
+        return consulta
+
     @staticmethod
-    def obtener_datos(db, tipo_grafico, periodo=None):
+    def lttb(xs, ys, umbral):
+        """
+        Largest-Triangle-Three-Buckets: elige 'umbral' puntos de la serie conservando
+        su forma (picos y valles). Siempre incluye el primero y el último.
+        Retorna la lista de índices elegidos.
         """
-        Extrae y procesa los datos de la BD usando Carga Ansiosa (joinedload).
+        n = len(xs)
+        if umbral >= n or umbral < 3:
+            return list(range(n))
+
+        ancho = (n - 2) / (umbral - 2)
+        elegidos = [0]
+        a = 0
+        for i in range(umbral - 2):
+            # Promedio de la cubeta siguiente (la última es el punto final)
+            sig_ini = int((i + 1) * ancho) + 1
+            sig_fin = min(int((i + 2) * ancho) + 1, n)
+            prom_x = sum(xs[sig_ini:sig_fin]) / (sig_fin - sig_ini)
+            prom_y = sum(ys[sig_ini:sig_fin]) / (sig_fin - sig_ini)
+
+            # En la cubeta actual, el punto que forma el triángulo más grande
+            ini, fin = int(i * ancho) + 1, int((i + 1) * ancho) + 1
+            ax, ay = xs[a], ys[a]
+            a = max(range(ini, fin),
+                    key=lambda j: abs((ax - prom_x) * (ys[j] - ay) - (ax - xs[j]) * (prom_y - ay)))
+            elegidos.append(a)
+        elegidos.append(n - 1)
+        return elegidos
+
+    @staticmethod
+    def _resolver_serie(db, periodo, fecha_desde, fecha_hasta, max_puntos, modo):
+        """
+        Escala, extremos y max_puntos efectivos de "Ventas por Fecha" (una sola vez
+        por consulta: resolver_periodo puede leer MIN/MAX de las ventas).
+        Retorna (escala, desde, hasta, max_puntos).
+        """
+        if periodo == "Automático" and not max_puntos:
+            max_puntos = MAX_PUNTOS_LINEA if modo == "linea" else MAX_PUNTOS_BARRAS
+        escala, fecha_desde, fecha_hasta = Graficos.resolver_periodo(
+            db, periodo, fecha_desde, fecha_hasta, max_puntos if modo == "barras" else None)
+        return escala, fecha_desde, fecha_hasta, max_puntos
+
+    @staticmethod
+    @instrumentar
+    def obtener_datos(db, tipo_grafico, periodo=None, fecha_desde=None, fecha_hasta=None,
+                      max_puntos=None, modo="barras"):
+        """
+        Extrae los datos desde las tablas resumen diarias (ver ResumenCRUD),
+        agregándolos en SQL: se leen O(días) filas, no todos los pedidos.
+        fecha_desde / fecha_hasta: rango (inclusive) de fechas a considerar.
+        "Ventas por Fecha":
+          - modo "barras": con max_puntos (o periodo "Automático") se agrupa por
+            día, semana, mes o año para no pasar de max_puntos barras;
+          - modo "linea": se agrupa según el periodo (Automático = diario) y la serie
+            se reduce a max_puntos con LTTB.
         Retorna: (etiquetas, valores, mensaje_error)
         """
-        etiquetas = []
-        valores = []
-        
+        if tipo_grafico == "Ventas por Fecha":
+            try:
+                periodo, fecha_desde, fecha_hasta, max_puntos = Graficos._resolver_serie(
+                    db, periodo, fecha_desde, fecha_hasta, max_puntos, modo)
+            except Exception as e:
+                print(f"Error en gráficos: {e}")
+                return [], [], f"Error al procesar datos: {str(e)}"
+        return Graficos._datos(db, tipo_grafico, periodo, fecha_desde, fecha_hasta, max_puntos, modo)
+
+    @staticmethod
+    @metricas.cronometrar(LATENCIA_CONSULTA, etiquetas=lambda db, tipo_grafico, *a, **k: {"tipo": tipo_grafico})
+    def _datos(db, tipo_grafico, periodo, fecha_desde, fecha_hasta, max_puntos, modo):
+        """obtener_datos con el periodo y los extremos ya resueltos (ver _resolver_serie)."""
         try:
-            # --- CONSULTA MAESTRA ---
-            # Traemos Pedidos + Menús + Receta + Ingredientes (Todo junto)
-            # Esto soluciona que los gráficos no detecten cambios.
-            pedidos = db.query(Pedido).options(
-                joinedload(Pedido.menus)
-                .joinedload(Menu.ingredientes_receta)
-                .joinedload(MenuIngrediente.ingrediente)
-            ).all()
-
-            if not pedidos:
+            # Verificación rápida de existencia (no carga pedidos)
+            if not db.query(Pedido.id).first():
                 return [], [], "No hay pedidos registrados para graficar."
 
             # --- LÓGICA SEGÚN TIPO ---
-            
+
             if tipo_grafico == "Ventas por Fecha":
-                data_agrupada = {}
-                
-                for p in pedidos:
-                    # Si no tiene fecha, usamos hoy (seguridad)
-                    if not p.fecha: continue
-                        
-                    key = ""
-                    if periodo == "Diario":
-                        key = p.fecha.strftime("%Y-%m-%d")
-                    elif periodo == "Mensual":
-                        key = p.fecha.strftime("%Y-%m")
-                    elif periodo == "Anual":
-                        key = p.fecha.strftime("%Y")
-                    else:
-                        key = p.fecha.strftime("%Y-%m-%d")
-                    
-                    data_agrupada[key] = data_agrupada.get(key, 0) + 1
-
-                # Ordenar cronológicamente
-                for k in sorted(data_agrupada.keys()):
-                    etiquetas.append(k)
-                    valores.append(data_agrupada[k])
+                # Formato de agrupación según periodo (Diario por defecto)
+                clave = Graficos._clave_periodo(db, periodo, VentaDiaria.fecha).label("clave")
+                cantidad = func.sum(VentaDiaria.cantidad_pedidos)
+
+                filas = (
+                    Graficos._filtrar_rango(db.query(clave, cantidad), VentaDiaria.fecha,
+                                            fecha_desde, fecha_hasta)
+                    .group_by(clave)
+                    .having(cantidad > 0)
+                    .order_by(clave)  # Orden cronológico
+                    .all()
+                )
+
+                if not filas:
+                    return [], [], "No hay ventas en el rango seleccionado."
+
+                if modo == "linea" and max_puntos and len(filas) > max_puntos:
+                    xs = [Graficos.fecha_de_clave(f[0]).toordinal() for f in filas]
+                    ys = [f[1] for f in filas]
+                    filas = [filas[i] for i in Graficos.lttb(xs, ys, max_puntos)]
 
             elif tipo_grafico == "Distribución Menús":
-                conteo = Counter()
-                hay_datos = False
-                
-                for p in pedidos:
-                    # p.menus ahora SÍ tiene datos gracias a joinedload
-                    for m in p.menus:
-                        conteo[m.nombre] += 1
-                        hay_datos = True
-                
-                if not hay_datos:
-                    return [], [], "Hay pedidos, pero no tienen menús asociados."
+                # Top 10 más vendidos desde el resumen diario por menú
+                unidades = func.sum(VentaMenuDiaria.unidades).label("unidades")
+                filas = (
+                    Graficos._filtrar_rango(db.query(Menu.nombre, unidades), VentaMenuDiaria.fecha,
+                                            fecha_desde, fecha_hasta)
+                    .join(Menu, Menu.id == VentaMenuDiaria.menu_id)
+                    .group_by(Menu.nombre)
+                    .having(unidades > 0)
+                    .order_by(unidades.desc(), Menu.nombre)
+                    .limit(10)
+                    .all()
+                )
 
-                # Top 10 más vendidos
-                for nombre, cant in conteo.most_common(10):
-                    etiquetas.append(nombre)
-                    valores.append(cant)
+                if not filas:
+                    return [], [], "Hay pedidos, pero no tienen menús asociados."
 
             elif tipo_grafico == "Uso de Ingredientes":
-                conteo = Counter()
-                hay_datos = False
-                
-                for p in pedidos:
-                    for m in p.menus:
-                        # Accedemos a la tabla intermedia (Association Object)
-                        for item_receta in m.ingredientes_receta:
-                            # item_receta.ingrediente es el objeto Ingrediente real
-                            nombre_ing = item_receta.ingrediente.nombre
-                            
-                            # Opción A: Contar frecuencia de uso (1 pedido = 1 voto)
-                            conteo[nombre_ing] += 1
-                            
-                            # Opción B (Más avanzada): Sumar cantidad real usada
-                            # conteo[nombre_ing] += item_receta.cantidad_requerida
-                            
-                            hay_datos = True
-                
-                if not hay_datos:
+                # Frecuencia de uso: 1 menú vendido = 1 voto por ingrediente de su receta
+                usos = func.sum(ConsumoIngredienteDiario.usos).label("usos")
+                filas = (
+                    Graficos._filtrar_rango(db.query(Ingrediente.nombre, usos), ConsumoIngredienteDiario.fecha,
+                                            fecha_desde, fecha_hasta)
+                    .join(Ingrediente, Ingrediente.id == ConsumoIngredienteDiario.ingrediente_id)
+                    .group_by(Ingrediente.nombre)
+                    .having(usos > 0)
+                    .order_by(usos.desc(), Ingrediente.nombre)
+                    .limit(10)
+                    .all()
+                )
+
+                if not filas:
                     return [], [], "Los menús vendidos no tienen ingredientes definidos."
 
-                # Top 10 ingredientes más usados
-                for nombre, cant in conteo.most_common(10):
-                    etiquetas.append(nombre)
-                    valores.append(cant)
+            else:
+                filas = []
 
+            etiquetas = [fila[0] for fila in filas]
+            valores = [fila[1] for fila in filas]
             return etiquetas, valores, None
 
         except Exception as e:
@@ -106,41 +328,315 @@ class Graficos:
             return [], [], f"Error al procesar datos: {str(e)}"
 
     @staticmethod
-    def crear_figura(etiquetas, valores, tipo_grafico):
+    def _clave_cache(tipo_grafico, periodo, fecha_desde, fecha_hasta, max_puntos, modo):
+        # El periodo y el modo solo cambian "Ventas por Fecha": los demás comparten entrada
+        if tipo_grafico != "Ventas por Fecha":
+            periodo, max_puntos, modo = None, None, None
+        return (tipo_grafico, periodo, fecha_desde, fecha_hasta, max_puntos, modo, cache.version)
+
+    @staticmethod
+    def imagen_en_cache(tipo_grafico, periodo, fecha_desde=None, fecha_hasta=None, max_puntos=None,
+                        modo="barras", ancho=600, alto=450):
+        """PNG (base64) ya dibujado para este gráfico y tamaño con los datos actuales, o None."""
+        entrada = cache.obtener(Graficos._clave_cache(tipo_grafico, periodo, fecha_desde, fecha_hasta,
+                                                      max_puntos, modo))
+        if entrada is None or entrada["imagen"] is None:
+            return None
+        ancho_img, alto_img, png = entrada["imagen"]
+        return png if (ancho_img, alto_img) == (ancho, alto) else None
+
+    @staticmethod
+    def serie_en_cache(tipo_grafico, periodo, fecha_desde=None, fecha_hasta=None, max_puntos=None,
+                       modo="barras"):
+        """(etiquetas, valores, escala) ya consultados con los datos actuales, o None."""
+        entrada = cache.obtener(Graficos._clave_cache(tipo_grafico, periodo, fecha_desde, fecha_hasta,
+                                                      max_puntos, modo))
+        return entrada["serie"] if entrada else None
+
+    @staticmethod
+    @instrumentar
+    def obtener_serie(db, tipo_grafico, periodo=None, fecha_desde=None, fecha_hasta=None,
+                      max_puntos=None, modo="barras"):
         """
-        Genera la Figura de Matplotlib.
+        Retorna ((etiquetas, valores, escala), mensaje_error) usando la caché: la serie
+        se consulta una vez por versión de datos. 'escala' es el periodo realmente
+        usado en "Ventas por Fecha" (ej: "Automático" resuelto a "Semanal").
         """
-        # Ajustamos el tamaño para que se vea bien en la app
-        fig = Figure(figsize=(6, 4.5), dpi=100)
-        ax = fig.add_subplot(111)
+        # La versión se toma antes de consultar: si llega un commit a mitad de
+        # camino, el resultado queda con la versión vieja y no se guarda
+        clave = Graficos._clave_cache(tipo_grafico, periodo, fecha_desde, fecha_hasta, max_puntos, modo)
+        entrada = cache.obtener(clave)
+        if entrada is not None and entrada["serie"] is not None:
+            return entrada["serie"], None
 
-        if not etiquetas:
-            return fig 
+        escala = None
+        if tipo_grafico == "Ventas por Fecha":
+            escala, fecha_desde, fecha_hasta, max_puntos = Graficos._resolver_serie(
+                db, periodo, fecha_desde, fecha_hasta, max_puntos, modo)
+            periodo = escala
+
+        etiquetas, valores, error = Graficos._datos(db, tipo_grafico, periodo, fecha_desde,
+                                                    fecha_hasta, max_puntos, modo)
+        if error:
+            return None, error  # Los mensajes no se guardan (errores de BD incluidos)
+        serie = (etiquetas, valores, escala)
+        cache.guardar(clave, serie=serie)
+        return serie, None
+
+    @staticmethod
+    def fecha_de_clave(clave):
+        """Fecha de inicio de una clave de periodo ('2024', '2024-03' o '2024-03-11')."""
+        partes = [int(p) for p in str(clave).split("-")] + [1, 1]
+        return datetime.date(partes[0], partes[1], partes[2])
+
+    @staticmethod
+    def agrupar_fechas(fechas, periodo):
+        """Cantidad de pedidos por clave de periodo (mismo formato que obtener_datos), en Python."""
+        if periodo == "Semanal":
+            return Counter((f - datetime.timedelta(days=f.weekday())).strftime("%Y-%m-%d") for f in fechas)
+        formato = FORMATOS_PERIODO.get(periodo, FORMATOS_PERIODO["Diario"])
+        return Counter(f.strftime(formato) for f in fechas)
+
+    @staticmethod
+    @instrumentar
+    def obtener_imagen(db, tipo_grafico, periodo=None, fecha_desde=None, fecha_hasta=None,
+                       max_puntos=None, modo="barras", ancho=600, alto=450):
+        """
+        Retorna (png_base64, mensaje_error) del gráfico usando la caché (serie e imagen):
+        la imagen se vuelve a dibujar solo si cambiaron los datos o el tamaño pedido.
+        Para usos sin ventana (exportar, servir por HTTP); se puede llamar desde otro hilo.
+        """
+        clave = Graficos._clave_cache(tipo_grafico, periodo, fecha_desde, fecha_hasta, max_puntos, modo)
+        serie, error = Graficos.obtener_serie(db, tipo_grafico, periodo, fecha_desde, fecha_hasta,
+                                              max_puntos, modo)
+        if error:
+            return None, error
+
+        entrada = cache.obtener(clave)
+        if entrada is not None and entrada["imagen"] is not None and entrada["imagen"][:2] == (ancho, alto):
+            return entrada["imagen"][2], None
+
+        with LATENCIA_RENDER.cronometrar(tipo=tipo_grafico):
+            figura = Graficos.crear_figura(serie[0], serie[1], tipo_grafico, ancho, alto, modo)
+            png = Graficos.renderizar_png(figura)
+        cache.guardar(clave, imagen=(ancho, alto, png))
+        return png, None
+
+    @staticmethod
+    def renderizar_png(figura):
+        """Dibuja la figura con Agg (sin Tk, se puede usar desde otro hilo) y retorna el PNG en base64."""
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+        buffer = io.BytesIO()
+        FigureCanvasAgg(figura).print_png(buffer)
+        return base64.b64encode(buffer.getvalue()).decode("ascii")
 
+    @staticmethod
+    def dibujar(ax, etiquetas, valores, tipo_grafico, animado=False, modo="barras"):
+        """
+        Dibuja el gráfico en 'ax' y retorna sus artistas:
+        ("torta", cuñas, textos, porcentajes), ("barras", barras, anotaciones) o ("linea", linea).
+        animado=True deja barras y anotaciones fuera del dibujo normal (para blit).
+        """
         if tipo_grafico == "Distribución Menús":
             # Gráfico de Pastel
-            ax.pie(valores, labels=etiquetas, autopct='%1.1f%%', startangle=90)
+            cunas, textos, porcentajes = ax.pie(valores, labels=etiquetas, autopct='%1.1f%%', startangle=90)
             ax.set_title("Menús Más Vendidos")
-        
-        else:
-            # Gráfico de Barras
-            colores = 'skyblue' if tipo_grafico == "Ventas por Fecha" else 'lightgreen'
-            barras = ax.bar(etiquetas, valores, color=colores)
-            
+            return "torta", cunas, textos, porcentajes
+
+        if modo == "linea" and tipo_grafico == "Ventas por Fecha":
+            # Eje X de fechas reales: matplotlib elige pocas marcas legibles
+            fechas = [Graficos.fecha_de_clave(e) for e in etiquetas]
+            linea, = ax.plot(fechas, valores, color='steelblue', linewidth=1.2)
             ax.set_title(tipo_grafico)
             ax.set_ylabel("Frecuencia / Cantidad")
-            
-            # Rotar etiquetas para que no se superpongan
+            ax.set_ylim(0, max(valores) * 1.15 if valores else 1)
             ax.tick_params(axis='x', rotation=45, labelsize=9)
-            
-            # Etiquetas de valor sobre las barras
-            for bar in barras:
-                height = bar.get_height()
-                ax.annotate(f'{int(height)}',
-                            xy=(bar.get_x() + bar.get_width() / 2, height),
-                            xytext=(0, 3), 
-                            textcoords="offset points",
-                            ha='center', va='bottom')
-        
-        fig.tight_layout() 
-        return fig
\ No newline at end of file
+            return "linea", linea
+
+        # Gráfico de Barras
+        colores = 'skyblue' if tipo_grafico == "Ventas por Fecha" else 'lightgreen'
+        barras = ax.bar(etiquetas, valores, color=colores, animated=animado)
+
+        ax.set_title(tipo_grafico)
+        ax.set_ylabel("Frecuencia / Cantidad")
+        # Límite fijo con margen: mientras los valores quepan, actualizarlos no mueve los ejes
+        ax.set_ylim(0, max(valores) * 1.15 if valores else 1)
+
+        # Rotar etiquetas para que no se superpongan; con muchas barras se muestra una de cada 'paso'
+        ax.tick_params(axis='x', rotation=45, labelsize=9)
+        if len(etiquetas) > MAX_MARCAS:
+            paso = math.ceil(len(etiquetas) / MAX_MARCAS)
+            ax.set_xticks(range(0, len(etiquetas), paso), etiquetas[::paso])
+
+        # Etiquetas de valor sobre las barras (solo si hay espacio para leerlas)
+        anotaciones = []
+        for bar in (barras if len(barras) <= MAX_ANOTACIONES else []):
+            height = bar.get_height()
+            anotaciones.append(ax.annotate(f'{int(height)}',
+                                           xy=(bar.get_x() + bar.get_width() / 2, height),
+                                           xytext=(0, 3),
+                                           textcoords="offset points",
+                                           ha='center', va='bottom', animated=animado))
+        return "barras", barras, anotaciones
+
+    @staticmethod
+    def crear_figura(etiquetas, valores, tipo_grafico, ancho=600, alto=450, modo="barras"):
+        """
+        Genera la Figura de Matplotlib (ancho x alto en píxeles).
+        """
+        # matplotlib se importa recién al dibujar el primer gráfico (pesa ~0.5 s al arrancar)
+        from matplotlib.figure import Figure
+
+        fig = Figure(figsize=(ancho / 100, alto / 100), dpi=100)
+        ax = fig.add_subplot(111)
+
+        if not etiquetas:
+            return fig
+
+        Graficos.dibujar(ax, etiquetas, valores, tipo_grafico, modo=modo)
+        fig.tight_layout()
+        return fig
+
+
+class GraficoPersistente:
+    """
+    Gráfico embebido en Tk con una sola Figure y un solo FigureCanvasTkAgg para toda
+    la sesión (antes se creaban y destruían en cada clic).
+    - Mismas etiquetas: se actualizan en su lugar alturas de barras y anotaciones
+      (con blit si caben en el eje Y) o ángulos y porcentajes de la torta.
+    - Etiquetas distintas: se limpia y reutiliza el mismo Axes.
+    - Modo línea: la serie (ya reducida con LTTB) se reemplaza en la misma línea.
+    - agregar_ventas(): modo en vivo de "Ventas por Fecha" en barras, suma ventas nuevas.
+    Las barras y anotaciones son 'animated': el dibujo completo guarda el fondo sin
+    ellas y cada actualización solo repinta esos artistas sobre el fondo.
+    """
+
+    def __init__(self, master):
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+
+        self.figura = Figure(figsize=(6, 4.5), dpi=100)
+        self.ax = self.figura.add_subplot(111)
+        self.canvas = FigureCanvasTkAgg(self.figura, master=master)
+        self.canvas.get_tk_widget().pack(expand=True, fill="both")
+        self.canvas.mpl_connect("draw_event", self._al_dibujar)
+
+        self.tipo = None
+        self.periodo = None
+        self.modo = "barras"
+        self.etiquetas = []
+        self.valores = []
+        self._artistas = None
+        self._fondo = None
+
+    # --- API ---
+
+    def mostrar(self, etiquetas, valores, tipo_grafico, periodo=None, modo="barras"):
+        etiquetas, valores = list(etiquetas), list(valores)
+        mismas = (tipo_grafico, modo) == (self.tipo, self.modo) and etiquetas == self.etiquetas \
+            and self._artistas
+        self.tipo, self.periodo, self.modo = tipo_grafico, periodo, modo
+        self.etiquetas, self.valores = etiquetas, valores
+
+        if not etiquetas:
+            self.limpiar()
+        elif not mismas:
+            self._rehacer()
+        elif self._artistas[0] == "linea":
+            self._artistas[1].set_ydata(valores)
+            self.ax.set_ylim(0, max(valores) * 1.15)
+            self.canvas.draw_idle()
+        elif self._artistas[0] == "torta":
+            self._actualizar_torta()
+            self.canvas.draw_idle()
+        else:
+            self._actualizar_barras()
+
+    def agregar_ventas(self, por_clave):
+        """
+        Modo en vivo: suma {clave_periodo: cantidad} a "Ventas por Fecha".
+        Si solo crecen barras existentes se repintan con blit; una clave nueva
+        (ej: primer pedido de un día) rehace el gráfico en el mismo Axes.
+        """
+        if self.tipo != "Ventas por Fecha" or self.modo != "barras" or not por_clave:
+            return
+        nuevas = [c for c in por_clave if c not in self.etiquetas]
+        if nuevas:
+            totales = dict(zip(self.etiquetas, self.valores))
+            for clave, cantidad in por_clave.items():
+                totales[clave] = totales.get(clave, 0) + cantidad
+            etiquetas = sorted(totales)
+            self.mostrar(etiquetas, [totales[e] for e in etiquetas], self.tipo, self.periodo, self.modo)
+            return
+
+        for clave, cantidad in por_clave.items():
+            self.valores[self.etiquetas.index(clave)] += cantidad
+        self._actualizar_barras()
+
+    def limpiar(self):
+        self.ax.cla()
+        self.etiquetas, self.valores = [], []
+        self._artistas = None
+        self.canvas.draw_idle()
+
+    # --- Internos ---
+
+    def _rehacer(self):
+        self.ax.cla()
+        self._artistas = Graficos.dibujar(self.ax, self.etiquetas, self.valores, self.tipo,
+                                          animado=True, modo=self.modo)
+        self.figura.tight_layout()
+        self.canvas.draw_idle()
+
+    def _actualizar_barras(self):
+        _, barras, anotaciones = self._artistas
+        for bar, valor in zip(barras, self.valores):
+            bar.set_height(valor)
+        for bar, anotacion, valor in zip(barras, anotaciones, self.valores):
+            anotacion.set_text(f'{int(valor)}')
+            anotacion.xy = (bar.get_x() + bar.get_width() / 2, valor)
+
+        if max(self.valores) > self.ax.get_ylim()[1] / 1.05:
+            # Ya no caben con margen: cambia el eje Y y hay que redibujar todo
+            self.ax.set_ylim(0, max(self.valores) * 1.15)
+            self.canvas.draw_idle()
+        else:
+            self._blit()
+
+    def _actualizar_torta(self):
+        _, cunas, textos, porcentajes = self._artistas
+        total = sum(self.valores)
+        angulo = 90
+        for cuna, texto, porcentaje, valor in zip(cunas, textos, porcentajes, self.valores):
+            delta = 360 * valor / total
+            cuna.set_theta1(angulo)
+            cuna.set_theta2(angulo + delta)
+            medio = math.radians(angulo + delta / 2)
+            x, y = math.cos(medio), math.sin(medio)
+            # Mismas distancias que ax.pie (labeldistance=1.1, pctdistance=0.6)
+            texto.set_position((1.1 * x, 1.1 * y))
+            texto.set_horizontalalignment('left' if x > 0 else 'right')
+            porcentaje.set_position((0.6 * x, 0.6 * y))
+            porcentaje.set_text(f"{100 * valor / total:.1f}%")
+            angulo += delta
+
+    def _animados(self):
+        if not self._artistas or self._artistas[0] != "barras":
+            return []
+        return list(self._artistas[1]) + self._artistas[2]
+
+    def _al_dibujar(self, evento):
+        # Tras cada dibujo completo (incluye redimensionar): guardar el fondo y pintar encima
+        self._fondo = self.canvas.copy_from_bbox(self.figura.bbox)
+        for artista in self._animados():
+            self.ax.draw_artist(artista)
+
+    def _blit(self):
+        if self._fondo is None:
+            self.canvas.draw_idle()
+            return
+        self.canvas.restore_region(self._fondo)
+        for artista in self._animados():
+            self.ax.draw_artist(artista)
+        self.canvas.blit(self.figura.bbox)
@@ -0,0 +1,317 @@
+# Instrumentación de SQL: cuántas sentencias, cuánto tiempo y cuántas filas
+# usa cada operación lógica (método CRUD, handler de la App, bloque 'with').
+#
+# Se activa con RESTAURANTE_INSTRUMENTAR=1 (reporte por consola al salir) o
+# RESTAURANTE_INSTRUMENTAR=estricto (además, superar un presupuesto lanza
+# PresupuestoExcedido). También con activar() desde código o pruebas.
+# Desactivada, los métodos decorados solo pagan una comparación por llamada.
+#
+#   with operacion("importar_menu", presupuesto=20): ...
+#   @instrumentar(presupuesto=5)           # funciones / handlers
+#   @instrumentar_clase                    # todos los @staticmethod de una clase CRUD
+#   with presupuesto_consultas(3): ...     # en pruebas: falla si se pasan 3 sentencias
+#
+# N+1: si dentro de una operación la misma sentencia (mismo SQL, distintos
+# parámetros) se ejecuta UMBRAL_N_MAS_1 veces o más, se marca con el archivo:línea
+# que la disparó (típico de una relación lazy recorrida en un for).
+import os
+import sys
+import time
+import atexit
+import functools
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+MODO = os.environ.get("RESTAURANTE_INSTRUMENTAR", "").strip().lower()
+UMBRAL_N_MAS_1 = int(os.environ.get("RESTAURANTE_UMBRAL_N_MAS_1", "5"))
+FUERA_DE_OPERACION = "(fuera de operación)"
+
+_activo = False
+_estricto = False
+_pila = ContextVar("operaciones_sql", default=())  # operaciones abiertas en este hilo/contexto
+_lock = threading.Lock()
+_acumulado = {}  # nombre -> Estadistica
+
+
+class PresupuestoExcedido(AssertionError):
+    """Una operación ejecutó más sentencias SQL que su presupuesto."""
+
+
+class Operacion:
+    """Medición de una ejecución de una operación lógica."""
+
+    def __init__(self, nombre, presupuesto=None):
+        self.nombre = nombre
+        self.presupuesto = presupuesto
+        self.sentencias = 0
+        self.segundos_sql = 0.0
+        self.filas = 0
+        self.repeticiones = {}    # sql -> veces
+        self.n_mas_1 = {}         # sql -> origen (archivo:línea)
+
+    def registrar(self, sql, segundos, filas):
+        self.sentencias += 1
+        self.segundos_sql += segundos
+        self.filas += filas
+        veces = self.repeticiones.get(sql, 0) + 1
+        self.repeticiones[sql] = veces
+        if veces == UMBRAL_N_MAS_1 and sql.lstrip()[:6].upper() == "SELECT":
+            self.n_mas_1[sql] = _origen()
+
+    def excedida(self):
+        return self.presupuesto is not None and self.sentencias > self.presupuesto
+
+
+class Estadistica:
+    """Acumulado de todas las ejecuciones de una operación."""
+
+    def __init__(self):
+        self.llamadas = 0
+        self.sentencias = 0
+        self.max_sentencias = 0
+        self.segundos_sql = 0.0
+        self.segundos_total = 0.0
+        self.filas = 0
+        self.excedidas = 0
+        self.n_mas_1 = {}  # sql -> (origen, máximo de repeticiones en una llamada)
+
+    def sumar(self, op, segundos_total):
+        self.llamadas += 1
+        self.sentencias += op.sentencias
+        self.max_sentencias = max(self.max_sentencias, op.sentencias)
+        self.segundos_sql += op.segundos_sql
+        self.segundos_total += segundos_total
+        self.filas += op.filas
+        self.excedidas += op.excedida()
+        for sql, origen in op.n_mas_1.items():
+            anterior = self.n_mas_1.get(sql, (origen, 0))[1]
+            self.n_mas_1[sql] = (origen, max(anterior, op.repeticiones[sql]))
+
+
+def _origen():
+    """Primer frame del proyecto (fuera de SQLAlchemy y de este módulo) en la pila actual."""
+    frame = sys._getframe(2)
+    while frame is not None:
+        archivo = frame.f_code.co_filename
+        if not ("sqlalchemy" in archivo or archivo == __file__ or archivo.endswith("contextlib.py")):
+            return f"{os.path.basename(archivo)}:{frame.f_lineno} ({frame.f_code.co_name})"
+        frame = frame.f_back
+    return "desconocido"
+
+
+# --- Eventos de SQLAlchemy (solo registrados mientras está activa) ---
+
+def _antes(conn, cursor, sql, parametros, contexto, executemany):
+    # En el contexto de ejecución: si la sentencia falla, se descarta con él
+    if contexto is not None:
+        contexto._instrumentacion_inicio = time.perf_counter()
+    else:
+        conn.info["instrumentacion_inicio"] = time.perf_counter()
+
+
+def _despues(conn, cursor, sql, parametros, contexto, executemany):
+    if contexto is not None:
+        inicio = contexto._instrumentacion_inicio
+    else:
+        inicio = conn.info.pop("instrumentacion_inicio")
+    segundos = time.perf_counter() - inicio
+    # Filas afectadas de INSERT/UPDATE/DELETE; las de SELECT las suma _contar_filas
+    filas = cursor.rowcount if cursor.rowcount is not None and cursor.rowcount > 0 else 0
+    pila = _pila.get()
+    if pila:
+        for op in pila:
+            op.registrar(sql, segundos, filas)
+    else:
+        with _lock:
+            est = _acumulado.setdefault(FUERA_DE_OPERACION, Estadistica())
+            est.sentencias += 1
+            est.max_sentencias = max(est.max_sentencias, 1)
+            est.segundos_sql += segundos
+            est.filas += filas
+
+
+def _contar_filas(estado):
+    """
+    SELECT del ORM dentro de una operación: se ejecuta aquí y se congela el
+    resultado para contar las filas devueltas. No se toca lo que se lee por
+    tramos (yield_per / stream_results): congelarlo lo cargaría entero en memoria.
+    """
+    pila = _pila.get()
+    opciones = estado.execution_options
+    if not pila or not estado.is_select or opciones.get("yield_per") or opciones.get("stream_results"):
+        return None
+    congelado = estado.invoke_statement().freeze()
+    filas = len(congelado.data)
+    for op in pila:
+        op.filas += filas
+    return congelado()
+
+
+def activar(estricto=False):
+    """Registra los eventos. estricto=True: superar un presupuesto lanza PresupuestoExcedido."""
+    global _activo, _estricto
+    _estricto = estricto
+    if not _activo:
+        event.listen(Engine, "before_cursor_execute", _antes)
+        event.listen(Engine, "after_cursor_execute", _despues)
+        event.listen(Session, "do_orm_execute", _contar_filas)
+        _activo = True
+
+
+def desactivar():
+    global _activo
+    if _activo:
+        event.remove(Engine, "before_cursor_execute", _antes)
+        event.remove(Engine, "after_cursor_execute", _despues)
+        event.remove(Session, "do_orm_execute", _contar_filas)
+        _activo = False
+
+
+def activa():
+    return _activo
+
+
+# --- Operaciones ---
+
+@contextmanager
+def operacion(nombre, presupuesto=None):
+    """
+    Cuenta las sentencias del bloque bajo 'nombre'. Las operaciones anidadas
+    también suman en la de afuera. Con la instrumentación apagada no hace nada.
+    """
+    if not _activo:
+        yield None
+        return
+    op = Operacion(nombre, presupuesto)
+    token = _pila.set(_pila.get() + (op,))
+    inicio = time.perf_counter()
+    try:
+        yield op
+    finally:
+        _pila.reset(token)
+        segundos = time.perf_counter() - inicio
+        with _lock:
+            _acumulado.setdefault(nombre, Estadistica()).sumar(op, segundos)
+        for sql, origen in op.n_mas_1.items():
+            print(f"Posible N+1 en {nombre}: {op.repeticiones[sql]} veces la misma consulta "
+                  f"desde {origen}: {_resumir_sql(sql)}")
+    if op.excedida():
+        mensaje = (f"{nombre} ejecutó {op.sentencias} sentencias SQL "
+                   f"(presupuesto: {op.presupuesto})")
+        if _estricto:
+            raise PresupuestoExcedido(mensaje)
+        print(f"Advertencia: {mensaje}")
+
+
+def instrumentar(funcion=None, *, nombre=None, presupuesto=None):
+    """Decorador: cada llamada es una operación ('Clase.metodo' por defecto)."""
+    if funcion is None:
+        return lambda f: instrumentar(f, nombre=nombre, presupuesto=presupuesto)
+
+    etiqueta = nombre or funcion.__qualname__
+
+    @functools.wraps(funcion)
+    def envoltura(*args, **kwargs):
+        if not _activo:
+            return funcion(*args, **kwargs)
+        with operacion(etiqueta, presupuesto):
+            return funcion(*args, **kwargs)
+
+    return envoltura
+
+
+def instrumentar_clase(cls=None, *, presupuestos=None):
+    """
+    Decorador de clase: instrumenta todos sus @staticmethod públicos.
+    presupuestos: {nombre_metodo: máximo de sentencias}.
+    Los generadores (lecturas por tramos) quedan sin envolver: su trabajo
+    ocurre después de retornar, fuera del alcance de la operación.
+    """
+    if cls is None:
+        return lambda c: instrumentar_clase(c, presupuestos=presupuestos)
+    presupuestos = presupuestos or {}
+    for nombre_metodo, valor in list(vars(cls).items()):
+        if not isinstance(valor, staticmethod) or nombre_metodo.startswith("_"):
+            continue
+        funcion = valor.__func__
+        if funcion.__code__.co_flags & 0x20:  # CO_GENERATOR
+            continue
+        setattr(cls, nombre_metodo, staticmethod(
+            instrumentar(funcion, presupuesto=presupuestos.get(nombre_metodo))))
+    return cls
+
+
+@contextmanager
+def presupuesto_consultas(maximo, nombre="bloque"):
+    """
+    Para pruebas: activa la instrumentación durante el bloque y lanza
+    PresupuestoExcedido si se ejecutan más de 'maximo' sentencias.
+    Retorna la Operacion (op.sentencias, op.repeticiones, op.n_mas_1).
+    """
+    estaba_activa, era_estricto = _activo, _estricto
+    activar(estricto=True)
+    try:
+        with operacion(nombre, maximo) as op:
+            yield op
+    finally:
+        if estaba_activa:
+            activar(era_estricto)
+        else:
+            desactivar()
+
+
+# --- Reporte ---
+
+def _resumir_sql(sql, largo=100):
+    linea = " ".join(sql.split())
+    return linea if len(linea) <= largo else linea[:largo - 3] + "..."
+
+
+def estadisticas():
+    """{nombre: dict con llamadas, sentencias, max_sentencias, ms_sql, ms_total, filas, excedidas, n_mas_1}."""
+    with _lock:
+        return {nombre: {
+            "llamadas": e.llamadas,
+            "sentencias": e.sentencias,
+            "max_sentencias": e.max_sentencias,
+            "ms_sql": round(e.segundos_sql * 1000, 2),
+            "ms_total": round(e.segundos_total * 1000, 2),
+            "filas": e.filas,
+            "excedidas": e.excedidas,
+            "n_mas_1": {sql: {"origen": o, "repeticiones": r} for sql, (o, r) in e.n_mas_1.items()},
+        } for nombre, e in _acumulado.items()}
+
+
+def reiniciar():
+    with _lock:
+        _acumulado.clear()
+
+
+def reporte():
+    """Texto por operación, de la que más sentencias ejecutó a la que menos (omite las que no usaron la BD)."""
+    datos = sorted(filter(lambda par: par[1]["sentencias"], estadisticas().items()),
+                   key=lambda par: -par[1]["sentencias"])
+    lineas = ["Consultas SQL por operación:",
+              f"  {'operación':<45} {'llamadas':>8} {'sent.':>7} {'máx':>5} {'ms SQL':>9} "
+              f"{'ms total':>9} {'filas':>9}"]
+    for nombre, d in datos:
+        lineas.append(f"  {nombre:<45} {d['llamadas']:>8} {d['sentencias']:>7} {d['max_sentencias']:>5} "
+                      f"{d['ms_sql']:>9.1f} {d['ms_total']:>9.1f} {d['filas']:>9}"
+                      + (f"  ({d['excedidas']} sobre presupuesto)" if d["excedidas"] else ""))
+        for sql, n in d["n_mas_1"].items():
+            lineas.append(f"      N+1 x{n['repeticiones']} en {n['origen']}: {_resumir_sql(sql)}")
+    return "\n".join(lineas)
+
+
+def imprimir_reporte():
+    if _acumulado:
+        print(reporte())
+
+
+if MODO not in ("", "0"):
+    activar(estricto=MODO == "estricto")
+    atexit.register(imprimir_reporte)
@@ -0,0 +1,310 @@
+# Lista virtual sobre ttk.Treeview para tablas grandes.
+# El Treeview solo contiene las filas visibles; el scrollbar representa el total
+# de filas y cada desplazamiento pide a la BD únicamente la ventana necesaria.
+# Las lecturas corren en el TrabajadorBD: mientras llega una página, la tabla
+# mantiene lo que mostraba y se redibuja al recibirla.
+from collections import OrderedDict
+import customtkinter as ctk
+from tkinter import ttk
+
+
+class ListaVirtual(ctk.CTkFrame):
+    """
+    columnas: [(clave, titulo, ancho), ...] en el mismo orden que las filas.
+    trabajador: TrabajadorBD que ejecuta las lecturas (cada una con su sesión)
+    obtener_pagina(db, offset, limite, orden, descendente, despues_de) -> (filas, cursor)
+        (ej: ClienteCRUD.leer_clientes_pagina)
+    contar(db) -> total de filas
+    indice_clave: posición de la columna única de cada fila (para mantener la selección al desplazar)
+    ordenables: claves de columnas que se pueden ordenar (por defecto todas)
+    formatear(fila) -> valores a mostrar (ej: precio con signo $)
+    obtener_filas(db, claves) -> filas actuales de esas claves (para aplicar_cambios sin recargar)
+    Las páginas leídas se guardan en una caché LRU; al ordenar por una columna
+    (clic en el encabezado) el orden se resuelve en SQL y la caché se vacía.
+    """
+
+    def __init__(self, master, columnas, trabajador, obtener_pagina, contar, orden=None, indice_clave=0,
+                 ordenables=None, formatear=None, obtener_filas=None,
+                 tamano_pagina=100, paginas_en_cache=8, **kwargs):
+        super().__init__(master, fg_color="transparent", **kwargs)
+        self.columnas = columnas
+        self.trabajador = trabajador
+        self.obtener_pagina = obtener_pagina
+        self.contar = contar
+        self.orden = orden or columnas[0][0]
+        self.indice_clave = indice_clave
+        self.formatear = formatear or tuple
+        self.obtener_filas = obtener_filas
+        self.descendente = False
+        self.tamano_pagina = tamano_pagina
+        self.paginas_en_cache = paginas_en_cache
+
+        self.total = 0
+        self.offset = 0            # índice de la primera fila visible
+        self.filas_visibles = 20
+        self._paginas = OrderedDict()  # numero_pagina -> (filas, cursor)
+        self._pedidas = set()      # páginas en camino
+        # Sube al vaciar la caché (recargar, ordenar): lo que llegue de antes se descarta
+        self._version = 0
+        self._clave = f"lista-{id(self)}"
+        self._seleccion = None     # clave (str) de la fila seleccionada
+        self._prefetch = None
+
+        claves = [c[0] for c in columnas]
+        ordenables = set(claves if ordenables is None else ordenables)
+        self.tree = ttk.Treeview(self, columns=claves, show="headings", selectmode="browse")
+        for clave, titulo, ancho in columnas:
+            if clave in ordenables:
+                self.tree.heading(clave, command=lambda c=clave: self.ordenar_por(c))
+            if ancho:
+                self.tree.column(clave, width=ancho)
+
+        self.scroll = ttk.Scrollbar(self, orient="vertical", command=self._al_scroll)
+        self.scroll.pack(side="right", fill="y")
+        self.tree.pack(side="left", expand=True, fill="both")
+
+        self.tree.bind("<Configure>", self._al_redimensionar)
+        self.tree.bind("<MouseWheel>", self._al_rueda)
+        self.tree.bind("<Button-4>", lambda e: self.desplazar(-3))
+        self.tree.bind("<Button-5>", lambda e: self.desplazar(3))
+        self.tree.bind("<Up>", lambda e: self._mover_seleccion(-1))
+        self.tree.bind("<Down>", lambda e: self._mover_seleccion(1))
+        self.tree.bind("<Prior>", lambda e: self.desplazar(-self.filas_visibles) or "break")
+        self.tree.bind("<Next>", lambda e: self.desplazar(self.filas_visibles) or "break")
+        self.tree.bind("<<TreeviewSelect>>", self._al_seleccionar)
+
+        self._actualizar_encabezados()
+
+    # --- API ---
+
+    def recargar(self):
+        """Vuelve a contar y descarta la caché (tras crear/borrar registros o cambiar filtros)."""
+        self._vaciar_cache()
+        version = self._version
+        self.trabajador.enviar(self.contar, clave=f"{self._clave}-contar",
+                               al_terminar=lambda total: self._al_contar(version, total))
+        self._dibujar()  # la ventana actual se pide en paralelo con el conteo
+
+    def _al_contar(self, version, total):
+        if version != self._version:
+            return
+        self.total = total
+        self.offset = max(0, min(self.offset, self.total - self.filas_visibles))
+        self._dibujar()
+
+    def aplicar_cambios(self, cambios):
+        """
+        Aplica un resumen de cambios (ver eventos.resumir) tocando lo mínimo:
+        - actualizados: se releen solo esas filas y se reemplazan en la caché y en pantalla
+          (la fila queda en su lugar aunque cambie la columna de orden, hasta la próxima recarga)
+        - insertados/borrados: cambian las posiciones, así que se recuenta y se vuelve a
+          leer solo la ventana visible
+        """
+        if cambios["recargar"] or cambios["insertado"] or cambios["borrado"]:
+            self.recargar()
+            return
+        if not cambios["actualizado"]:
+            return
+        if self.obtener_filas is None:
+            self.recargar()
+            return
+
+        # Solo interesan las filas que ya se leyeron; las demás llegarán frescas al desplazarse
+        actualizados = {str(c) for c in cambios["actualizado"]}
+        en_cache = [fila[self.indice_clave]
+                    for filas, _ in self._paginas.values() for fila in filas
+                    if str(fila[self.indice_clave]) in actualizados]
+        if not en_cache:
+            return
+
+        version = self._version
+        self.trabajador.enviar(self.obtener_filas, en_cache, lectura=True,
+                               al_terminar=lambda filas: self._al_llegar_filas(version, filas))
+
+    def _al_llegar_filas(self, version, filas_nuevas):
+        if version != self._version:
+            return  # la caché se vació mientras tanto: lo visible ya se lee fresco
+        nuevas = {str(f[self.indice_clave]): f for f in filas_nuevas}
+        for numero, (filas, cursor) in list(self._paginas.items()):
+            for i, fila in enumerate(filas):
+                nueva = nuevas.get(str(fila[self.indice_clave]))
+                if nueva is not None:
+                    filas[i] = nueva
+                    if i == len(filas) - 1:
+                        cursor = None  # su valor de orden pudo cambiar: la página siguiente usará OFFSET
+            self._paginas[numero] = (filas, cursor)
+
+        for iid in self.tree.get_children():
+            clave = str(self.tree.item(iid)["values"][self.indice_clave])
+            if clave in nuevas:
+                self.tree.item(iid, values=self.formatear(nuevas[clave]))
+
+    def valores_seleccionados(self):
+        """Valores de la fila seleccionada (como tree.item(sel)['values']), o None."""
+        sel = self.tree.selection()
+        if not sel:
+            return None
+        return self.tree.item(sel[0])["values"]
+
+    def ordenar_por(self, clave):
+        # Segundo clic en la misma columna invierte el orden
+        if clave == self.orden:
+            self.descendente = not self.descendente
+        else:
+            self.orden, self.descendente = clave, False
+        self._actualizar_encabezados()
+        self._vaciar_cache()
+        self.offset = 0
+        self._dibujar()
+
+    def desplazar(self, filas):
+        nuevo = max(0, min(self.offset + filas, self.total - self.filas_visibles))
+        if nuevo != self.offset:
+            self.offset = nuevo
+            self._dibujar()
+
+    # --- Páginas ---
+
+    def _vaciar_cache(self):
+        self._version += 1
+        self._paginas.clear()
+        self._pedidas.clear()
+
+    def _pedir_pagina(self, numero):
+        if numero in self._pedidas:
+            return
+        self._pedidas.add(numero)
+
+        # Si la página anterior está en caché, se continúa desde su cursor (keyset);
+        # si no (salto con el scrollbar), se usa OFFSET
+        anterior = self._paginas.get(numero - 1)
+        despues_de = anterior[1] if anterior else None
+
+        version = self._version
+        self.trabajador.enviar(
+            self.obtener_pagina, numero * self.tamano_pagina, self.tamano_pagina,
+            self.orden, self.descendente, despues_de,
+            clave=f"{self._clave}-pagina-{numero}",
+            al_terminar=lambda resultado: self._al_llegar_pagina(version, numero, resultado),
+            al_fallar=lambda e: self._al_fallar_pagina(version, numero, e))
+
+    def _al_llegar_pagina(self, version, numero, resultado):
+        if version != self._version:
+            return
+        self._pedidas.discard(numero)
+        self._paginas[numero] = resultado
+        while len(self._paginas) > self.paginas_en_cache:
+            self._paginas.popitem(last=False)
+        if numero in self._paginas_visibles():
+            self._dibujar()
+
+    def _al_fallar_pagina(self, version, numero, error):
+        print(f"Error leyendo la página {numero} de la lista: {error}")
+        if version == self._version:
+            self._pedidas.discard(numero)  # se vuelve a pedir al próximo desplazamiento
+
+    def _paginas_visibles(self):
+        fin = max(self.offset, min(self.offset + self.filas_visibles, self.total) - 1)
+        return range(self.offset // self.tamano_pagina, fin // self.tamano_pagina + 1)
+
+    def _filas(self, desde, cantidad):
+        """Filas de la ventana y las páginas que faltan para completarla (ya pedidas)."""
+        filas = []
+        faltantes = []
+        indice = desde
+        fin = min(desde + cantidad, self.total)
+        while indice < fin:
+            numero, inicio = divmod(indice, self.tamano_pagina)
+            if numero not in self._paginas:
+                faltantes.append(numero)
+                self._pedir_pagina(numero)
+                indice = (numero + 1) * self.tamano_pagina
+                continue
+            self._paginas.move_to_end(numero)
+            pagina = self._paginas[numero][0]
+            if inicio >= len(pagina):
+                break  # la tabla se achicó desde el último conteo
+            tomar = pagina[inicio:inicio + (fin - indice)]
+            filas.extend(tomar)
+            indice += len(tomar)
+        return filas, faltantes
+
+    def _precargar_vecina(self):
+        # Deja lista la página siguiente a la visible para que el scroll no espere a la BD
+        self._prefetch = None
+        siguiente = (self.offset + self.filas_visibles) // self.tamano_pagina + 1
+        if siguiente * self.tamano_pagina < self.total and siguiente not in self._paginas:
+            self._pedir_pagina(siguiente)
+
+    # --- Dibujo ---
+
+    def _dibujar(self):
+        filas, faltantes = self._filas(self.offset, self.filas_visibles)
+
+        if self.total:
+            self.scroll.set(self.offset / self.total,
+                            min(1.0, (self.offset + self.filas_visibles) / self.total))
+        else:
+            self.scroll.set(0.0, 1.0)
+        if faltantes:
+            return  # se redibuja cuando lleguen las páginas pedidas
+
+        self.tree.delete(*self.tree.get_children())
+        for i, fila in enumerate(filas):
+            iid = str(self.offset + i)
+            self.tree.insert("", "end", iid=iid, values=self.formatear(fila))
+            if self._seleccion is not None and str(fila[self.indice_clave]) == self._seleccion:
+                self.tree.selection_set(iid)
+
+        if self._prefetch is None:
+            self._prefetch = self.after_idle(self._precargar_vecina)
+
+    def _actualizar_encabezados(self):
+        for clave, titulo, _ in self.columnas:
+            marca = (" ▼" if self.descendente else " ▲") if clave == self.orden else ""
+            self.tree.heading(clave, text=titulo + marca)
+
+    # --- Eventos ---
+
+    def _al_scroll(self, accion, cantidad, unidad=None):
+        if accion == "moveto":
+            destino = int(float(cantidad) * self.total)
+            self.desplazar(destino - self.offset)
+        elif accion == "scroll":
+            paso = self.filas_visibles if unidad == "pages" else 1
+            self.desplazar(int(cantidad) * paso)
+
+    def _al_rueda(self, evento):
+        # Windows/macOS: delta en múltiplos de 120 (o 1 en macOS)
+        pasos = -1 if evento.delta > 0 else 1
+        self.desplazar(pasos * 3)
+
+    def _al_redimensionar(self, evento):
+        alto_fila = int(ttk.Style().lookup("Treeview", "rowheight") or 20)
+        visibles = max(1, (evento.height - 25) // alto_fila)
+        if visibles != self.filas_visibles:
+            self.filas_visibles = visibles
+            self.offset = max(0, min(self.offset, self.total - self.filas_visibles))
+            self._dibujar()
+
+    def _al_seleccionar(self, evento):
+        valores = self.valores_seleccionados()
+        if valores:
+            self._seleccion = str(valores[self.indice_clave])
+
+    def _mover_seleccion(self, paso):
+        # En los bordes de la ventana, la flecha desplaza la lista en vez de perder la selección
+        sel = self.tree.selection()
+        if not sel:
+            return None
+        indice = int(sel[0]) + paso
+        if not 0 <= indice < self.total:
+            return "break"
+        if indice < self.offset:
+            self.desplazar(indice - self.offset)
+        elif indice >= self.offset + self.filas_visibles:
+            self.desplazar(indice - self.offset - self.filas_visibles + 1)
+        if self.tree.exists(str(indice)):
+            self.tree.selection_set(str(indice))
+            self.tree.see(str(indice))
+        return "break"
@@ -0,0 +1,344 @@
+# Métricas de producción: contadores, medidores e histogramas en memoria.
+# Se exportan en formato texto de Prometheus por HTTP local (GET /metrics) y/o
+# como un resumen impreso cada N segundos (con p50/p99 estimados de los histogramas).
+#
+# Se activan por variables de entorno:
+#   RESTAURANTE_METRICAS_PUERTO=9108   servidor en 127.0.0.1:9108/metrics
+#   RESTAURANTE_METRICAS_LOG=60        resumen por consola cada 60 s
+# Con ambas vacías, observar()/inc() retornan apenas entran: no toman locks ni
+# miden tiempos. El servidor y el hilo del resumen los arranca iniciar_desde_entorno()
+# (la App al abrir), no el import: los procesos de boletas importan este módulo.
+import os
+import time
+import bisect
+import functools
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PUERTO = os.environ.get("RESTAURANTE_METRICAS_PUERTO", "").strip()
+INTERVALO_LOG = os.environ.get("RESTAURANTE_METRICAS_LOG", "").strip()
+
+# Límites (segundos) por defecto para latencias de operaciones interactivas
+LIMITES_LATENCIA = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_activo = bool(PUERTO or INTERVALO_LOG)
+
+
+def activar():
+    global _activo
+    _activo = True
+
+
+def desactivar():
+    global _activo
+    _activo = False
+
+
+def activas():
+    return _activo
+
+
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _texto_etiquetas(nombres, valores, extra=()):
+    pares = list(zip(nombres, valores)) + list(extra)
+    if not pares:
+        return ""
+    return "{" + ",".join(f'{n}="{_escapar(v)}"' for n, v in pares) + "}"
+
+
+def _numero(valor):
+    if valor == float("inf"):
+        return "+Inf"
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class _Metrica:
+    tipo = None
+
+    def __init__(self, nombre, ayuda, etiquetas=()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self._valores = {}  # tupla de valores de etiquetas -> dato
+        self._lock = threading.Lock()
+
+    def _clave(self, etiquetas):
+        return tuple(str(etiquetas.get(n, "")) for n in self.etiquetas)
+
+    def _encabezado(self):
+        return [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} {self.tipo}"]
+
+
+class Contador(_Metrica):
+    """Valor que solo sube (ventas, fallos, filas importadas)."""
+    tipo = "counter"
+
+    def inc(self, valor=1, **etiquetas):
+        if not _activo:
+            return
+        clave = self._clave(etiquetas)
+        with self._lock:
+            self._valores[clave] = self._valores.get(clave, 0) + valor
+
+    def valor(self, **etiquetas):
+        return self._valores.get(self._clave(etiquetas), 0)
+
+    def _instantanea(self):
+        """[(clave, valor), ...] ordenado, copiado bajo el lock."""
+        with self._lock:
+            return sorted(self._valores.items())
+
+    def exportar(self):
+        return self._encabezado() + [
+            f"{self.nombre}{_texto_etiquetas(self.etiquetas, clave)} {_numero(v)}"
+            for clave, v in self._instantanea()]
+
+
+class Medidor(Contador):
+    """Valor que sube y baja. Con 'funcion', se lee al exportar (ej: aciertos de una caché)."""
+    tipo = "gauge"
+
+    def __init__(self, nombre, ayuda, etiquetas=(), funcion=None):
+        super().__init__(nombre, ayuda, etiquetas)
+        self.funcion = funcion
+
+    def fijar(self, valor, **etiquetas):
+        if not _activo:
+            return
+        clave = self._clave(etiquetas)
+        with self._lock:
+            self._valores[clave] = valor
+
+    def _instantanea(self):
+        if self.funcion is not None:
+            valor = self.funcion()  # fuera del lock: puede tomar los de la caché que mide
+            with self._lock:
+                self._valores[()] = valor
+        return super()._instantanea()
+
+
+class Histograma(_Metrica):
+    """Distribución de valores en cubetas acumulativas (latencias, duraciones)."""
+    tipo = "histogram"
+
+    def __init__(self, nombre, ayuda, etiquetas=(), limites=LIMITES_LATENCIA):
+        super().__init__(nombre, ayuda, etiquetas)
+        self.limites = tuple(sorted(limites))
+
+    def observar(self, valor, **etiquetas):
+        if not _activo:
+            return
+        clave = self._clave(etiquetas)
+        indice = bisect.bisect_left(self.limites, valor)
+        with self._lock:
+            dato = self._valores.get(clave)
+            if dato is None:
+                # [conteo por cubeta (no acumulado; la última es +Inf), suma, cantidad]
+                dato = self._valores[clave] = [[0] * (len(self.limites) + 1), 0.0, 0]
+            dato[0][indice] += 1
+            dato[1] += valor
+            dato[2] += 1
+
+    @contextmanager
+    def cronometrar(self, **etiquetas):
+        """with histograma.cronometrar(tipo="x"): ... observa los segundos del bloque."""
+        if not _activo:
+            yield
+            return
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(time.perf_counter() - inicio, **etiquetas)
+
+    def percentil(self, q, **etiquetas):
+        """
+        Estimación del percentil q (0..1) interpolando dentro de la cubeta, como
+        histogram_quantile de Prometheus. None si no hay observaciones.
+        """
+        with self._lock:
+            dato = self._valores.get(self._clave(etiquetas))
+            if not dato or not dato[2]:
+                return None
+            cubetas, cantidad = list(dato[0]), dato[2]
+        return self._percentil_cubetas(q, cubetas, cantidad)
+
+    def _percentil_cubetas(self, q, cubetas, cantidad):
+        objetivo = q * cantidad
+        acumulado = 0
+        for i, n in enumerate(cubetas):
+            if acumulado + n >= objetivo and n:
+                if i == len(self.limites):
+                    return self.limites[-1]  # cae en +Inf: lo mejor que se sabe es el último límite
+                inferior = self.limites[i - 1] if i else 0.0
+                return inferior + (self.limites[i] - inferior) * (objetivo - acumulado) / n
+            acumulado += n
+        return self.limites[-1]
+
+    def _instantanea(self):
+        """[(clave, (cubetas, suma, cantidad)), ...] ordenado, copiado bajo el lock."""
+        with self._lock:
+            return sorted((clave, (list(d[0]), d[1], d[2])) for clave, d in self._valores.items())
+
+    def exportar(self):
+        lineas = self._encabezado()
+        for clave, (cubetas, suma, cantidad) in self._instantanea():
+            acumulado = 0
+            for limite, n in zip(self.limites + (float("inf"),), cubetas):
+                acumulado += n
+                lineas.append(f"{self.nombre}_bucket"
+                              f"{_texto_etiquetas(self.etiquetas, clave, [('le', _numero(limite))])} {acumulado}")
+            lineas.append(f"{self.nombre}_sum{_texto_etiquetas(self.etiquetas, clave)} {_numero(suma)}")
+            lineas.append(f"{self.nombre}_count{_texto_etiquetas(self.etiquetas, clave)} {cantidad}")
+        return lineas
+
+
+# --- Registro ---
+
+_registro = {}  # nombre -> métrica (en orden de creación)
+_lock_registro = threading.Lock()
+
+
+def _registrar(clase, nombre, *args, **kwargs):
+    # Idempotente: volver a pedir un nombre retorna la misma métrica
+    with _lock_registro:
+        metrica = _registro.get(nombre)
+        if metrica is None:
+            metrica = _registro[nombre] = clase(nombre, *args, **kwargs)
+        return metrica
+
+
+def contador(nombre, ayuda, etiquetas=()):
+    return _registrar(Contador, nombre, ayuda, etiquetas)
+
+
+def medidor(nombre, ayuda, etiquetas=(), funcion=None):
+    return _registrar(Medidor, nombre, ayuda, etiquetas, funcion=funcion)
+
+
+def histograma(nombre, ayuda, etiquetas=(), limites=LIMITES_LATENCIA):
+    return _registrar(Histograma, nombre, ayuda, etiquetas, limites=limites)
+
+
+def cronometrar(hist, etiquetas=None):
+    """
+    Decorador: observa en 'hist' la duración de cada llamada.
+    etiquetas(*args, **kwargs) -> dict arma las etiquetas desde los argumentos.
+    """
+    def decorador(funcion):
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            if not _activo:
+                return funcion(*args, **kwargs)
+            inicio = time.perf_counter()
+            try:
+                return funcion(*args, **kwargs)
+            finally:
+                hist.observar(time.perf_counter() - inicio,
+                              **(etiquetas(*args, **kwargs) if etiquetas else {}))
+        return envoltura
+    return decorador
+
+
+def texto_prometheus():
+    """Todas las métricas en el formato de exposición de texto de Prometheus (0.0.4)."""
+    with _lock_registro:
+        metricas = list(_registro.values())
+    lineas = []
+    for metrica in metricas:
+        lineas.extend(metrica.exportar())
+    return "\n".join(lineas) + "\n"
+
+
+def resumen():
+    """Texto corto para el log: contadores/medidores y cantidad, p50 y p99 de cada histograma."""
+    with _lock_registro:
+        metricas = list(_registro.values())
+    lineas = [f"Métricas ({time.strftime('%Y-%m-%d %H:%M:%S')}):"]
+    for metrica in metricas:
+        if isinstance(metrica, Histograma):
+            for clave, (cubetas, _, cantidad) in metrica._instantanea():
+                if not cantidad:
+                    continue
+                p50 = metrica._percentil_cubetas(0.5, cubetas, cantidad)
+                p99 = metrica._percentil_cubetas(0.99, cubetas, cantidad)
+                lineas.append(f"  {metrica.nombre}{_texto_etiquetas(metrica.etiquetas, clave)}: "
+                              f"n={cantidad} p50={p50 * 1000:.1f}ms p99={p99 * 1000:.1f}ms")
+        else:
+            for clave, valor in metrica._instantanea():
+                lineas.append(f"  {metrica.nombre}{_texto_etiquetas(metrica.etiquetas, clave)}: "
+                              f"{valor:.6g}")
+    return "\n".join(lineas)
+
+
+# --- Exportación ---
+
+class _ManejadorMetricas(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        cuerpo = texto_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def log_message(self, formato, *args):
+        pass  # sin una línea por consola en cada scrape
+
+
+_servidor = None
+_detener_log = threading.Event()
+
+
+def servir(puerto, host="127.0.0.1"):
+    """Levanta el endpoint /metrics en un hilo daemon. Retorna el servidor."""
+    global _servidor
+    if _servidor is None:
+        activar()
+        _servidor = ThreadingHTTPServer((host, int(puerto)), _ManejadorMetricas)
+        _servidor.daemon_threads = True
+        threading.Thread(target=_servidor.serve_forever, name="metricas-http", daemon=True).start()
+    return _servidor
+
+
+def registrar_periodicamente(intervalo):
+    """Imprime resumen() cada 'intervalo' segundos en un hilo daemon."""
+    activar()
+    _detener_log.clear()
+
+    def ciclo():
+        while not _detener_log.wait(intervalo):
+            print(resumen())
+
+    threading.Thread(target=ciclo, name="metricas-log", daemon=True).start()
+
+
+def iniciar_desde_entorno():
+    """Arranca lo pedido en RESTAURANTE_METRICAS_PUERTO / RESTAURANTE_METRICAS_LOG."""
+    if PUERTO:
+        try:
+            servir(PUERTO)
+            print(f"Métricas en http://127.0.0.1:{PUERTO}/metrics")
+        except (OSError, ValueError) as e:
+            print(f"No se pudo iniciar el servidor de métricas: {e}")
+    if INTERVALO_LOG:
+        try:
+            registrar_periodicamente(float(INTERVALO_LOG))
+        except ValueError:
+            print(f"RESTAURANTE_METRICAS_LOG inválido: {INTERVALO_LOG}")
+
+
+def detener():
+    global _servidor
+    _detener_log.set()
+    if _servidor is not None:
+        _servidor.shutdown()
+        _servidor.server_close()
+        _servidor = None
@@ -0,0 +1,182 @@
+# Migraciones de esquema para bases de datos creadas con versiones anteriores.
+# Base.metadata.create_all solo crea tablas nuevas: no agrega columnas ni índices
+# a tablas que ya existen, por eso estos pasos se aplican a mano.
+import hashlib
+from collections import defaultdict
+from sqlalchemy import inspect, text, MetaData, Table, Column, String, select
+from sqlalchemy.exc import SQLAlchemyError
+from database import Base
+from models import Ingrediente, normalizar_nombre
+
+
+def _fusionar_en(conn, tabla, columna_id, principal, duplicado, claves, columnas_suma):
+    """
+    Reasigna las filas de 'tabla' que apuntan al ingrediente 'duplicado' hacia 'principal'.
+    Si la fila destino ya existe (misma clave), se suman las columnas en vez de chocar con la PK.
+    """
+    otra_clave = " AND ".join(f"d.{c} = {tabla}.{c}" for c in claves)
+    set_suma = ", ".join(
+        f"{c} = {c} + (SELECT d.{c} FROM {tabla} d WHERE d.{columna_id} = :dup AND {otra_clave})"
+        for c in columnas_suma)
+
+    # 1. Sumar sobre filas que ya existen para el principal
+    conn.execute(text(
+        f"UPDATE {tabla} SET {set_suma} "
+        f"WHERE {columna_id} = :principal AND EXISTS "
+        f"(SELECT 1 FROM {tabla} d WHERE d.{columna_id} = :dup AND {otra_clave})"
+    ), {"principal": principal, "dup": duplicado})
+
+    # 2. Borrar esas filas ya sumadas del duplicado
+    otra_clave_inv = " AND ".join(f"p.{c} = {tabla}.{c}" for c in claves)
+    conn.execute(text(
+        f"DELETE FROM {tabla} WHERE {columna_id} = :dup AND EXISTS "
+        f"(SELECT 1 FROM {tabla} p WHERE p.{columna_id} = :principal AND {otra_clave_inv})"
+    ), {"principal": principal, "dup": duplicado})
+
+    # 3. Las restantes solo cambian de ingrediente
+    conn.execute(text(
+        f"UPDATE {tabla} SET {columna_id} = :principal WHERE {columna_id} = :dup"
+    ), {"principal": principal, "dup": duplicado})
+
+
+def migrar_nombre_normalizado(engine):
+    """
+    Agrega ingrediente.nombre_normalizado, lo rellena, fusiona los ingredientes
+    duplicados (mismo nombre normalizado) y crea el índice único.
+    Los duplicados se fusionan en el de menor id: se suma su stock y se
+    reasignan sus recetas y su consumo histórico.
+    """
+    inspector = inspect(engine)
+    if 'ingrediente' not in inspector.get_table_names():
+        return
+
+    columnas = {c['name'] for c in inspector.get_columns('ingrediente')}
+    indices = {i['name'] for i in inspector.get_indexes('ingrediente')}
+    if 'nombre_normalizado' in columnas and 'ux_ingrediente_nombre_normalizado' in indices:
+        return
+
+    tablas = set(inspector.get_table_names())
+
+    with engine.begin() as conn:
+        if 'nombre_normalizado' not in columnas:
+            conn.execute(text("ALTER TABLE ingrediente ADD COLUMN nombre_normalizado VARCHAR"))
+
+        grupos = defaultdict(list)
+        for ing_id, nombre in conn.execute(text("SELECT id, nombre FROM ingrediente ORDER BY id")):
+            grupos[normalizar_nombre(nombre)].append(ing_id)
+
+        fusionados = 0
+        for clave, ids in grupos.items():
+            principal, duplicados = ids[0], ids[1:]
+
+            for dup in duplicados:
+                conn.execute(text(
+                    "UPDATE ingrediente SET cantidad = cantidad + "
+                    "(SELECT cantidad FROM ingrediente WHERE id = :dup) WHERE id = :principal"
+                ), {"principal": principal, "dup": dup})
+
+                if 'menu_ingrediente' in tablas:
+                    _fusionar_en(conn, 'menu_ingrediente', 'ingrediente_id', principal, dup,
+                                 ['menu_id'], ['cantidad_requerida'])
+                if 'consumo_ingrediente_diario' in tablas:
+                    _fusionar_en(conn, 'consumo_ingrediente_diario', 'ingrediente_id', principal, dup,
+                                 ['fecha'], ['usos', 'cantidad'])
+
+                conn.execute(text("DELETE FROM ingrediente WHERE id = :dup"), {"dup": dup})
+                fusionados += 1
+
+            conn.execute(text("UPDATE ingrediente SET nombre_normalizado = :clave WHERE id = :id"),
+                         {"clave": clave, "id": principal})
+
+        for indice in Ingrediente.__table__.indexes:
+            indice.create(conn, checkfirst=True)
+
+    if fusionados:
+        print(f"Migración: {fusionados} ingredientes duplicados fusionados.")
+
+
+def migrar_cantidades_pedido_menu(engine):
+    """
+    Convierte pedido_menu en líneas con cantidad y precio_unitario.
+    Las filas existentes quedan con cantidad 1 y el precio actual del menú
+    (es el mejor dato disponible: antes no se guardaba el precio cobrado).
+    """
+    inspector = inspect(engine)
+    if 'pedido_menu' not in inspector.get_table_names():
+        return
+
+    columnas = {c['name'] for c in inspector.get_columns('pedido_menu')}
+    if {'cantidad', 'precio_unitario'} <= columnas:
+        return
+
+    with engine.begin() as conn:
+        if 'cantidad' not in columnas:
+            conn.execute(text("ALTER TABLE pedido_menu ADD COLUMN cantidad INTEGER NOT NULL DEFAULT 1"))
+        if 'precio_unitario' not in columnas:
+            conn.execute(text("ALTER TABLE pedido_menu ADD COLUMN precio_unitario INTEGER"))
+            conn.execute(text(
+                "UPDATE pedido_menu SET precio_unitario = "
+                "(SELECT precio FROM menu WHERE menu.id = pedido_menu.menu_id)"
+            ))
+
+
+def crear_indices_faltantes(engine):
+    """Crea los índices declarados en los modelos que no existan en tablas antiguas."""
+    inspector = inspect(engine)
+    tablas = set(inspector.get_table_names())
+    with engine.begin() as conn:
+        for tabla in Base.metadata.sorted_tables:
+            if tabla.name in tablas:
+                for indice in tabla.indexes:
+                    indice.create(conn, checkfirst=True)
+
+
+def migrar(engine):
+    """Aplica todas las migraciones pendientes (son idempotentes)."""
+    migrar_nombre_normalizado(engine)
+    migrar_cantidades_pedido_menu(engine)
+    crear_indices_faltantes(engine)
+
+
+# Subir este número al agregar una migración nueva en migrar()
+VERSION_MIGRACIONES = 3
+
+# Tabla propia (fuera de Base) con la huella del esquema ya aplicado
+_metadata_version = MetaData()
+esquema_version = Table('esquema_version', _metadata_version,
+                        Column('huella', String, primary_key=True))
+
+
+def huella_esquema():
+    """Resumen de tablas, columnas e índices de los modelos + versión de las migraciones."""
+    partes = [f"migraciones={VERSION_MIGRACIONES}"]
+    for tabla in Base.metadata.sorted_tables:
+        columnas = ",".join(f"{c.name}:{c.type}:{c.nullable}" for c in tabla.columns)
+        indices = ",".join(sorted(f"{i.name}:{'|'.join(c.name for c in i.columns)}:{i.unique}"
+                                  for i in tabla.indexes))
+        partes.append(f"{tabla.name}({columnas})[{indices}]")
+    return hashlib.sha1(";".join(partes).encode()).hexdigest()
+
+
+def preparar_esquema(engine):
+    """
+    Crea tablas y aplica migraciones solo si el esquema de la BD no coincide con los
+    modelos. En el caso normal es una sola consulta, en vez de create_all + inspección
+    de cada tabla en cada arranque. Retorna True si tuvo que actualizar el esquema.
+    """
+    huella = huella_esquema()
+    try:
+        with engine.connect() as conn:
+            if conn.execute(select(esquema_version.c.huella)).scalar() == huella:
+                return False
+    except SQLAlchemyError:
+        pass  # BD nueva o anterior a esquema_version
+
+    Base.metadata.create_all(bind=engine)
+    migrar(engine)
+
+    _metadata_version.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(esquema_version.delete())
+        conn.execute(esquema_version.insert().values(huella=huella))
+    return True
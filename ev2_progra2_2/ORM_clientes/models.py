@@ -1,13 +1,25 @@
-from sqlalchemy import Column, String, Integer, Float, ForeignKey, Table, DateTime
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, String, Integer, Float, ForeignKey, DateTime, Date, Index
+from sqlalchemy.orm import relationship, validates
 from database import Base
 import datetime
 
+
+def normalizar_nombre(nombre):
+    """
+    Clave de búsqueda de un nombre: sin espacios repetidos y sin distinguir
+    mayúsculas ("  Pan  de Completo" -> "pan de completo").
+    """
+    return " ".join((nombre or "").split()).casefold()
+
 # Entidad Cliente
 
 
 class Cliente(Base):
     __tablename__ = 'cliente'
+    # Orden por defecto de la lista virtual de clientes (nombre, desempate por email)
+    __table_args__ = (
+        Index('ix_cliente_nombre', 'nombre', 'email'),
+    )
     email = Column(String, primary_key=True)
     nombre = Column(String, nullable=False)
     edad = Column(Integer, nullable=False)
@@ -15,11 +27,23 @@ class Cliente(Base):
         "Pedido", back_populates="cliente", cascade="all, delete-orphan")
 
 
-# Tabla intermedia M:N entre Pedido y Menu (Sin cambios, simple asociación)
-pedido_menu = Table('pedido_menu', Base.metadata,
-    Column('pedido_id', Integer, ForeignKey('pedido.id'), primary_key=True),
-    Column('menu_id', Integer, ForeignKey('menu.id'), primary_key=True)
-)
+# Asociación Pedido-Menu como Association Object (igual que MenuIngrediente):
+# cada línea guarda la cantidad pedida y el precio unitario cobrado en ese momento,
+# así un pedido puede llevar 3 completos y los ingresos no cambian si luego sube el precio.
+class PedidoMenu(Base):
+    __tablename__ = 'pedido_menu'
+
+    pedido_id = Column(Integer, ForeignKey('pedido.id'), primary_key=True)
+    menu_id = Column(Integer, ForeignKey('menu.id'), primary_key=True)
+
+    cantidad = Column(Integer, nullable=False, default=1)
+    # Snapshot del precio del menú al momento de la venta
+    precio_unitario = Column(Integer, nullable=False)
+
+    # Relaciones internas
+    pedido = relationship("Pedido", back_populates="items")
+    menu = relationship("Menu", back_populates="items_pedido")
+
 
 # Cambio con el anterior:
 # Se reemplaza la Table simple por un Modelo de Asociación (Association Object)
@@ -44,6 +68,12 @@ class MenuIngrediente(Base):
 # Entidad Pedido
 class Pedido(Base):
     __tablename__ = 'pedido'
+    # Índices para el listado paginado (PedidoCRUD.buscar_pedidos):
+    # búsqueda por email + orden por fecha, y orden por fecha sin filtro
+    __table_args__ = (
+        Index('ix_pedido_cliente_fecha', 'cliente_email', 'fecha', 'id'),
+        Index('ix_pedido_fecha', 'fecha', 'id'),
+    )
     id = Column(Integer, primary_key=True, autoincrement=True)
     descripcion = Column(String, nullable=False)
     fecha = Column(DateTime, default=datetime.datetime.now)
@@ -51,8 +81,12 @@ class Pedido(Base):
     cliente_email = Column(String, ForeignKey('cliente.email'), nullable=False)
     cliente = relationship("Cliente", back_populates="pedido")
     
-    # Relación con Menús
-    menus = relationship("Menu", secondary=pedido_menu, back_populates="pedidos")
+    # Líneas del pedido (menú + cantidad + precio cobrado)
+    items = relationship(
+        "PedidoMenu", back_populates="pedido", cascade="all, delete-orphan")
+
+    # Vista de solo lectura de los menús (sin cantidades); se escribe a través de 'items'
+    menus = relationship("Menu", secondary="pedido_menu", viewonly=True)
 
 # Entidad Menu
 class Menu(Base):
@@ -66,17 +100,25 @@ class Menu(Base):
     ingredientes_receta = relationship(
         "MenuIngrediente", back_populates="menu", cascade="all, delete-orphan")
 
-    pedidos = relationship(
-        "Pedido", secondary=pedido_menu, back_populates="menus")
+    items_pedido = relationship(
+        "PedidoMenu", back_populates="menu", cascade="all, delete-orphan")
+
+    pedidos = relationship("Pedido", secondary="pedido_menu", viewonly=True)
 
 # Entidad Ingrediente
 
 
 class Ingrediente(Base):
     __tablename__ = 'ingrediente'
+    # Índice único sobre el nombre normalizado: búsquedas O(log n) y sin duplicados
+    __table_args__ = (
+        Index('ux_ingrediente_nombre_normalizado', 'nombre_normalizado', unique=True),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     nombre = Column(String, nullable=False)
+    # Se completa solo al asignar 'nombre' (ver _normalizar_nombre)
+    nombre_normalizado = Column(String, nullable=False)
     # Agregado campo unidad para consistencia
     unidad = Column(String, nullable=False, default="unid")
     # Cambiado a Float para permitir 0.5 kg etc
@@ -85,3 +127,59 @@ class Ingrediente(Base):
     # Relacion inversa con MenuIngrediente
     menus_asociados = relationship(
         "MenuIngrediente", back_populates="ingrediente")
+
+    @validates('nombre')
+    def _normalizar_nombre(self, key, nombre):
+        self.nombre_normalizado = normalizar_nombre(nombre)
+        return nombre
+
+
+# --- TABLAS RESUMEN (ROLLUPS DIARIOS) ---
+# Se mantienen incrementalmente desde PedidoCRUD en la misma transacción de la venta.
+# Los gráficos y totales leen estas tablas (O(días)) en vez de recorrer todos los pedidos.
+# No llevan FK: son datos agregados y deben sobrevivir aunque se borre un menú o ingrediente.
+
+
+class VentaDiaria(Base):
+    __tablename__ = 'venta_diaria'
+
+    fecha = Column(Date, primary_key=True)
+    cantidad_pedidos = Column(Integer, nullable=False, default=0)
+    total = Column(Integer, nullable=False, default=0)
+
+
+class VentaMenuDiaria(Base):
+    __tablename__ = 'venta_menu_diaria'
+
+    fecha = Column(Date, primary_key=True)
+    menu_id = Column(Integer, primary_key=True)
+    unidades = Column(Integer, nullable=False, default=0)
+
+
+class ConsumoIngredienteDiario(Base):
+    __tablename__ = 'consumo_ingrediente_diario'
+
+    fecha = Column(Date, primary_key=True)
+    ingrediente_id = Column(Integer, primary_key=True)
+    # usos: veces que el ingrediente salió en un menú vendido (lo que grafica "Uso de Ingredientes")
+    usos = Column(Integer, nullable=False, default=0)
+    # cantidad: consumo real (suma de cantidad_requerida)
+    cantidad = Column(Float, nullable=False, default=0.0)
+
+
+# --- REGISTRO DE CAMBIOS ENTRE PROCESOS ---
+# Lo escribe eventos.py (si se activó con activar_registro_bd) en la misma transacción
+# que el cambio. Cada proceso de la API lo lee para invalidar sus cachés y alimentar
+# GET /cambios, así varios procesos sobre la misma BD ven los commits de los demás.
+
+
+class CambioRegistrado(Base):
+    __tablename__ = 'cambio_registrado'
+    # Sin AUTOINCREMENT, SQLite podría reutilizar ids al podar: los lectores se perderían cambios
+    __table_args__ = {'sqlite_autoincrement': True}
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    origen = Column(String, nullable=False)   # proceso que hizo el commit
+    entidad = Column(String, nullable=False)
+    accion = Column(String, nullable=False)
+    clave = Column(String)                    # JSON (lista si la clave es compuesta)
@@ -0,0 +1,21 @@
+from database import sesion_scope, engine
+from crud.resumen_crud import ResumenCRUD
+from models import VentaDiaria
+from migraciones import preparar_esquema
+from sqlalchemy import func
+# Crear las tablas (incluidas las de resumen) si no existen
+preparar_esquema(engine)
+
+# Reconstruye las tablas resumen diarias a partir de los pedidos existentes.
+# Uso: python reconstruir_resumenes.py
+def main():
+    with sesion_scope() as db:
+        if ResumenCRUD.reconstruir(db):
+            dias = db.query(func.count(VentaDiaria.fecha)).scalar()
+            pedidos = db.query(func.sum(VentaDiaria.cantidad_pedidos)).scalar() or 0
+            print(f"Resúmenes reconstruidos: {pedidos} pedidos en {dias} días.")
+        else:
+            print("No se pudieron reconstruir los resúmenes.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+# Fixtures comunes: cada prueba usa su propia BD SQLite en memoria.
+import os
+import sys
+
+# Los módulos se importan por nombre desde ORM_clientes (igual que app.py / api.py).
+# El motor global de database.py también queda en memoria: las pruebas no tocan archivos.
+os.environ["DATABASE_URL"] = "sqlite://"
+os.environ.pop("DATABASE_URL_LECTURA", None)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import StaticPool
+from sqlalchemy.orm import sessionmaker
+from database import Base, SesionRastreada
+import models  # noqa: F401  (registra las tablas en Base.metadata)
+import eventos  # noqa: F401  (listeners del bus de cambios, como en la App)
+from crud.cache_recetas import CacheRecetas
+
+
+@pytest.fixture
+def motor():
+    # StaticPool: una sola conexión, si no cada conexión vería una BD en memoria distinta
+    motor = create_engine("sqlite://", poolclass=StaticPool)
+
+    @event.listens_for(motor, "connect")
+    def _claves_foraneas(conexion_dbapi, registro):
+        conexion_dbapi.execute("PRAGMA foreign_keys=ON")
+
+    yield motor
+    motor.dispose()
+
+
+@pytest.fixture
+def db(motor):
+    Base.metadata.create_all(motor)
+    # La caché de recetas es del proceso: los ids se repiten entre pruebas
+    CacheRecetas.invalidar()
+    sesion = sessionmaker(bind=motor, autoflush=False, class_=SesionRastreada)()
+    yield sesion
+    sesion.close()
+
+
+@pytest.fixture
+def datos(db):
+    """Dos clientes, tres ingredientes y dos menús. Retorna {nombre: id} de ingredientes y menús."""
+    from crud.cliente_crud import ClienteCRUD
+    from crud.ingrediente_crud import IngredienteCRUD
+    from crud.menu_crud import MenuCRUD
+
+    ClienteCRUD.crear_cliente(db, "Ana", "ana@x.cl", 30)
+    ClienteCRUD.crear_cliente(db, "Beto", "beto@x.cl", 40)
+    ids = {nombre: IngredienteCRUD.crear_ingrediente(db, nombre, "unid", cantidad).id
+           for nombre, cantidad in (("Pan", 10), ("Carne", 3), ("Tomate", 5))}
+    ids["Completo"] = MenuCRUD.crear_menu(
+        db, "Completo", "Pan con carne", [(ids["Pan"], 1), (ids["Carne"], 1)], 1500).id
+    ids["Ensalada"] = MenuCRUD.crear_menu(
+        db, "Ensalada", "Tomate", [(ids["Tomate"], 2)], 1000).id
+    return ids
@@ -0,0 +1,66 @@
+# migrar_nombre_normalizado sobre una BD con el esquema anterior (sin nombre_normalizado).
+from sqlalchemy import inspect, text
+from migraciones import migrar_nombre_normalizado
+
+ESQUEMA_ANTERIOR = [
+    "CREATE TABLE ingrediente (id INTEGER PRIMARY KEY, nombre VARCHAR NOT NULL, "
+    "unidad VARCHAR NOT NULL, cantidad FLOAT NOT NULL)",
+    "CREATE TABLE menu_ingrediente (menu_id INTEGER, ingrediente_id INTEGER, "
+    "cantidad_requerida FLOAT NOT NULL, PRIMARY KEY (menu_id, ingrediente_id))",
+    "CREATE TABLE consumo_ingrediente_diario (fecha DATE, ingrediente_id INTEGER, "
+    "usos INTEGER NOT NULL, cantidad FLOAT NOT NULL, PRIMARY KEY (fecha, ingrediente_id))",
+]
+
+
+def _crear(motor, ingredientes, recetas=(), consumo=()):
+    with motor.begin() as conn:
+        for sentencia in ESQUEMA_ANTERIOR:
+            conn.execute(text(sentencia))
+        for fila in ingredientes:
+            conn.execute(text("INSERT INTO ingrediente VALUES (:id, :nombre, 'unid', :cantidad)"),
+                         dict(zip(("id", "nombre", "cantidad"), fila)))
+        for fila in recetas:
+            conn.execute(text("INSERT INTO menu_ingrediente VALUES (:m, :i, :c)"), dict(zip("mic", fila)))
+        for fila in consumo:
+            conn.execute(text("INSERT INTO consumo_ingrediente_diario VALUES (:f, :i, :u, :c)"),
+                         dict(zip("fiuc", fila)))
+
+
+def _filas(motor, consulta):
+    with motor.connect() as conn:
+        return sorted(tuple(f) for f in conn.execute(text(consulta)))
+
+
+def test_fusiona_duplicados_en_el_de_menor_id(motor):
+    _crear(motor,
+           ingredientes=[(1, "Pan", 10), (2, "  pan ", 5), (3, "Carne", 2), (4, "PAN", 1)],
+           recetas=[(1, 1, 2), (1, 2, 3), (2, 2, 1), (3, 4, 0.5), (3, 3, 1)],
+           consumo=[("2024-01-01", 1, 1, 2.0), ("2024-01-01", 2, 2, 3.0), ("2024-01-02", 4, 1, 1.0)])
+
+    migrar_nombre_normalizado(motor)
+
+    # Stock sumado y nombre normalizado en el que queda
+    assert _filas(motor, "SELECT id, nombre, cantidad, nombre_normalizado FROM ingrediente") == [
+        (1, "Pan", 16.0, "pan"), (3, "Carne", 2.0, "carne")]
+    # Recetas: si el menú ya usaba el principal se suman las cantidades; si no, se reasignan
+    assert _filas(motor, "SELECT menu_id, ingrediente_id, cantidad_requerida FROM menu_ingrediente") == [
+        (1, 1, 5.0), (2, 1, 1.0), (3, 1, 0.5), (3, 3, 1.0)]
+    # Consumo histórico: misma fecha se suma, fecha nueva se reasigna
+    assert _filas(motor, "SELECT fecha, ingrediente_id, usos, cantidad FROM consumo_ingrediente_diario") == [
+        ("2024-01-01", 1, 3, 5.0), ("2024-01-02", 1, 1, 1.0)]
+    indices = {i["name"]: i for i in inspect(motor).get_indexes("ingrediente")}
+    assert indices["ux_ingrediente_nombre_normalizado"]["unique"]
+
+
+def test_es_idempotente(motor):
+    _crear(motor, ingredientes=[(1, "Pan", 10), (2, "pan", 5)])
+
+    migrar_nombre_normalizado(motor)
+    migrar_nombre_normalizado(motor)
+
+    assert _filas(motor, "SELECT id, cantidad, nombre_normalizado FROM ingrediente") == [(1, 15.0, "pan")]
+
+
+def test_sin_tabla_ingrediente_no_hace_nada(motor):
+    migrar_nombre_normalizado(motor)
+    assert inspect(motor).get_table_names() == []
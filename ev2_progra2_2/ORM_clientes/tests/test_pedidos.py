@@ -0,0 +1,62 @@
+# buscar_pedidos: la paginación por cursor recorre fechados y sin fecha sin saltar ni repetir.
+import datetime
+import pytest
+from sqlalchemy import update
+from models import Pedido
+from crud.pedido_crud import PedidoCRUD
+
+
+@pytest.fixture
+def pedidos(db, datos):
+    """7 pedidos fechados (dos con la misma fecha) y 4 sin fecha, mezclados por id."""
+    base = datetime.datetime(2024, 5, 1, 12, 0)
+    fechas = [base, None, base + datetime.timedelta(days=1), None, base, base - datetime.timedelta(days=3),
+              None, base + datetime.timedelta(hours=2), None, base + datetime.timedelta(days=5), base]
+    ids = []
+    for i, fecha in enumerate(fechas):
+        pedido = Pedido(descripcion=f"Pedido {i}", cliente_email="ana@x.cl" if i % 2 else "beto@x.cl",
+                        fecha=fecha or base)
+        db.add(pedido)
+        db.flush()
+        ids.append(pedido.id)
+    # fecha=None en el constructor toma el default (now): los sin fecha se dejan en NULL aparte
+    sin_fecha = [i for i, f in zip(ids, fechas) if f is None]
+    db.execute(update(Pedido).where(Pedido.id.in_(sin_fecha)).values(fecha=None))
+    db.commit()
+
+    # Orden esperado: fecha desc, id desc; los sin fecha al final por id desc
+    con_fecha = sorted(((f, i) for i, f in zip(ids, fechas) if f is not None), reverse=True)
+    return [i for _, i in con_fecha] + sorted(sin_fecha, reverse=True)
+
+
+def _todas_las_paginas(db, limite, **filtros):
+    vistos, cursor, paginas = [], None, 0
+    while True:
+        filas, cursor = PedidoCRUD.buscar_pedidos(db, despues_de=cursor, limite=limite, **filtros)
+        vistos += [f.id for f in filas]
+        paginas += 1
+        assert paginas <= 20, "la paginación no termina"
+        if cursor is None:
+            return vistos
+
+
+@pytest.mark.parametrize("limite", [1, 2, 3, 4, 6, 7, 8, 11, 50])
+def test_paginas_recorren_fechados_y_sin_fecha(db, pedidos, limite):
+    assert _todas_las_paginas(db, limite) == pedidos
+
+
+def test_cursor_sobre_un_pedido_sin_fecha(db, pedidos):
+    # Con 8 por página la primera termina en el primer sin fecha: el cursor lleva fecha None
+    filas, cursor = PedidoCRUD.buscar_pedidos(db, limite=8)
+    assert cursor == (None, pedidos[7])
+    siguientes, cursor = PedidoCRUD.buscar_pedidos(db, despues_de=cursor, limite=8)
+    assert [f.id for f in siguientes] == pedidos[8:]
+    assert cursor is None
+
+
+def test_paginas_con_filtro_de_email(db, pedidos):
+    de_ana = {f.id for f in PedidoCRUD.leer_pedidos_por_id(db, pedidos) if f.cliente_email == "ana@x.cl"}
+    esperados = [i for i in pedidos if i in de_ana]
+
+    assert _todas_las_paginas(db, 2, texto_email="ana") == esperados
+    assert _todas_las_paginas(db, 3, texto_email="NA@X", contiene=True) == esperados
@@ -0,0 +1,78 @@
+# Resúmenes diarios: se mantienen con cada venta y anulación, y reconstruir() llega a lo mismo.
+import datetime
+from models import VentaDiaria, VentaMenuDiaria, ConsumoIngredienteDiario
+from crud.pedido_crud import PedidoCRUD
+from crud.resumen_crud import ResumenCRUD
+
+DIA_1 = datetime.datetime(2024, 5, 1, 12, 30)
+DIA_2 = datetime.datetime(2024, 5, 2, 9, 15)
+
+
+def _resumenes(db):
+    # Las filas que quedan en cero al anular equivalen a no tener fila (reconstruir no las crea)
+    db.expire_all()
+    return (
+        sorted((f, n, t) for f, n, t in db.query(VentaDiaria.fecha, VentaDiaria.cantidad_pedidos,
+                                                  VentaDiaria.total) if n),
+        sorted((f, m, u) for f, m, u in db.query(VentaMenuDiaria.fecha, VentaMenuDiaria.menu_id,
+                                                  VentaMenuDiaria.unidades) if u),
+        sorted((f, i, u, round(c, 6)) for f, i, u, c in db.query(
+            ConsumoIngredienteDiario.fecha, ConsumoIngredienteDiario.ingrediente_id,
+            ConsumoIngredienteDiario.usos, ConsumoIngredienteDiario.cantidad) if u),
+    )
+
+
+def _vender(db, menus, fecha):
+    exito, boleta = PedidoCRUD.registrar_compra(db, "ana@x.cl", menus, fecha)
+    assert exito, boleta
+    return boleta.id
+
+
+def test_venta_suma_a_los_resumenes_del_dia(db, datos):
+    completo, ensalada = datos["Completo"], datos["Ensalada"]
+    _vender(db, [completo, completo, ensalada], DIA_1)
+    _vender(db, [completo], DIA_2)
+
+    ventas, por_menu, consumo = _resumenes(db)
+    assert ventas == [(DIA_1.date(), 1, 4000), (DIA_2.date(), 1, 1500)]
+    assert por_menu == sorted([(DIA_1.date(), completo, 2), (DIA_1.date(), ensalada, 1),
+                               (DIA_2.date(), completo, 1)])
+    assert (DIA_1.date(), datos["Tomate"], 1, 2.0) in consumo
+    assert (DIA_1.date(), datos["Pan"], 2, 2.0) in consumo
+    assert PedidoCRUD.calcular_total_ventas(db) == 5500
+
+
+def test_anular_pedido_descuenta_de_los_resumenes(db, datos):
+    completo, ensalada = datos["Completo"], datos["Ensalada"]
+    _vender(db, [completo], DIA_1)
+    anulado = _vender(db, [completo, ensalada], DIA_1)
+
+    assert PedidoCRUD.borrar_pedido_y_restaurar_stock(db, anulado)
+
+    ventas, por_menu, consumo = _resumenes(db)
+    assert ventas == [(DIA_1.date(), 1, 1500)]
+    assert por_menu == [(DIA_1.date(), completo, 1)]
+    assert all(i != datos["Tomate"] for _, i, _, _ in consumo)
+    assert PedidoCRUD.calcular_total_ventas(db) == 1500
+
+
+def test_reconstruir_coincide_con_lo_incremental(db, datos):
+    completo, ensalada = datos["Completo"], datos["Ensalada"]
+    _vender(db, [completo, completo, ensalada], DIA_1)
+    anulado = _vender(db, [ensalada], DIA_1)
+    _vender(db, [completo], DIA_2)
+    PedidoCRUD.borrar_pedido_y_restaurar_stock(db, anulado)
+    incremental = _resumenes(db)
+
+    assert ResumenCRUD.reconstruir(db)
+    assert _resumenes(db) == incremental
+
+
+def test_reconstruir_si_vacio_rellena_resumenes_perdidos(db, datos):
+    _vender(db, [datos["Completo"]], DIA_1)
+    db.query(VentaDiaria).delete()
+    db.commit()
+
+    assert ResumenCRUD.reconstruir_si_vacio(db)
+    assert _resumenes(db)[0] == [(DIA_1.date(), 1, 1500)]
+    assert not ResumenCRUD.reconstruir_si_vacio(db)
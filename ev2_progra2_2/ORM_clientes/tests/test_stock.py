@@ -0,0 +1,60 @@
+# Reserva de stock: un faltante no descuenta nada y el stock nunca queda negativo.
+import datetime
+from models import Ingrediente, Pedido
+from crud.ingrediente_crud import IngredienteCRUD
+from crud.pedido_crud import PedidoCRUD
+
+
+def _stock(db):
+    db.expire_all()
+    return {nombre: cantidad for nombre, cantidad in db.query(Ingrediente.nombre, Ingrediente.cantidad)}
+
+
+def test_reservar_stock_informa_faltantes_sin_descontarlos(db, datos):
+    faltantes = IngredienteCRUD.reservar_stock(db, {datos["Pan"]: 2, datos["Carne"]: 4})
+
+    assert faltantes == ["Carne"]
+    # El UPDATE condicional no tocó la Carne, aunque el Pan sí se descontó en la transacción
+    assert _stock(db)["Carne"] == 3
+    db.rollback()
+    assert _stock(db) == {"Pan": 10, "Carne": 3, "Tomate": 5}
+
+
+def test_reservar_stock_ingrediente_inexistente(db, datos):
+    assert IngredienteCRUD.reservar_stock(db, {999: 1}) == ["ID 999 (no existe)"]
+    db.rollback()
+
+
+def test_venta_sin_stock_no_deja_descuentos_parciales(db, datos):
+    # 4 completos: el pan alcanza (10) pero la carne no (3)
+    exito, mensaje = PedidoCRUD.registrar_compra(db, "ana@x.cl", [datos["Completo"]] * 4)
+
+    assert not exito
+    assert mensaje == "Error: Stock insuficiente de: Carne."
+    assert _stock(db) == {"Pan": 10, "Carne": 3, "Tomate": 5}
+    assert db.query(Pedido).count() == 0
+
+
+def test_ventas_hasta_agotar_no_dejan_stock_negativo(db, datos):
+    resultados = [PedidoCRUD.registrar_compra(db, "ana@x.cl", [datos["Ensalada"]],
+                                              datetime.datetime(2024, 5, 1, 12, 0))[0]
+                  for _ in range(4)]
+
+    # Tomate 5 y cada ensalada usa 2: solo se venden dos
+    assert resultados == [True, True, False, False]
+    stock = _stock(db)
+    assert stock["Tomate"] == 1
+    assert min(stock.values()) >= 0
+    assert db.query(Pedido).count() == 2
+
+
+def test_descontar_stock_receta_el_llamador_hace_rollback(db, datos):
+    pan, carne = db.get(Ingrediente, datos["Pan"]), db.get(Ingrediente, datos["Carne"])
+
+    assert not IngredienteCRUD.descontar_stock_receta(db, [(pan, 1), (carne, 2), (carne, 2)])
+    db.rollback()
+    assert _stock(db) == {"Pan": 10, "Carne": 3, "Tomate": 5}
+
+    assert IngredienteCRUD.descontar_stock_receta(db, [(pan, 1), (carne, 1), (carne, 1)])
+    db.commit()
+    assert _stock(db) == {"Pan": 9, "Carne": 1, "Tomate": 5}
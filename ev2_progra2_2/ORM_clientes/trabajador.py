@@ -0,0 +1,143 @@
+# Ejecución de consultas fuera del hilo de Tkinter.
+# Tk no es thread-safe: los hilos del pool solo trabajan con la BD (cada tarea
+# con su propia sesión) y dejan el resultado en una cola; la ventana revisa
+# esa cola con after() y ejecuta los callbacks en el hilo principal.
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from database import sesion_scope
+
+
+class Tarea:
+    """Una llamada enviada al trabajador. Se puede cancelar mientras no haya terminado."""
+
+    def __init__(self, clave=None, lectura=None):
+        self.clave = clave
+        self.lectura = clave is not None if lectura is None else lectura
+        self.cancelada = False
+        self.futuro = None
+        self._conexion = None  # conexión DBAPI en uso (para interrumpir la consulta)
+        self._lock = threading.Lock()
+
+    def cancelar(self):
+        """
+        Marca la tarea como cancelada: su resultado se descarta.
+        Si aún no empezó, no llega a ejecutarse; si está consultando SQLite,
+        se interrumpe la consulta en curso.
+        """
+        with self._lock:
+            self.cancelada = True
+            if self.futuro is not None:
+                self.futuro.cancel()
+            if self._conexion is not None and hasattr(self._conexion, "interrupt"):
+                self._conexion.interrupt()
+
+
+class TrabajadorBD:
+    """
+    Pool de hilos para CRUD y Graficos.
+    enviar(funcion, *args) ejecuta funcion(db, *args) en un hilo del pool y luego
+    llama a al_terminar(resultado) o al_fallar(error) desde el hilo de Tk.
+    Con 'clave', una tarea nueva cancela a la anterior con la misma clave
+    (ej: cada tecla de búsqueda reemplaza la consulta de la tecla previa).
+    Las tareas con clave son lecturas reemplazables: usan el motor de solo lectura.
+    lectura=True usa ese motor también para una tarea sin clave (que no se reemplaza).
+    La sesión se cierra al terminar la tarea: funcion debe retornar datos planos
+    (tuplas, filas, strings), no objetos ORM.
+    'sesiones' reemplaza a database.sesion_scope (ver backend_remoto.py, donde db es None).
+    """
+
+    def __init__(self, raiz, hilos=2, intervalo_ms=30, sesiones=sesion_scope):
+        self.raiz = raiz
+        self._sesiones = sesiones
+        self.intervalo_ms = intervalo_ms
+        self._pool = ThreadPoolExecutor(max_workers=hilos, thread_name_prefix="trabajador-bd")
+        self._resultados = queue.Queue()
+        self._vigentes = {}  # clave -> Tarea más reciente
+        self._cerrado = False
+        self.raiz.after(self.intervalo_ms, self._revisar_resultados)
+
+    def enviar(self, funcion, *args, al_terminar=None, al_fallar=None, clave=None, lectura=None):
+        tarea = Tarea(clave, lectura)
+        if clave is not None:
+            anterior = self._vigentes.get(clave)
+            if anterior is not None:
+                anterior.cancelar()
+            self._vigentes[clave] = tarea
+
+        with tarea._lock:
+            tarea.futuro = self._pool.submit(self._ejecutar, tarea, funcion, args, al_terminar, al_fallar)
+        return tarea
+
+    def notificar(self, callback, valor):
+        """Ejecuta callback(valor) en el hilo de Tk; se puede llamar desde cualquier hilo."""
+        self._resultados.put((Tarea(), callback, valor))
+
+    def cancelar(self, clave):
+        tarea = self._vigentes.pop(clave, None)
+        if tarea is not None:
+            tarea.cancelar()
+
+    def ocupado(self, clave):
+        """True si hay una tarea con esa clave que todavía no entregó su resultado."""
+        return clave in self._vigentes
+
+    def _ejecutar(self, tarea, funcion, args, al_terminar, al_fallar):
+        # Corre en un hilo del pool: NO tocar widgets aquí
+        if tarea.cancelada:
+            return
+        try:
+            with self._sesiones(lectura=tarea.lectura) as db:
+                if tarea.clave is not None and db is not None:
+                    # Solo las tareas con clave (lecturas reemplazables) se pueden interrumpir
+                    conexion = db.connection().connection.driver_connection
+                    with tarea._lock:
+                        if tarea.cancelada:
+                            return
+                        tarea._conexion = conexion
+                try:
+                    resultado = funcion(db, *args)
+                finally:
+                    # Antes de devolver la conexión al pool: ya no se puede interrumpir
+                    with tarea._lock:
+                        tarea._conexion = None
+            callback, valor = al_terminar, resultado
+        except Exception as e:
+            if tarea.cancelada:
+                return
+            if al_fallar is None:
+                print(f"Error en tarea de fondo ({getattr(funcion, '__qualname__', funcion)}): {e}")
+            callback, valor = al_fallar, e
+
+        self._resultados.put((tarea, callback, valor))
+
+    def _revisar_resultados(self):
+        # Corre en el hilo de Tk: entrega los resultados listos
+        while True:
+            try:
+                tarea, callback, valor = self._resultados.get_nowait()
+            except queue.Empty:
+                break
+
+            if tarea.clave is not None:
+                if self._vigentes.get(tarea.clave) is not tarea:
+                    continue  # Fue reemplazada por una tarea más nueva
+                del self._vigentes[tarea.clave]
+            if tarea.cancelada or callback is None:
+                continue
+
+            try:
+                callback(valor)
+            except Exception as e:
+                print(f"Error en callback de tarea de fondo: {e}")
+
+        if not self._cerrado:
+            self.raiz.after(self.intervalo_ms, self._revisar_resultados)
+
+    def cerrar(self):
+        """Detiene el pool sin esperar: las tareas pendientes se descartan."""
+        self._cerrado = True
+        for tarea in list(self._vigentes.values()):
+            tarea.cancelar()
+        self._vigentes.clear()
+        self._pool.shutdown(wait=False, cancel_futures=True)